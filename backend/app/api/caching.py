@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # Optional; gzip only without it
+    BrotliMiddleware = None
+
+# Cache-Control per kind of response. API JSON can change (summaries are
+# regenerated, chapters flagged), so shared caches may store it but must
+# revalidate, which costs a 304; rendered content and original uploads never
+# change for a given book id.
+API_CACHE_CONTROL = "public, no-cache"
+CONTENT_CACHE_CONTROL = "public, max-age=86400"
+UPLOAD_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+UPLOAD_EXTENSIONS = {".pdf", ".epub", ".mobi"}
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+STREAMING_MEDIA_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag over the given values"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, default=str).encode("utf-8")
+        digest.update(part)
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    # If-None-Match uses weak comparison
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(
+        status_code=304, headers={"ETag": etag, "Cache-Control": cache_control}
+    )
+
+
+def cached_json(
+    request: Request,
+    content,
+    cache_control: str = API_CACHE_CONTROL,
+    etag: Optional[str] = None,
+) -> Response:
+    """
+    JSON response with an ETag (from the body unless given) and
+    Cache-Control, or 304 if the client already has it
+    """
+    response = JSONResponse(content)
+    etag = etag or make_etag(response.body)
+    if is_not_modified(request, etag):
+        return not_modified(etag, cache_control)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+def cached_file(
+    request: Request,
+    path: Path,
+    media_type: str,
+    cache_control: str = CONTENT_CACHE_CONTROL,
+) -> Response:
+    """FileResponse with an ETag from its mtime and size, or 304"""
+    stat = path.stat()
+    etag = make_etag(stat.st_mtime_ns, stat.st_size)
+    if is_not_modified(request, etag):
+        return not_modified(etag, cache_control)
+    return FileResponse(
+        path,
+        media_type=media_type,
+        stat_result=stat,
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles with Cache-Control: original uploads are immutable, anything
+    else under a book directory is revalidated. Dot-prefixed paths (the
+    .index databases, .cache, .uploads, .fingerprints, segment temp files)
+    are internal state and always 404.
+    """
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if any(part.startswith(".") for part in Path(path).parts):
+            raise HTTPException(status_code=404)
+        return await super().get_response(path, scope)
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result
+        )
+        immutable = Path(full_path).suffix.lower() in UPLOAD_EXTENSIONS
+        response.headers["Cache-Control"] = (
+            UPLOAD_CACHE_CONTROL if immutable else API_CACHE_CONTROL
+        )
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Brotli (when brotli-asgi is installed) or gzip for buffered responses.
+    Streams (SSE, NDJSON) are sent uncompressed, since the compressor would
+    hold events in its buffer instead of delivering them as they happen.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        if BrotliMiddleware is not None:
+            self.compressed = BrotliMiddleware(
+                app, minimum_size=minimum_size, gzip_fallback=True
+            )
+        else:
+            self.compressed = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and not self._is_stream(scope):
+            await self.compressed(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    @staticmethod
+    def _is_stream(scope: Scope) -> bool:
+        accept = Headers(scope=scope).get("accept", "")
+        if any(media_type in accept for media_type in STREAMING_MEDIA_TYPES):
+            return True
+        return b"stream=true" in scope.get("query_string", b"")
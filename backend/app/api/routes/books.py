@@ -1,9 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
+from ..caching import cached_file, cached_json
+from ...processor import OutputFormat
 from ...services.books import BookService
-from ...services.queue import queue, ChapterTask
+from ...services.queue import queue
+from ...services.segment_store import segments, summary_key
+from .upload import doc_processor
+import asyncio
 import os
 import logging
-from pathlib import Path
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -16,68 +20,61 @@ BOOKS_DIR = os.getenv("BOOKS_DIR", "./books")
 book_service = BookService(BOOKS_DIR)
 
 
+def _summarized_chapters(book_id: str, chapter_count: int) -> set[str]:
+    """Chapters whose depth-1 summary is already in the book's segment store"""
+    store = segments.book(book_id)
+    return {
+        f"chapter-{i}"
+        for i in range(1, chapter_count + 1)
+        if summary_key(f"chapter-{i}", 1) in store
+    }
+
+
 @router.get("/books")
-async def list_books():
-    """List all available books"""
+async def list_books(
+    response: Response,
+    limit: int | None = None,
+    offset: int = 0,
+    sort: str = "uploadedAt",
+    order: str = "desc",
+):
+    """List available books, sorted and optionally paginated"""
     try:
-        return book_service.list_books()
+        books = await asyncio.to_thread(
+            book_service.list_books, limit, offset, sort, order
+        )
+        total = await asyncio.to_thread(book_service.count_books)
+        response.headers["X-Total-Count"] = str(total)
+        return books
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/books/{book_id}")
-async def get_book(book_id: str):
+async def get_book(request: Request, book_id: str):
     """Get a specific book's details"""
     try:
         logger.info(f"Getting book details for {book_id}")
-        book = book_service.get_book(book_id)
+        book = await asyncio.to_thread(book_service.get_book, book_id)
 
-        # Initialize processing queue for this book if not already in queue
-        logger.info(f"Current queue state before initialization: {queue.processing}")
-        if book_id not in queue.processing:
+        # Only a book the queue has never tracked needs its summaries checked;
+        # known books are restored from the task store
+        if not await queue.has_book(book_id):
             logger.info(f"Book {book_id} not in queue, checking cache")
 
-            # Check for cached summaries
-            book_dir = Path(BOOKS_DIR) / book_id
-            summaries_dir = book_dir / "summaries"
+            # Check for stored summaries
             chapters = book["metadata"]["chapters"]
-
-            # Initialize queue with cached status
-            queue.processing[book_id] = {}
-            completed_chapters = 0
-
-            for i, chapter in enumerate(chapters, 1):
-                chapter_id = f"chapter-{i}"
-                summary_file = summaries_dir / f"chapter-{i}-depth-1.txt"
-
-                # If summary exists in cache, mark as complete
-                if summary_file.exists():
-                    status = "complete"
-                    completed_chapters += 1
-                else:
-                    status = "pending"
-                    # Only add to queue if not already cached
-                    queue.queue.append(
-                        ChapterTask(
-                            book_id=book_id,
-                            chapter_id=chapter_id,
-                            chapter_title=chapter["title"],
-                        )
-                    )
-
-                queue.processing[book_id][chapter_id] = {
-                    "status": status,
-                    "title": chapter["title"],
-                }
-
+            completed = await asyncio.to_thread(
+                _summarized_chapters, book_id, len(chapters)
+            )
+            await queue.add_book(book_id, chapters, completed)
             logger.info(
-                f"Initialized queue with {completed_chapters} cached chapters out of {len(chapters)}"
+                f"Initialized queue with {len(completed)} cached chapters out of {len(chapters)}"
             )
-            logger.info(f"Queue state after initialization: {queue.processing}")
-        else:
-            logger.info(f"Book {book_id} already in queue")
 
-        return book
+        return cached_json(request, book)
     except FileNotFoundError as e:
         logger.error(f"Book not found: {book_id}")
         raise HTTPException(status_code=404, detail=str(e))
@@ -86,11 +83,28 @@ async def get_book(book_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/books/{book_id}/content")
+async def get_book_content(
+    request: Request, book_id: str, format: OutputFormat = "text"
+):
+    """Get the full book as plain text or markdown"""
+    try:
+        content_path = await doc_processor.get_content(book_id, format)
+        media_type = "text/markdown" if format == "markdown" else "text/plain"
+        return cached_file(request, content_path, f"{media_type}; charset=utf-8")
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error rendering book {book_id}: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.delete("/books/{book_id}")
 async def delete_book(book_id: str):
     """Delete a book and all its associated files"""
     try:
-        book_service.delete_book(book_id)
+        await asyncio.to_thread(book_service.delete_book, book_id)
+        await queue.remove_book(book_id)
         return {"status": "success"}
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -1,5 +1,8 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from ...services.queue import queue
+import asyncio
+import json
 import logging
 
 # Configure logging
@@ -8,18 +11,15 @@ logger.setLevel(logging.INFO)
 
 router = APIRouter()
 
+# Comment line sent on idle streams so proxies don't close them
+KEEPALIVE_SECONDS = 15
+
 
 @router.get("/books/{book_id}/status")
 async def get_book_status(book_id: str):
     """Get the processing status for a book's chapters"""
     try:
-        logger.info(f"Status requested for book {book_id}")
-        logger.info(f"Current queue processing state: {queue.processing}")
-
-        status = queue.get_status(book_id)
-        logger.info(f"Status response for book {book_id}: {status}")
-
-        return status
+        return await queue.get_status(book_id)
     except Exception as e:
         logger.error(
             f"Error getting status for book {book_id}: {str(e)}", exc_info=True
@@ -27,13 +27,88 @@ async def get_book_status(book_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/books/{book_id}/status/stream")
+async def stream_book_status(book_id: str, request: Request):
+    """
+    Server-sent events: a `snapshot` of the book's status on connect, then a
+    `chapter` event for every chapter status change
+    """
+    subscriber = queue.subscribe(book_id)
+
+    async def events():
+        try:
+            yield _sse("snapshot", await queue.get_status(book_id))
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(
+                        subscriber.get(), timeout=KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    yield _sse("snapshot", await queue.get_status(book_id))
+                else:
+                    yield _sse("chapter", event)
+        finally:
+            queue.unsubscribe(book_id, subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.post("/books/{book_id}/chapters/{chapter_id}/retry")
 async def retry_chapter(book_id: str, chapter_id: str):
     """Retry processing a failed chapter"""
     try:
-        queue.retry_chapter(book_id, chapter_id)
+        await queue.retry_chapter(book_id, chapter_id)
         return {"status": "queued"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/books/{book_id}/summary-mode")
+async def get_summary_mode(book_id: str):
+    """Get how a book's summaries are generated"""
+    return {"mode": await queue.get_mode(book_id)}
+
+
+@router.put("/books/{book_id}/summary-mode")
+async def set_summary_mode(book_id: str, mode: str):
+    """Choose per-depth calls ("single") or one call for all depths ("all-depths")"""
+    try:
+        await queue.set_mode(book_id, mode)
+        return {"mode": mode}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/books/{book_id}/queue-weight")
+async def get_queue_weight(book_id: str):
+    """Get a book's share of the workers relative to other books"""
+    return {"weight": await queue.get_weight(book_id)}
+
+
+@router.put("/books/{book_id}/queue-weight")
+async def set_queue_weight(book_id: str, weight: float):
+    """Give a book a larger (e.g. 2) or smaller (e.g. 0.5) share of the workers"""
+    try:
+        await queue.set_weight(book_id, weight)
+        return {"weight": weight}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/queue/stats")
+async def get_queue_stats():
+    """Get a snapshot of the background worker pool"""
+    return queue.stats()
@@ -1,9 +1,25 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from ..caching import (
+    API_CACHE_CONTROL,
+    cached_json,
+    is_not_modified,
+    make_etag,
+    not_modified,
+)
 from ...services.books import BookService
-from ...summarizer import summarize_chapter_file
-from ...services.queue import ChapterTask, queue
+from ...services.queue import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    ChapterTask,
+    queue,
+)
+from ...services.segment_store import chapter_key, segments, summary_key
+from ...summarizer import forget_book_chapter_summaries
+from typing import List, Optional
+import asyncio
+import json
 import os
-from pathlib import Path
 
 router = APIRouter()
 
@@ -12,62 +28,207 @@ BOOKS_DIR = os.getenv("BOOKS_DIR", "./books")
 book_service = BookService(BOOKS_DIR)
 
 
+def _ndjson(event: dict) -> bytes:
+    return (json.dumps(event) + "\n").encode("utf-8")
+
+
+def _stored_summaries(
+    book_id: str, chapter_ids: List[str], depth: int
+) -> List[Optional[str]]:
+    """Each chapter's stored summary at `depth`, None where it is missing"""
+    store = segments.book(book_id)
+    return [
+        store.get_text(summary_key(chapter_id, depth)) for chapter_id in chapter_ids
+    ]
+
+
+def _delete_summaries(book_id: str, chapter_id: str) -> List[str]:
+    """Delete a chapter's stored summaries at every depth; returns their keys"""
+    store = segments.book(book_id)
+    return [
+        key
+        for key in (summary_key(chapter_id, depth) for depth in range(1, 5))
+        if store.delete(key)
+    ]
+
+
+async def _stream_book_summary(book: dict, depth: int):
+    """
+    NDJSON whole-book summary: the chapter list first, then each chapter's
+    summary as soon as it is available (cached ones immediately), then "done".
+    Missing chapters wait at background priority: many clients only read the
+    chapter list, and opening a book shouldn't jump its whole backfill ahead
+    of other users' requests.
+    """
+    chapters = [
+        (f"chapter-{i}", chapter["title"])
+        for i, chapter in enumerate(book["metadata"]["chapters"], 1)
+    ]
+    yield _ndjson(
+        {
+            "type": "book",
+            "id": "root",
+            "title": book["title"],
+            "depth": 0,
+            "sections": [
+                {"id": chapter_id, "title": title, "depth": depth}
+                for chapter_id, title in chapters
+            ],
+        }
+    )
+
+    async def section(chapter_id: str, title: str) -> dict:
+        try:
+            content = await queue.submit(
+                ChapterTask(
+                    book_id=book["id"],
+                    chapter_id=chapter_id,
+                    chapter_title=title,
+                    depth=depth,
+                    priority=PRIORITY_BACKGROUND,
+                )
+            )
+            return {
+                "type": "section",
+                "id": chapter_id,
+                "title": title,
+                "depth": depth,
+                "content": content,
+            }
+        except Exception as e:
+            return {"type": "error", "id": chapter_id, "error": str(e)}
+
+    stored = await asyncio.to_thread(
+        _stored_summaries, book["id"], [chapter_id for chapter_id, _ in chapters], depth
+    )
+    pending = []
+    try:
+        for (chapter_id, title), content in zip(chapters, stored):
+            if content is None:
+                # Hand it to the workers and stream it when it finishes
+                pending.append(asyncio.create_task(section(chapter_id, title)))
+                continue
+            yield _ndjson(
+                {
+                    "type": "section",
+                    "id": chapter_id,
+                    "title": title,
+                    "depth": depth,
+                    "content": content,
+                }
+            )
+        for next_done in asyncio.as_completed(pending):
+            yield _ndjson(await next_done)
+        yield _ndjson({"type": "done"})
+    finally:
+        # Client went away; the queued work still completes in the background
+        for task in pending:
+            task.cancel()
+
+
 @router.get("/summary/{book_id}")
-async def get_book_summary(book_id: str, depth: int = 1, section: str | None = None):
-    """Get summary for a book or specific section with configurable depth"""
+async def get_book_summary(
+    request: Request,
+    book_id: str,
+    depth: int = 1,
+    section: str | None = None,
+    stream: bool = False,
+):
+    """
+    Get summary for a book or specific section with configurable depth.
+    With `stream=true` the whole-book summary is sent as NDJSON while chapters
+    complete instead of after all of them.
+
+    Responses carry an ETag from the book's segment store version, so a
+    client that already has the current summaries gets a 304 without any
+    summary being read.
+    """
     try:
         # Get book details to verify it exists
-        book = book_service.get_book(book_id)
-        book_dir = Path(BOOKS_DIR) / book_id
+        book = await asyncio.to_thread(book_service.get_book, book_id)
+        store = await asyncio.to_thread(segments.book, book_id)
+
+        async def etag() -> str:
+            # Reading the version rescans the pack for other writers' appends
+            version = await asyncio.to_thread(lambda: store.version)
+            return make_etag(
+                book_id, depth, section, version, book["metadata"]["chapters"]
+            )
+
+        if not stream:
+            tag = await etag()
+            if is_not_modified(request, tag):
+                return not_modified(tag, API_CACHE_CONTROL)
 
         # If section is specified, get summary for that section
         if section and section.startswith("chapter-"):
             chapter_num = int(section.split("-")[1])
-            chapter_file = book_dir / "chapters" / f"chapter-{chapter_num}.txt"
-            summary_file = (
-                book_dir / "summaries" / f"chapter-{chapter_num}-depth-{depth}.txt"
+            chapters = book["metadata"]["chapters"]
+            title = (
+                chapters[chapter_num - 1]["title"]
+                if 0 < chapter_num <= len(chapters)
+                else section
             )
 
             # Check if summary exists
-            summary_text = None
-            if summary_file.exists():
-                with open(summary_file, "r") as f:
-                    summary_text = f.read()
-            else:
-                # Generate and save summary
-                summary_text = summarize_chapter_file(
-                    chapter_file, summary_file, depth=depth
+            summary_text = await asyncio.to_thread(
+                store.get_text, summary_key(section, depth)
+            )
+            if summary_text is None:
+                if not await asyncio.to_thread(
+                    store.__contains__, chapter_key(section)
+                ):
+                    raise FileNotFoundError(f"Chapter not found: {section}")
+                # Generate ahead of background work and wait for it
+                summary_text = await queue.submit(
+                    ChapterTask(
+                        book_id=book_id,
+                        chapter_id=f"chapter-{chapter_num}",
+                        chapter_title=title,
+                        depth=depth,
+                        priority=PRIORITY_INTERACTIVE,
+                    )
                 )
 
-            return {
-                "text": summary_text,
-                "id": section,
-                "title": f"Chapter {chapter_num}",
-                "depth": depth,
-            }
+            return cached_json(
+                request,
+                {
+                    "text": summary_text,
+                    "id": section,
+                    "title": f"Chapter {chapter_num}",
+                    "depth": depth,
+                },
+                etag=await etag(),
+            )
+
+        if stream:
+            return StreamingResponse(
+                _stream_book_summary(book, depth),
+                media_type="application/x-ndjson",
+            )
 
         # For initial summary (depth=1), return chapter list with basic summaries
         summaries = []
 
-        # Get all chapters
-        chapters_dir = book_dir / "chapters"
-        summaries_dir = book_dir / "summaries"
-        summaries_dir.mkdir(exist_ok=True)
-
-        # Process each chapter
-        for i, chapter in enumerate(book["metadata"]["chapters"], 1):
-            chapter_file = chapters_dir / f"chapter-{i}.txt"
-            summary_file = summaries_dir / f"chapter-{i}-depth-{depth}.txt"
-
-            # Check if summary exists
-            summary_text = None
-            if summary_file.exists():
-                with open(summary_file, "r") as f:
-                    summary_text = f.read()
-            else:
-                # Generate and save summary
-                summary_text = summarize_chapter_file(
-                    chapter_file, summary_file, depth=depth
+        # Process each chapter, queueing any missing summaries together
+        pending = {}
+        chapters = book["metadata"]["chapters"]
+        stored = await asyncio.to_thread(
+            _stored_summaries,
+            book_id,
+            [f"chapter-{i}" for i in range(1, len(chapters) + 1)],
+            depth,
+        )
+        for i, (chapter, summary_text) in enumerate(zip(chapters, stored), 1):
+            if summary_text is None:
+                pending[len(summaries)] = queue.submit(
+                    ChapterTask(
+                        book_id=book_id,
+                        chapter_id=f"chapter-{i}",
+                        chapter_title=chapter["title"],
+                        depth=depth,
+                        priority=PRIORITY_INTERACTIVE,
+                    )
                 )
 
             summaries.append(
@@ -79,13 +240,22 @@ async def get_book_summary(book_id: str, depth: int = 1, section: str | None = N
                 }
             )
 
-        return {
-            "id": "root",
-            "title": book["title"],
-            "content": "",  # Root content is empty, chapters contain content
-            "depth": 0,
-            "sections": summaries,
-        }
+        results = await asyncio.gather(*pending.values())
+        for index, summary_text in zip(pending, results):
+            summaries[index]["content"] = summary_text
+
+        # Taken after any generation above, which appended to the store
+        return cached_json(
+            request,
+            {
+                "id": "root",
+                "title": book["title"],
+                "content": "",  # Root content is empty, chapters contain content
+                "depth": 0,
+                "sections": summaries,
+            },
+            etag=await etag(),
+        )
 
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -98,7 +268,7 @@ async def get_non_chapters(book_id: str):
     """Get list of chapter IDs that are marked as non-chapters in metadata"""
     try:
         # Get book details to verify it exists
-        book = book_service.get_book(book_id)
+        book = await asyncio.to_thread(book_service.get_book, book_id)
 
         # Get non-chapters from metadata
         non_chapters = [
@@ -120,38 +290,20 @@ async def delete_chapter_summaries(book_id: str, chapter_id: str):
     """Delete all summaries for a specific chapter"""
     try:
         # Get book details to verify it exists
-        book_service.get_book(book_id)
-        book_dir = Path(BOOKS_DIR) / book_id
-        summaries_dir = book_dir / "summaries"
-
-        # Extract chapter number from chapter_id
-        chapter_num = int(chapter_id.split("-")[1])
+        await asyncio.to_thread(book_service.get_book, book_id)
 
         # Delete all depth summaries for this chapter
-        deleted_files = []
-        for depth in range(1, 5):  # Depths 1-4
-            summary_file = summaries_dir / f"chapter-{chapter_num}-depth-{depth}.txt"
-            if summary_file.exists():
-                summary_file.unlink()
-                deleted_files.append(str(summary_file))
-
-        # Update the chapter status in the queue to pending
-        if book_id in queue.processing:
-            if chapter_id in queue.processing[book_id]:
-                queue.processing[book_id][chapter_id]["status"] = "pending"
-
-        # Add chapter back to the queue for reprocessing
-        queue.queue.append(
-            ChapterTask(
-                book_id=book_id,
-                chapter_id=chapter_id,
-                chapter_title=f"Chapter {chapter_num}",
-            )
-        )
+        deleted_files = await asyncio.to_thread(_delete_summaries, book_id, chapter_id)
+
+        # Identical text would otherwise be refilled from the shared cache
+        await asyncio.to_thread(forget_book_chapter_summaries, book_id, chapter_id)
+
+        # Mark the chapter pending and queue it for reprocessing
+        await queue.requeue_chapter(book_id, chapter_id)
 
         return {
             "status": "success",
-            "message": f"Deleted {len(deleted_files)} summary files",
+            "message": f"Deleted {len(deleted_files)} summaries",
             "deleted_files": deleted_files,
         }
 
@@ -1,34 +1,53 @@
 from fastapi import APIRouter, UploadFile, HTTPException, File
-from ...processor import DocumentProcessor
+from ...processor import DocumentProcessor, ProcessedDocument
+from ...services.catalog import catalog
 from ...services.queue import queue
+import asyncio
 import os
 
 router = APIRouter()
 
 # Initialize document processor with the same books directory as queue
 BOOKS_DIR = os.getenv("BOOKS_DIR", "./books")
-doc_processor = DocumentProcessor(BOOKS_DIR)
+PARSE_WORKERS = os.getenv("PARSE_WORKERS")
+doc_processor = DocumentProcessor(
+    BOOKS_DIR, parse_workers=int(PARSE_WORKERS) if PARSE_WORKERS else None
+)
 
 
-@router.post("/upload")
+async def _queue_book(result: ProcessedDocument) -> None:
+    # Index the book and queue chapters once parsing has finished; sections
+    # the classifier flagged already have their "N/A" summaries saved
+    await asyncio.to_thread(catalog.refresh, result.book_id)
+    chapters = result.metadata["chapters"]
+    completed = {
+        f"chapter-{chapter['number']}"
+        for chapter in chapters
+        if chapter.get("isNonChapter", False)
+    }
+    await queue.add_book(result.book_id, chapters, completed)
+
+
+@router.post("/upload", status_code=202)
 async def upload_file(file: UploadFile = File(...)):
+    """Save an upload and return a job handle while it is parsed"""
     try:
         if not file.filename:
             raise ValueError("No filename provided")
 
-        # Process the document
-        result = await doc_processor.process_document(file)
-
-        # Queue chapters for processing
-        queue.add_book(result.book_id, result.metadata["chapters"])
-
-        return {
-            "bookId": result.book_id,
-            "title": result.title,
-            "formats": ["text", "markdown"],
-            "metadata": result.metadata,
-        }
+        # Duplicates come back already complete and are not re-queued
+        job = await doc_processor.start_document(file, on_complete=_queue_book)
+        return job.to_dict()
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """Get parse progress for an upload"""
+    job = doc_processor.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Upload job not found: {job_id}")
+    return job.to_dict()
@@ -0,0 +1,198 @@
+import json
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from .services.metadata_store import metadata_store
+from .services.segment_store import chapter_key, segments
+
+load_dotenv()
+
+# on: mark and skip non-chapters; dry-run: only record scores; off: neither
+CLASSIFIER_MODE = os.getenv("NON_CHAPTER_CLASSIFIER", "on")
+# Scores at or above this skip the LLM; kept high since a skipped story
+# chapter costs more than an extra call
+THRESHOLD = float(os.getenv("NON_CHAPTER_THRESHOLD", "0.9"))
+
+NON_CHAPTER_TITLE = re.compile(
+    r"^\W*(?:copyright|(?:table of )?contents|acknowledge?ments?|dedication|"
+    r"index|bibliography|references|(?:end)?notes|about the (?:author|publisher)|"
+    r"also by|other (?:books|titles) by|praise for|title page|half title|colophon|"
+    r"glossary|cover|permissions|credits|imprint|newsletter|sign up)\b",
+    re.IGNORECASE,
+)
+STORY_TITLE = re.compile(
+    r"^\W*(?:chapter|part|book|prologue|epilogue|interlude)\b", re.IGNORECASE
+)
+COPYRIGHT_MARKERS = re.compile(
+    r"all rights reserved|\bisbn\b|library of congress|printed in|first published|"
+    r"cataloging|reproduced in any form|©|\(c\) \d{4}",
+    re.IGNORECASE,
+)
+# Table-of-contents lines: short, ending in a page number or naming a chapter
+TOC_LINE = re.compile(
+    r"^\s*(?:(?:chapter|part)\b.{0,60}|.{1,60}?[\s.]\d{1,4})\s*$", re.IGNORECASE
+)
+QUOTES = re.compile(r"[\"“”]")
+
+# Log-odds weights of each feature and the prior
+WEIGHTS = {
+    "title": 4.0,
+    "storyTitle": -4.0,
+    "copyright": 2.5,
+    "tableOfContents": 3.0,
+    "short": 1.5,
+    "long": -3.0,
+    "digits": 2.0,
+    "edgePosition": 1.0,
+    "middlePosition": -1.5,
+    "dialogue": -1.5,
+}
+BIAS = -3.0
+
+
+@dataclass
+class Classification:
+    """Probability that a section is front/back matter, with its evidence"""
+
+    score: float
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def is_non_chapter(self) -> bool:
+        return self.score >= THRESHOLD
+
+
+def classify(title: str, text: str, position: int, total: int) -> Classification:
+    """
+    Score one section (position is 1-based) with a fixed logistic model over
+    title keywords, copyright and table-of-contents patterns, length, digit
+    ratio and position in the book. One pass over the text, no LLM call.
+    """
+    features = []
+    if NON_CHAPTER_TITLE.match(title):
+        features.append("title")
+    elif STORY_TITLE.match(title):
+        features.append("storyTitle")
+
+    # Copyright pages count once per marker, up to two
+    features += ["copyright"] * min(2, len(COPYRIGHT_MARKERS.findall(text)))
+
+    lines = [line for line in text.splitlines() if line.strip()]
+    if len(lines) >= 5 and sum(
+        bool(TOC_LINE.match(line)) for line in lines
+    ) >= 0.5 * len(lines):
+        features.append("tableOfContents")
+
+    words = len(text.split())
+    if words < 150:
+        features.append("short")
+    elif words > 1500:
+        features.append("long")
+
+    if text and sum(c.isdigit() for c in text) / len(text) > 0.05:
+        features.append("digits")
+
+    edge = max(1, math.ceil(total * 0.1))
+    if position <= edge or position > total - edge:
+        features.append("edgePosition")
+    else:
+        features.append("middlePosition")
+
+    if len(QUOTES.findall(text)) >= 4:
+        features.append("dialogue")
+
+    logit = BIAS + sum(WEIGHTS[feature] for feature in features)
+    return Classification(
+        score=1 / (1 + math.exp(-logit)),
+        reasons=[
+            feature for feature in dict.fromkeys(features) if WEIGHTS[feature] > 0
+        ],
+    )
+
+
+def report(book_dir: Path, threshold: Optional[float] = None) -> dict:
+    """
+    Dry-run the classifier over a saved book without changing anything:
+    per-chapter scores, how many LLM calls skipping would save, and
+    agreement with chapters already marked as non-chapters.
+    """
+    threshold = THRESHOLD if threshold is None else threshold
+    metadata = metadata_store.read(book_dir.name)
+    chapters = metadata["chapters"]
+    store = segments.book(book_dir.name)
+    rows = []
+    for chapter in chapters:
+        chapter_id = f"chapter-{chapter['number']}"
+        text = store.get_text(chapter_key(chapter_id)) or ""
+        result = classify(chapter["title"], text, chapter["number"], len(chapters))
+        rows.append(
+            {
+                "number": chapter["number"],
+                "title": chapter["title"],
+                "score": round(result.score, 3),
+                "nonChapter": result.score >= threshold,
+                "reasons": result.reasons,
+                "markedNonChapter": chapter.get("isNonChapter", False),
+            }
+        )
+
+    flagged = sum(row["nonChapter"] for row in rows)
+    marked = [row for row in rows if row["markedNonChapter"]]
+    return {
+        "bookId": book_dir.name,
+        "title": metadata.get("title"),
+        "threshold": threshold,
+        "totalChapters": len(rows),
+        "flagged": flagged,
+        # One call per skipped chapter in all-depths mode, up to four in single
+        "llmCallsSaved": {"allDepths": flagged, "singleMode": flagged * 4},
+        "agreement": {
+            "both": sum(row["nonChapter"] for row in marked),
+            "classifierOnly": sum(
+                row["nonChapter"] and not row["markedNonChapter"] for row in rows
+            ),
+            "markedOnly": sum(not row["nonChapter"] for row in marked),
+        },
+        "chapters": rows,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Dry-run the non-chapter classifier over saved books"
+    )
+    parser.add_argument("book_ids", nargs="*", help="Books to report on (default: all)")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument(
+        "--summary", action="store_true", help="Omit the per-chapter rows"
+    )
+    args = parser.parse_args()
+
+    books_dir = Path(os.getenv("BOOKS_DIR", "./books"))
+    book_ids = args.book_ids or sorted(
+        entry.name
+        for entry in books_dir.iterdir()
+        if (entry / "metadata.json").exists()
+    )
+    reports = [report(books_dir / book_id, args.threshold) for book_id in book_ids]
+    if args.summary:
+        for book_report in reports:
+            book_report.pop("chapters")
+    print(
+        json.dumps(
+            {
+                "books": reports,
+                "totalFlagged": sum(r["flagged"] for r in reports),
+                "totalChapters": sum(r["totalChapters"] for r in reports),
+            },
+            indent=2,
+        )
+    )
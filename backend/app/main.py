@@ -1,15 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 import os
-import asyncio
 from pathlib import Path
 
-from .api.routes.upload import router as upload_router
+from .api.caching import CachedStaticFiles, CompressionMiddleware
+from .api.routes.upload import router as upload_router, doc_processor
 from .api.routes.books import router as books_router
 from .api.routes.summary import router as summary_router
 from .api.routes.status import router as status_router
+from .api.routes.metrics import router as metrics_router
+from .services.metadata_store import metadata_store
 from .services.queue import queue
 
 # Load environment variables
@@ -29,29 +30,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the frontend read validators for conditional requests
+    expose_headers=["ETag"],
 )
+# Brotli or gzip for buffered responses; SSE and NDJSON streams pass through
+app.add_middleware(CompressionMiddleware)
 
 # Mount the books directory for serving uploaded files
-app.mount("/books", StaticFiles(directory=str(books_dir)), name="books")
+app.mount("/books", CachedStaticFiles(directory=str(books_dir)), name="books")
 
 # Include routers
 app.include_router(upload_router, prefix="/api", tags=["upload"])
 app.include_router(books_router, prefix="/api", tags=["books"])
 app.include_router(summary_router, prefix="/api", tags=["summary"])
 app.include_router(status_router, prefix="/api", tags=["status"])
-
-
-# Background task to process queue
-async def process_queue():
-    while True:
-        queue.process_next()
-        await asyncio.sleep(1)  # Sleep for rate limit
+# Served at the root, where Prometheus scrapes by default
+app.include_router(metrics_router, tags=["metrics"])
 
 
 # Start background processing on startup
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(process_queue())
+    await queue.start()
+
+
+# Let in-flight chapters finish before the process exits
+@app.on_event("shutdown")
+async def shutdown_event():
+    await queue.stop()
+    metadata_store.flush_all()
+    doc_processor.shutdown()
 
 
 @app.get("/")
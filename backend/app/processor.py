@@ -1,9 +1,18 @@
 import os
-import json
 import re
+import math
+import time
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import shutil
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Literal, cast, List, Optional, Dict
-from dataclasses import dataclass
+from typing import Awaitable, Callable, Literal, cast, List, Optional, Dict, Tuple
+from dataclasses import dataclass, field
 
 import PyPDF2 as pypdf
 import pypandoc
@@ -11,11 +20,30 @@ import ebooklib
 from ebooklib import epub
 from bs4 import BeautifulSoup
 from fastapi import UploadFile
+import aiofiles
 import subprocess
 
+from .classifier import CLASSIFIER_MODE, classify
+from .services.metadata_store import metadata_store
+from .services.metrics import NON_CHAPTERS, PARSE_BYTES, PARSE_DURATION
+from .services.segment_store import chapter_key, segments, summary_key
+from .services.singleflight import SingleFlight
+
 FileType = Literal["pdf", "epub", "mobi"]
 OutputFormat = Literal["text", "markdown"]
 
+# Uploads are streamed to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Upper bound on PDF pages extracted by one worker task
+PDF_PAGES_PER_TASK = 50
+# Finished parse jobs kept around for status polling
+MAX_FINISHED_JOBS = 1000
+# Chapters longer than this are split at paragraph boundaries (~30k tokens)
+MAX_CHAPTER_CHARS = int(os.getenv("MAX_CHAPTER_CHARS", "120000"))
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
 
 @dataclass
 class Chapter:
@@ -24,211 +52,832 @@ class Chapter:
     start_page: int = 0
 
 
+@dataclass
+class Block:
+    kind: Literal["heading", "paragraph", "item"]
+    text: str
+    level: int = 1
+
+
+@dataclass
+class Section:
+    title: str
+    text: str
+    # None means "derive from text when needed"
+    blocks: Optional[List[Block]] = None
+
+
+@dataclass
+class IntermediateDocument:
+    """Single parse of a book from which both text and markdown are derived"""
+
+    sections: List[Section]
+    # Chapter starts from the book's own structure (PDF outline, EPUB TOC),
+    # as (section index, title) in section order; None means detect from text
+    boundaries: Optional[List[Tuple[int, str]]] = None
+
+    def to_text(self) -> str:
+        return "\n\n".join(section.text for section in self.sections if section.text)
+
+    def to_markdown(self) -> str:
+        rendered = []
+        for section in self.sections:
+            blocks = section.blocks
+            if blocks is None:
+                blocks = text_to_blocks(section.text)
+            for block in blocks:
+                if block.kind == "heading":
+                    rendered.append("#" * block.level + " " + block.text)
+                elif block.kind == "item":
+                    rendered.append("- " + block.text)
+                else:
+                    rendered.append(block.text)
+        return "\n\n".join(rendered)
+
+    def chapters(self) -> List[Chapter]:
+        if not self.boundaries:
+            return detect_chapters(self.to_text())
+        chapters = []
+        starts = self.boundaries
+        # Anything before the first entry (cover, copyright) is kept as its own
+        if starts[0][0] > 0:
+            starts = [(0, "Front Matter")] + starts
+        for (start, title), (end, _) in zip(starts, starts[1:] + [(None, "")]):
+            text = "\n\n".join(
+                section.text for section in self.sections[start:end] if section.text
+            )
+            if text.strip():
+                chapters.append(Chapter(title=title, content=text, start_page=start))
+        return balance_chapters(chapters)
+
+
 @dataclass
 class ProcessedDocument:
     book_id: str
     title: str
-    text_content: str
-    markdown_content: str
     metadata: Dict
+    duplicate: bool = False
 
 
-class DocumentProcessor:
-    def __init__(self, books_dir: str):
-        self.books_dir = Path(books_dir)
-        self.books_dir.mkdir(parents=True, exist_ok=True)
+@dataclass
+class ParseJob:
+    job_id: str
+    book_id: str
+    title: str
+    status: str = "queued"  # queued | parsing | complete | error
+    progress: float = 0.0
+    error: Optional[str] = None
+    result: Optional[ProcessedDocument] = None
+    created_at: float = field(default_factory=time.time)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    exception: Optional[BaseException] = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "jobId": self.job_id,
+            "bookId": self.book_id,
+            "title": self.title,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "error": self.error,
+            "formats": ["text", "markdown"],
+            "metadata": self.result.metadata if self.result else None,
+        }
 
-    def _get_file_type(self, filename: str) -> FileType:
-        ext = filename.lower().split(".")[-1]
-        if ext not in ["pdf", "epub", "mobi"]:
-            raise ValueError(f"Unsupported file type: {ext}")
-        return cast(FileType, ext)
 
-    def _clean_text(self, text: str) -> str:
-        """Clean extracted text"""
-        # Remove multiple newlines
-        text = re.sub(r"\n{3,}", "\n\n", text)
-        # Remove multiple spaces
-        text = re.sub(r" +", " ", text)
-        # Fix common OCR issues
-        text = text.replace("|", "I")  # Common OCR mistake
-        return text.strip()
-
-    def _detect_chapters(
-        self, text: str, page_numbers: Optional[List[int]] = None
-    ) -> List[Chapter]:
-        """Basic chapter detection"""
-        chapters = []
-
-        # Simple regex for chapter detection
-        chapter_pattern = re.compile(
-            r"^(?:Chapter|CHAPTER)\s+(?:[0-9]+|[IVXLC]+)[.\s]*(.*?)(?:\n|$)",
-            re.MULTILINE,
+# Parsing helpers are module-level so they can run in worker processes
+
+NUMBER_WORDS = (
+    "one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|thirteen|"
+    "fourteen|fifteen|sixteen|seventeen|eighteen|nineteen|twenty|thirty|forty|"
+    "fifty|sixty|seventy|eighty|ninety"
+)
+# Simple regex for chapter detection
+CHAPTER_PATTERN = re.compile(
+    r"^(?:Chapter|CHAPTER)\s+(?:[0-9]+|[IVXLC]+)[.:\t ]*(.*?)(?:\n|$)",
+    re.MULTILINE,
+)
+# Broader heading heuristics, tried when CHAPTER_PATTERN finds too little:
+# spelled-out chapter numbers, parts/books, and standalone section names
+HEADING_PATTERN = re.compile(
+    r"^[ \t]*(?:"
+    r"(?:chapter|part|book)\s+(?:[0-9]+|[ivxlc]+|(?:"
+    + NUMBER_WORDS
+    + r")(?:[- ](?:"
+    + NUMBER_WORDS
+    + r"))?)\b[^\n]{0,80}"
+    r"|(?:prologue|epilogue|preface|foreword|introduction|afterword)[ \t]*"
+    r")$",
+    re.MULTILINE | re.IGNORECASE,
+)
+# Below this many characters a "chapter" is just a heading with no body
+MIN_CHAPTER_CHARS = 200
+HTML_BLOCK_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "blockquote", "pre"]
+
+
+def clean_text(text: str) -> str:
+    """Clean extracted text"""
+    # Remove multiple newlines
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    # Remove multiple spaces
+    text = re.sub(r" +", " ", text)
+    # Fix common OCR issues
+    text = text.replace("|", "I")  # Common OCR mistake
+    return text.strip()
+
+
+def _split_on_matches(text: str, matches: List[re.Match]) -> List[Chapter]:
+    chapters = []
+    # Text before the first heading (title page, copyright) is kept as its own
+    if matches and text[: matches[0].start()].strip():
+        chapters.append(
+            Chapter(title="Front Matter", content=text[: matches[0].start()].strip())
         )
+    for i, match in enumerate(matches):
+        start = match.start()
+        end = matches[i + 1].start() if i < len(matches) - 1 else len(text)
+
+        title = match.group().strip()
+        content = text[start:end].strip()
+
+        chapters.append(Chapter(title=title, content=content))
+    return chapters
+
+
+def detect_chapters(text: str) -> List[Chapter]:
+    """
+    Heading-based chapter detection for books without usable structure:
+    "Chapter N" headings first, then broader heading heuristics, then
+    balanced paragraph-aligned parts. Each pass is a single regex scan.
+    """
+    chapters = []
+    for pattern in (CHAPTER_PATTERN, HEADING_PATTERN):
+        matches = list(pattern.finditer(text))
+        # A table of contents also matches; headings need a body after them
+        matches = [
+            match
+            for i, match in enumerate(matches)
+            if (matches[i + 1].start() if i + 1 < len(matches) else len(text))
+            - match.end()
+            >= MIN_CHAPTER_CHARS
+        ]
+        if len(matches) >= 2:
+            chapters = _split_on_matches(text, matches)
+            break
+
+    # If no chapters found, treat as single chapter
+    if not chapters:
+        chapters = [Chapter(title="Full Text", content=text)]
+
+    return balance_chapters(chapters)
+
+
+def balance_chapters(
+    chapters: List[Chapter], max_chars: int = MAX_CHAPTER_CHARS
+) -> List[Chapter]:
+    """
+    Split chapters longer than max_chars into roughly equal parts at paragraph
+    boundaries, so prompt sizes stay predictable and work spreads across the
+    queue. Linear in the total text length.
+    """
+    balanced = []
+    for chapter in chapters:
+        if len(chapter.content) <= max_chars:
+            balanced.append(chapter)
+            continue
+        paragraphs = re.split(r"\n\s*\n", chapter.content)
+        parts = math.ceil(len(chapter.content) / max_chars)
+        target = len(chapter.content) / parts
+        pieces, current, size = [], [], 0
+        for paragraph in paragraphs:
+            if current and size + len(paragraph) > target and len(pieces) < parts - 1:
+                pieces.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(paragraph)
+            size += len(paragraph) + 2
+        pieces.append("\n\n".join(current))
+        for i, piece in enumerate(pieces, 1):
+            title = (
+                chapter.title
+                if len(pieces) == 1
+                else f"{chapter.title} ({i}/{len(pieces)})"
+            )
+            balanced.append(
+                Chapter(title=title, content=piece, start_page=chapter.start_page)
+            )
+    return balanced
 
-        # Split text into potential chapters
-        matches = list(chapter_pattern.finditer(text))
-
-        for i, match in enumerate(matches):
-            start = match.start()
-            end = matches[i + 1].start() if i < len(matches) - 1 else len(text)
-
-            title = match.group().strip()
-            content = text[start:end].strip()
 
-            chapters.append(Chapter(title=title, content=content))
+def _outline_entries(pdf: pypdf.PdfReader, outline: list) -> List[Tuple[int, str]]:
+    """(page index, title) for one level of a PDF outline"""
+    entries = []
+    for item in outline:
+        if isinstance(item, list):
+            continue  # Children of the previous entry
+        try:
+            page = pdf.get_destination_page_number(item)
+        except Exception:
+            continue
+        if page is not None and page >= 0:
+            entries.append((page, str(item.title).strip() or "Untitled Chapter"))
+    return entries
+
+
+def read_pdf_structure(file_path: str) -> Tuple[int, List[Tuple[int, str]]]:
+    """Page count and chapter starts from the PDF outline (bookmarks)"""
+    with open(file_path, "rb") as file:
+        pdf = pypdf.PdfReader(file)
+        page_count = len(pdf.pages)
+        try:
+            outline = pdf.outline
+        except Exception:
+            return page_count, []
+        entries = _outline_entries(pdf, outline)
+        # A single top-level entry (the book title) wrapping the real chapters
+        if len(entries) <= 1:
+            children = next((item for item in outline if isinstance(item, list)), [])
+            entries = _outline_entries(pdf, children) or entries
+    return page_count, _clean_boundaries(entries)
+
+
+def _clean_boundaries(entries: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    """Order chapter starts and drop entries sharing a start with an earlier one"""
+    boundaries = []
+    for start, title in sorted(entries, key=lambda entry: entry[0]):
+        if boundaries and boundaries[-1][0] == start:
+            continue
+        boundaries.append((start, title))
+    # A lone entry carries no structure
+    return boundaries if len(boundaries) >= 2 else []
+
+
+def extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Extract text from pages [start, end) of a PDF using PyPDF2"""
+    with open(file_path, "rb") as file:
+        pdf = pypdf.PdfReader(file)
+        return [pdf.pages[i].extract_text() for i in range(start, end)]
+
+
+def text_to_blocks(text: str) -> List[Block]:
+    """Split plain text into paragraphs, promoting chapter headings"""
+    blocks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        first_line, _, rest = paragraph.partition("\n")
+        if CHAPTER_PATTERN.match(first_line):
+            blocks.append(Block(kind="heading", text=first_line.strip()))
+            paragraph = rest
+        if paragraph.strip():
+            blocks.append(Block(kind="paragraph", text=" ".join(paragraph.split())))
+    return blocks
+
+
+def html_to_section(html: str | bytes) -> Section:
+    """Parse one HTML document into a section with text and markdown blocks"""
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Get chapter title if available
+    chapter_title = soup.find(["h1", "h2"])
+    title = chapter_title.get_text().strip() if chapter_title else "Untitled Chapter"
+
+    blocks = []
+    for element in soup.find_all(HTML_BLOCK_TAGS):
+        # Only leaf blocks, so nested content isn't rendered twice
+        if element.find(HTML_BLOCK_TAGS):
+            continue
+        text = " ".join(element.get_text().split())
+        if not text:
+            continue
+        if element.name[0] == "h":
+            blocks.append(Block(kind="heading", text=text, level=int(element.name[1])))
+        elif element.name == "li":
+            blocks.append(Block(kind="item", text=text))
+        else:
+            blocks.append(Block(kind="paragraph", text=text))
+
+    return Section(title=title, text=soup.get_text().strip(), blocks=blocks)
+
+
+def _toc_entries(toc: list) -> List[Tuple[str, str]]:
+    """(href without fragment, title) for the top level of an epub TOC"""
+    entries = []
+    for entry in toc:
+        if isinstance(entry, tuple):
+            # (Section, children): use the section's own target if it has one,
+            # otherwise its first child
+            section, children = entry
+            href = getattr(section, "href", None)
+            if not href and children:
+                first = children[0]
+                href = getattr(
+                    first[0] if isinstance(first, tuple) else first, "href", None
+                )
+            title = section.title
+        else:
+            href, title = getattr(entry, "href", None), entry.title
+        if href:
+            entries.append((href.split("#")[0], (title or "").strip()))
+    return entries
+
+
+def parse_epub(file_path: str) -> IntermediateDocument:
+    """
+    Parse an epub with ebooklib in spine (reading) order. Chapters start at
+    the documents the navigation (nav/NCX TOC) points to; without a usable
+    TOC each document is a chapter.
+    """
+    book = epub.read_epub(file_path)
+    documents = {
+        item.get_id(): item
+        for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT)
+        if not isinstance(item, epub.EpubNav)
+    }
+    ordered = [documents.pop(idref) for idref, _ in book.spine if idref in documents]
+    # Documents missing from the spine go last, in manifest order
+    ordered.extend(documents.values())
+
+    sections = []
+    positions = {}
+    for item in ordered:
+        section = html_to_section(item.get_content())
+        if section.text:  # Only add non-empty chapters
+            positions.setdefault(item.get_name(), len(sections))
+            sections.append(section)
+
+    boundaries = _clean_boundaries(
+        [
+            (positions[href], title or sections[positions[href]].title)
+            for href, title in _toc_entries(book.toc)
+            if href in positions
+        ]
+    )
+    if not boundaries:
+        boundaries = [(i, section.title) for i, section in enumerate(sections)]
+    return IntermediateDocument(sections=sections, boundaries=boundaries)
+
+
+def parse_with_pandoc(file_path: str, file_type: str) -> IntermediateDocument:
+    """Convert a document to HTML with a single pandoc run and parse that"""
+    try:
+        html = pypandoc.convert_file(
+            file_path, "html", format=file_type, extra_args=["--wrap=none"]
+        )
+    except Exception as e:
+        print(f"Conversion failed: {e}")
+        html = ""  # Fallback to empty document if conversion fails
+    return split_on_headings(html_to_section(html))
+
+
+def split_on_headings(section: Section) -> IntermediateDocument:
+    """
+    Split one converted document at its top-level headings: the highest
+    heading level that occurs at least twice. Falls back to text detection.
+    """
+    blocks = section.blocks or []
+    levels = [block.level for block in blocks if block.kind == "heading"]
+    level = next((lvl for lvl in sorted(set(levels)) if levels.count(lvl) >= 2), None)
+    if level is None:
+        return IntermediateDocument(sections=[section])
+
+    sections = [Section(title="Front Matter", text="", blocks=[])]
+    for block in blocks:
+        if block.kind == "heading" and block.level == level:
+            sections.append(Section(title=block.text, text="", blocks=[]))
+        sections[-1].blocks.append(block)
+    for part in sections:
+        part.text = "\n\n".join(block.text for block in part.blocks)
+    if not sections[0].blocks:
+        sections.pop(0)
+    return IntermediateDocument(
+        sections=sections,
+        boundaries=[(i, part.title) for i, part in enumerate(sections)],
+    )
+
+
+def parse_pdf(file_path: str) -> IntermediateDocument:
+    """Parse a PDF in-process, one section per page"""
+    page_count, boundaries = read_pdf_structure(file_path)
+    pages = extract_pdf_pages(file_path, 0, page_count)
+    return IntermediateDocument(
+        sections=[Section(title="", text=p) for p in pages],
+        boundaries=boundaries or None,
+    )
+
+
+def render_document(file_path: str, file_type: str, output: OutputFormat) -> str:
+    """Re-parse an original upload and render it in the requested format"""
+    if file_type == "pdf":
+        document = parse_pdf(file_path)
+    elif file_type == "epub":
+        document = parse_epub(file_path)
+    else:
+        document = parse_with_pandoc(file_path, file_type)
+    if output == "markdown":
+        return document.to_markdown()
+    return clean_text(document.to_text())
 
-        # If no chapters found, treat as single chapter
-        if not chapters:
-            chapters = [Chapter(title="Full Text", content=text)]
 
-        return chapters
+class DocumentProcessor:
+    def __init__(self, books_dir: str, parse_workers: Optional[int] = None):
+        self.books_dir = Path(books_dir)
+        self.books_dir.mkdir(parents=True, exist_ok=True)
+        self.uploads_dir = self.books_dir / ".uploads"
+        self.uploads_dir.mkdir(exist_ok=True)
+        self.fingerprints_dir = self.books_dir / ".fingerprints"
+        self.fingerprints_dir.mkdir(exist_ok=True)
+        self.parse_workers = parse_workers or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Bumped whenever a broken pool is replaced
+        self._pool_generation = 0
+        self.jobs: "OrderedDict[str, ParseJob]" = OrderedDict()
+        # Jobs still parsing, so identical concurrent uploads share one
+        self._running: Dict[str, ParseJob] = {}
+        # Full-book renders being materialized, keyed on (book_id, format)
+        self._renders = SingleFlight()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawn keeps forked children clear of the parent's threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
 
-    def _process_epub(self, file_path: Path) -> tuple[str, str, List[Chapter]]:
-        """Process epub file using ebooklib to extract text, markdown and chapters.
+    def shutdown(self) -> None:
+        """Stop the parsing worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
-        Returns a tuple of (text_content, markdown_content, chapters).
+    def _replace_broken_pool(self, generation: int) -> None:
         """
-        book = epub.read_epub(str(file_path))
-
-        # Extract metadata
-        title = (
-            book.get_metadata("DC", "title")[0][0]
-            if book.get_metadata("DC", "title")
-            else ""
+        Drop a pool whose worker died (crash, OOM kill) so the next call
+        starts a fresh one. Every caller that saw the same broken pool
+        passes the same generation, so it is only replaced once.
+        """
+        if generation == self._pool_generation:
+            logger.warning("A parsing worker died; restarting the process pool")
+            self.shutdown()
+            self._pool_generation += 1
+
+    async def _stream_to_disk(self, file: UploadFile) -> tuple[Path, str]:
+        """Stream an upload to a temporary file, returning its path and sha256"""
+        digest = hashlib.sha256()
+        tmp_path = self.uploads_dir / f"{os.urandom(8).hex()}.part"
+        try:
+            async with aiofiles.open(tmp_path, "wb") as out:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    digest.update(chunk)
+                    await out.write(chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return tmp_path, digest.hexdigest()
+
+    def _find_by_fingerprint(self, fingerprint: str) -> Optional[ProcessedDocument]:
+        """Return the already-processed book with this file hash, if any"""
+        fingerprint_file = self.fingerprints_dir / fingerprint
+        if not fingerprint_file.exists():
+            return None
+        book_id = fingerprint_file.read_text().strip()
+        try:
+            metadata = metadata_store.read(book_id)
+        except FileNotFoundError:
+            # The book was deleted; forget the stale fingerprint
+            fingerprint_file.unlink(missing_ok=True)
+            return None
+        return ProcessedDocument(
+            book_id=book_id,
+            title=metadata.get("title", book_id),
+            metadata=metadata,
+            duplicate=True,
         )
 
-        chapters = []
-        text_content = []
-        markdown_content = []
+    def _get_file_type(self, filename: str) -> FileType:
+        ext = filename.lower().split(".")[-1]
+        if ext not in ["pdf", "epub", "mobi"]:
+            raise ValueError(f"Unsupported file type: {ext}")
+        return cast(FileType, ext)
 
-        # Process each document in the epub
-        for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
-            # Convert HTML content to text and markdown
-            soup = BeautifulSoup(item.get_content(), "html.parser")
+    async def get_content(self, book_id: str, output: OutputFormat) -> Path:
+        """Return the full-book text or markdown, rendering it on first request"""
+        book_dir = self.books_dir / book_id
+        metadata = metadata_store.read(book_id)
 
-            # Get chapter title if available
-            chapter_title = soup.find(["h1", "h2"])
-            title = (
-                chapter_title.get_text().strip()
-                if chapter_title
-                else "Untitled Chapter"
+        content_path = book_dir / (
+            "content.md" if output == "markdown" else "content.txt"
+        )
+        if content_path.exists():
+            return content_path
+
+        async def render() -> Path:
+            source = book_dir / metadata["title"]
+            if not source.exists():
+                raise FileNotFoundError(f"Original file not found for book: {book_id}")
+            for attempt in range(2):
+                generation = self._pool_generation
+                try:
+                    content = await asyncio.get_running_loop().run_in_executor(
+                        self.executor,
+                        render_document,
+                        str(source),
+                        metadata["file_type"],
+                        output,
+                    )
+                    break
+                except BrokenProcessPool:
+                    self._replace_broken_pool(generation)
+                    if attempt:
+                        raise
+            # Text and markdown renders of a book can run at the same time
+            tmp_path = content_path.with_name(
+                f"{content_path.name}.{os.urandom(8).hex()}.tmp"
             )
 
-            # Get chapter content
-            content = soup.get_text().strip()
+            def write() -> None:
+                tmp_path.write_text(content, encoding="utf-8")
+                os.replace(tmp_path, content_path)
+
+            await asyncio.to_thread(write)
+            return content_path
+
+        return await self._renders.do((book_id, output), render)
+
+    def get_job(self, job_id: str) -> Optional[ParseJob]:
+        return self.jobs.get(job_id)
+
+    def _register(self, job: ParseJob) -> ParseJob:
+        self.jobs[job.job_id] = job
+        # Forget the oldest finished jobs
+        finished = [
+            job_id
+            for job_id, j in self.jobs.items()
+            if j.status in ("complete", "error")
+        ]
+        for job_id in finished[: max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+        return job
+
+    async def start_document(
+        self,
+        file: UploadFile,
+        on_complete: Optional[Callable[[ProcessedDocument], Awaitable[None]]] = None,
+    ) -> ParseJob:
+        """Save an upload and start parsing it in the background"""
+        file_type = self._get_file_type(file.filename)
 
-            if content:  # Only add non-empty chapters
-                chapters.append(
-                    Chapter(
-                        title=title,
-                        content=content,
-                        start_page=len(chapters),  # Chapter index as page
-                    )
+        # Save uploaded file without holding it in memory
+        tmp_path, fingerprint = await self._stream_to_disk(file)
+
+        # An identical upload is already being parsed
+        running = self._running.get(fingerprint)
+        # Byte-identical uploads reuse the existing book
+        existing = None if running else self._find_by_fingerprint(fingerprint)
+        if running or existing:
+            tmp_path.unlink(missing_ok=True)
+            if running:
+                return running
+            return self._register(
+                ParseJob(
+                    job_id=os.urandom(8).hex(),
+                    book_id=existing.book_id,
+                    title=existing.title,
+                    status="complete",
+                    progress=1.0,
+                    result=existing,
                 )
-                text_content.append(content)
-                markdown_content.append(str(soup))
+            )
 
-        return ("\n\n".join(text_content), "\n\n".join(markdown_content), chapters)
+        job = self._register(
+            ParseJob(
+                job_id=os.urandom(8).hex(),
+                book_id=file.filename.replace(".", "_") + "_" + os.urandom(4).hex(),
+                title=file.filename,
+            )
+        )
+        self._running[fingerprint] = job
+        job.task = asyncio.create_task(
+            self._run_job(job, tmp_path, file_type, fingerprint, on_complete)
+        )
+        return job
+
+    async def wait_for(self, job: ParseJob) -> ProcessedDocument:
+        """Wait for a parse job and return its result, re-raising failures"""
+        if job.task is not None:
+            await asyncio.shield(job.task)
+        if job.exception is not None:
+            raise job.exception
+        return job.result
 
     async def process_document(self, file: UploadFile) -> ProcessedDocument:
         """Process uploaded document and return processed content"""
-        file_type = self._get_file_type(file.filename)
+        return await self.wait_for(await self.start_document(file))
+
+    async def _run_job(
+        self,
+        job: ParseJob,
+        tmp_path: Path,
+        file_type: FileType,
+        fingerprint: str,
+        on_complete: Optional[Callable[[ProcessedDocument], Awaitable[None]]],
+    ) -> None:
+        started = time.time()
+        job.status = "parsing"
+        try:
+            size = tmp_path.stat().st_size
+            for attempt in range(2):
+                generation = self._pool_generation
+                try:
+                    job.result = await self._process_saved_file(
+                        job, tmp_path, file_type, fingerprint
+                    )
+                    break
+                except BrokenProcessPool:
+                    # Retry once on a new pool; a second crash is most
+                    # likely caused by this file
+                    self._replace_broken_pool(generation)
+                    if attempt:
+                        raise
+                    logger.warning(f"Retrying {job.title} on a new worker pool")
+            job.status = "complete"
+            job.progress = 1.0
+            PARSE_DURATION.observe(time.time() - started, file_type)
+            PARSE_BYTES.inc(file_type, amount=size)
+            logger.info(
+                f"Parsed {job.title} into {job.result.metadata['chapter_count']} "
+                f"chapters in {time.time() - started:.2f}s"
+            )
+            if on_complete:
+                await on_complete(job.result)
+        except Exception as e:
+            job.status = "error"
+            job.error = str(e)
+            job.exception = e
+            logger.error(f"Failed to parse {job.title}: {str(e)}", exc_info=True)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+            self._running.pop(fingerprint, None)
+
+    async def _extract_pdf(
+        self, job: ParseJob, file_path: Path
+    ) -> IntermediateDocument:
+        """Extract PDF text with page ranges spread across worker processes"""
+        loop = asyncio.get_running_loop()
+        page_count, boundaries = await loop.run_in_executor(
+            self.executor, read_pdf_structure, str(file_path)
+        )
+        step = max(
+            1, min(PDF_PAGES_PER_TASK, math.ceil(page_count / self.parse_workers))
+        )
+        futures = [
+            loop.run_in_executor(
+                self.executor,
+                extract_pdf_pages,
+                str(file_path),
+                start,
+                min(start + step, page_count),
+            )
+            for start in range(0, page_count, step)
+        ]
+        pages_done = 0
+        for next_done in asyncio.as_completed(futures):
+            pages_done += len(await next_done)
+            job.progress = 0.8 * pages_done / page_count
+        # Merge back in page order
+        return IntermediateDocument(
+            sections=[
+                Section(title="", text=page)
+                for future in futures
+                for page in future.result()
+            ],
+            boundaries=boundaries or None,
+        )
 
-        # Create unique book directory
-        book_id = file.filename.replace(".", "_") + "_" + os.urandom(4).hex()
+    async def _process_saved_file(
+        self, job: ParseJob, tmp_path: Path, file_type: FileType, fingerprint: str
+    ) -> ProcessedDocument:
+        """
+        Parse a streamed upload into a new book directory. On failure the
+        upload is moved back to tmp_path and the directory is removed.
+        """
+        # Create book directory
+        book_id = job.book_id
         book_dir = self.books_dir / book_id
         book_dir.mkdir(parents=True)
 
-        # Create chapters and summaries directories
-        chapters_dir = book_dir / "chapters"
-        chapters_dir.mkdir()
-        summaries_dir = book_dir / "summaries"
-        summaries_dir.mkdir()
+        # Move uploaded file into place
+        file_path = book_dir / job.title
+        os.replace(tmp_path, file_path)
 
-        # Save uploaded file
-        file_path = book_dir / file.filename
-        content = await file.read()
-        file_path.write_bytes(content)
-
-        # Process based on file type
+        try:
+            return await self._parse_into(
+                job, book_dir, file_path, file_type, fingerprint
+            )
+        except BaseException:
+            if file_path.exists():
+                os.replace(file_path, tmp_path)
+            segments.close(book_id)
+            metadata_store.forget(book_id)
+            shutil.rmtree(book_dir, ignore_errors=True)
+            raise
+
+    async def _parse_into(
+        self,
+        job: ParseJob,
+        book_dir: Path,
+        file_path: Path,
+        file_type: FileType,
+        fingerprint: str,
+    ) -> ProcessedDocument:
+        """Parse the uploaded file and save it as a book in book_dir"""
+        # Parse once, off the event loop; markdown is rendered only on request
+        loop = asyncio.get_running_loop()
         if file_type == "pdf":
-            text_content = self._process_pdf(file_path)
-            # For PDF, we'll use pandoc to convert to markdown
-            markdown_content = self._convert_to_markdown(file_path)
-            # Detect chapters from text content
-            chapters = self._detect_chapters(text_content)
+            document = await self._extract_pdf(job, file_path)
         elif file_type == "epub":
             # Use dedicated epub processing
-            text_content, markdown_content, chapters = self._process_epub(file_path)
+            document = await loop.run_in_executor(
+                self.executor, parse_epub, str(file_path)
+            )
         else:
             # For other formats (mobi), still use pandoc
-            text_content = self._process_epub_mobi(file_path, file_type, "plain")
-            markdown_content = self._process_epub_mobi(file_path, file_type, "markdown")
-            chapters = self._detect_chapters(text_content)
+            document = await loop.run_in_executor(
+                self.executor, parse_with_pandoc, str(file_path), file_type
+            )
+        if document.boundaries:
+            chapters = document.chapters()
+        else:
+            # Detect chapters from text content
+            chapters = await loop.run_in_executor(
+                self.executor, detect_chapters, document.to_text()
+            )
+        job.progress = max(job.progress, 0.9)
+
+        metadata = await asyncio.to_thread(
+            self._save_book, book_dir, job.title, file_type, fingerprint, chapters
+        )
 
-        # Clean text content
-        text_content = self._clean_text(text_content)
+        return ProcessedDocument(
+            book_id=book_dir.name, title=job.title, metadata=metadata
+        )
 
-        # Save chapters individually
+    def _save_book(
+        self,
+        book_dir: Path,
+        filename: str,
+        file_type: FileType,
+        fingerprint: str,
+        chapters: List[Chapter],
+    ) -> Dict:
+        """
+        Write chapter texts to the book's segment pack, then its metadata.
+        Sections the classifier is confident are front/back matter get "N/A"
+        summaries up front, so the queue never sends them to the LLM.
+        """
+        store = segments.book(book_dir.name)
+
+        entries = []
         for i, chapter in enumerate(chapters, 1):
             # Save text version
-            chapter_path = chapters_dir / f"chapter-{i}.txt"
-            chapter_path.write_text(self._clean_text(chapter.content))
+            text = clean_text(chapter.content)
+            store.put(chapter_key(f"chapter-{i}"), text)
+
+            entry = {
+                "number": i,
+                "title": chapter.title,
+                "length": len(chapter.content),
+                # Also set later if the LLM answers "N/A"
+                "isNonChapter": False,
+            }
+            if CLASSIFIER_MODE != "off":
+                result = classify(chapter.title, text, i, len(chapters))
+                entry["nonChapterScore"] = round(result.score, 3)
+                if result.is_non_chapter:
+                    NON_CHAPTERS.inc(CLASSIFIER_MODE)
+                    if CLASSIFIER_MODE == "on":
+                        entry["isNonChapter"] = True
+                        store.put_many(
+                            {
+                                summary_key(f"chapter-{i}", depth): "N/A"
+                                for depth in range(1, 5)
+                            }
+                        )
+            entries.append(entry)
+        store.sync()
 
         # Save metadata
         metadata = {
-            "title": file.filename,
+            "title": filename,
             "file_type": file_type,
+            "sha256": fingerprint,
+            "uploaded_at": time.time(),
             "chapter_count": len(chapters),
-            "chapters": [
-                {
-                    "number": i,
-                    "title": ch.title,
-                    "length": len(ch.content),
-                    "isNonChapter": False,  # Default to False, will be updated when we get N/A summary
-                }
-                for i, ch in enumerate(chapters, 1)
-            ],
+            "chapters": entries,
         }
-        metadata_path = book_dir / "metadata.json"
-        metadata_path.write_text(json.dumps(metadata, indent=2))
-
-        return ProcessedDocument(
-            book_id=book_id,
-            title=file.filename,
-            text_content=text_content,
-            markdown_content=markdown_content,
-            metadata=metadata,
-        )
-
-    def _process_pdf(self, file_path: Path) -> str:
-        """Extract text from PDF using PyPDF2"""
-        text = []
-        with open(file_path, "rb") as file:
-            pdf = pypdf.PdfReader(file)
-            for page in pdf.pages:
-                text.append(page.extract_text())
-        return "\n\n".join(text)
-
-    def _convert_to_markdown(self, file_path: Path) -> str:
-        """Convert PDF to markdown using pandoc"""
-        try:
-            return pypandoc.convert_file(
-                str(file_path), "markdown", format="pdf", extra_args=["--wrap=none"]
-            )
-        except Exception as e:
-            print(f"Markdown conversion failed: {e}")
-            return ""  # Fallback to empty string if conversion fails
-
-    def _process_epub_mobi(
-        self, file_path: Path, file_type: FileType, output: str
-    ) -> str:
-        """Convert epub/mobi to text/markdown using pandoc"""
-        try:
-            return pypandoc.convert_file(
-                str(file_path), output, format=file_type, extra_args=["--wrap=none"]
-            )
-        except Exception as e:
-            print(f"Conversion failed: {e}")
-            return ""  # Fallback to empty string if conversion fails
+        metadata_store.write(book_dir.name, metadata)
+        (self.fingerprints_dir / fingerprint).write_text(book_dir.name)
+        return metadata
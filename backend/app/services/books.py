@@ -1,48 +1,39 @@
-import json
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 from datetime import datetime
-import os
 import shutil
 
+from .catalog import Catalog
+from .file_cache import file_cache
+from .metadata_store import metadata_store
+from .segment_store import segments
+
 
 class BookService:
     def __init__(self, books_dir: str | Path):
         self.books_dir = Path(books_dir)
         self.books_dir.mkdir(parents=True, exist_ok=True)
-
-    def list_books(self) -> List[dict]:
-        """List all books in the books directory"""
-        books = []
-
-        for book_dir in self.books_dir.iterdir():
-            if not book_dir.is_dir():
-                continue
-
-            metadata_file = book_dir / "metadata.json"
-            if not metadata_file.exists():
-                continue
-
-            try:
-                with open(metadata_file, "r") as f:
-                    metadata = json.load(f)
-
-                # Get creation time of the directory as upload time
-                upload_time = datetime.fromtimestamp(os.path.getctime(book_dir))
-
-                books.append(
-                    {
-                        "id": book_dir.name,
-                        "title": metadata.get("title", "Untitled"),
-                        "uploadedAt": upload_time.isoformat(),
-                    }
-                )
-            except (json.JSONDecodeError, IOError):
-                continue
-
-        # Sort by upload time, newest first
-        books.sort(key=lambda x: x["uploadedAt"], reverse=True)
-        return books
+        self.catalog = Catalog(self.books_dir)
+
+    def list_books(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort: str = "uploadedAt",
+        order: str = "desc",
+    ) -> List[dict]:
+        """List books from the catalog index, newest first by default"""
+        return [
+            {
+                "id": row["id"],
+                "title": row["title"],
+                "uploadedAt": datetime.fromtimestamp(row["uploaded_at"]).isoformat(),
+            }
+            for row in self.catalog.list(limit, offset, sort, order)
+        ]
+
+    def count_books(self) -> int:
+        return self.catalog.count()
 
     def get_book(self, book_id: str) -> dict:
         """Get a specific book's details"""
@@ -50,19 +41,15 @@ class BookService:
         if not book_dir.exists():
             raise FileNotFoundError(f"Book not found: {book_id}")
 
-        metadata_file = book_dir / "metadata.json"
-        if not metadata_file.exists():
+        entry = self.catalog.get(book_id)
+        if entry is None:
             raise FileNotFoundError(f"Book metadata not found: {book_id}")
-
-        with open(metadata_file, "r") as f:
-            metadata = json.load(f)
-
-        upload_time = datetime.fromtimestamp(os.path.getctime(book_dir))
+        metadata, uploaded_at = entry
 
         return {
             "id": book_id,
             "title": metadata.get("title", "Untitled"),
-            "uploadedAt": upload_time.isoformat(),
+            "uploadedAt": datetime.fromtimestamp(uploaded_at).isoformat(),
             "metadata": metadata,
         }
 
@@ -73,6 +60,11 @@ class BookService:
             raise FileNotFoundError(f"Book not found: {book_id}")
 
         try:
+            segments.close(book_id)
+            metadata_store.forget(book_id)
+            file_cache.invalidate_book(book_id)
             shutil.rmtree(book_dir)
         except Exception as e:
             raise Exception(f"Failed to delete book: {str(e)}")
+        finally:
+            self.catalog.refresh(book_id)
@@ -0,0 +1,259 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .file_cache import file_cache
+from .metadata_store import metadata_store
+
+load_dotenv()
+
+SORT_COLUMNS = {
+    "uploadedAt": "uploaded_at",
+    "title": "title COLLATE NOCASE",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    uploaded_at REAL NOT NULL,
+    metadata TEXT NOT NULL,
+    metadata_mtime_ns INTEGER NOT NULL,
+    metadata_size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS books_uploaded_at ON books (uploaded_at);
+CREATE INDEX IF NOT EXISTS books_title ON books (title COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS catalog_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class Catalog:
+    """
+    SQLite (WAL) index of every book's metadata.json.
+
+    The index is the fast path for listing and lookups; the book directories
+    remain the source of truth. A change to the books directory's mtime
+    (books added or removed outside the app) triggers a reconcile of
+    directory names, and rows are re-read whenever their metadata.json
+    mtime or size no longer match.
+    """
+
+    def __init__(self, books_dir: str | Path, db_path: Optional[str | Path] = None):
+        self.books_dir = Path(books_dir)
+        self.books_dir.mkdir(parents=True, exist_ok=True)
+        # Kept in a subdirectory so WAL files don't touch the books_dir mtime
+        self.db_path = (
+            Path(db_path) if db_path else self.books_dir / ".index" / "catalog.db"
+        )
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; queue workers update from their threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _read_disk(
+        self, book_id: str, uploaded_at: Optional[float] = None
+    ) -> Optional[tuple]:
+        """
+        Read a book's row values from disk, or None if it isn't a book.
+        uploaded_at is the already-indexed upload time, if any.
+        """
+        book_dir = self.books_dir / book_id
+        metadata_file = book_dir / "metadata.json"
+        try:
+            stat = metadata_file.stat()
+            # Includes journaled changes not yet folded into the file
+            metadata = metadata_store.read(book_id)
+            # Recorded at upload; books from before that fall back to the
+            # directory ctime, taken once since metadata writes change it
+            uploaded_at = metadata.get("uploaded_at") or uploaded_at
+            if uploaded_at is None:
+                uploaded_at = os.path.getctime(book_dir)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return (
+            book_id,
+            metadata.get("title", "Untitled"),
+            uploaded_at,
+            json.dumps(metadata),
+            stat.st_mtime_ns,
+            stat.st_size,
+        )
+
+    def refresh(self, book_id: str) -> Optional[dict]:
+        """Re-index one book from disk; returns its metadata or None if gone"""
+        file_cache.invalidate(("catalog", book_id))
+        indexed = (
+            self._connection()
+            .execute("SELECT uploaded_at FROM books WHERE id = ?", (book_id,))
+            .fetchone()
+        )
+        row = self._read_disk(book_id, indexed["uploaded_at"] if indexed else None)
+        with self._connection() as conn:
+            if row is None:
+                conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+                return None
+            conn.execute("INSERT OR REPLACE INTO books VALUES (?, ?, ?, ?, ?, ?)", row)
+        return json.loads(row[3])
+
+    def remove(self, book_id: str) -> None:
+        file_cache.invalidate(("catalog", book_id))
+        with self._connection() as conn:
+            conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+
+    def _dir_mtime(self) -> int:
+        return self.books_dir.stat().st_mtime_ns
+
+    def sync(self, force: bool = False) -> None:
+        """Pick up books added or removed outside the app"""
+        conn = self._connection()
+        mtime = self._dir_mtime()
+        row = conn.execute(
+            "SELECT value FROM catalog_state WHERE key = 'books_dir_mtime_ns'"
+        ).fetchone()
+        if not force and row is not None and row["value"] == mtime:
+            return
+
+        on_disk = {
+            entry.name
+            for entry in os.scandir(self.books_dir)
+            if entry.is_dir() and not entry.name.startswith(".")
+        }
+        indexed = {r["id"] for r in conn.execute("SELECT id FROM books")}
+        for book_id in indexed - on_disk:
+            self.remove(book_id)
+        for book_id in on_disk - indexed:
+            self.refresh(book_id)
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO catalog_state VALUES "
+                "('books_dir_mtime_ns', ?)",
+                (mtime,),
+            )
+
+    def rebuild(self) -> int:
+        """Drop the index and rebuild it from the books directory"""
+        with self._connection() as conn:
+            conn.execute("DELETE FROM books")
+            conn.execute("DELETE FROM catalog_state")
+        self.sync(force=True)
+        return self.count()
+
+    def count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    def _validate(self, row: sqlite3.Row) -> Optional[dict]:
+        """Return the row's metadata, re-reading it if the file changed"""
+        try:
+            stat = (self.books_dir / row["id"] / "metadata.json").stat()
+        except OSError:
+            self.remove(row["id"])
+            return None
+        if (stat.st_mtime_ns, stat.st_size) != (
+            row["metadata_mtime_ns"],
+            row["metadata_size"],
+        ):
+            return self.refresh(row["id"])
+        return json.loads(row["metadata"])
+
+    def get(self, book_id: str) -> Optional[Tuple[dict, float]]:
+        """
+        Get (metadata, uploaded_at) for a book, including journaled updates
+        that are not folded into metadata.json yet. Served from the file
+        cache while neither file has changed; the metadata must not be
+        modified.
+        """
+        cache_key = ("catalog", book_id)
+        stamp = metadata_store.stamp(book_id)
+        if stamp[0] is None:
+            return None
+        cached = file_cache.get(cache_key, stamp)
+        if cached is not None:
+            return cached
+        row = (
+            self._connection()
+            .execute("SELECT * FROM books WHERE id = ?", (book_id,))
+            .fetchone()
+        )
+        if row is None:
+            metadata = self.refresh(book_id)
+            if metadata is None:
+                return None
+            row = (
+                self._connection()
+                .execute("SELECT * FROM books WHERE id = ?", (book_id,))
+                .fetchone()
+            )
+        if self._validate(row) is None:
+            return None
+        try:
+            # The row only changes when the snapshot is rewritten
+            metadata = metadata_store.read(book_id)
+        except FileNotFoundError:
+            return None
+        entry = (metadata, row["uploaded_at"])
+        size = stamp[0][1] + (stamp[1][1] if stamp[1] else 0)
+        file_cache.put(cache_key, stamp, entry, size)
+        return entry
+
+    def list(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort: str = "uploadedAt",
+        order: str = "desc",
+    ) -> List[sqlite3.Row]:
+        """List (id, title, uploaded_at) rows, sorted and paginated"""
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort field: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Unsupported sort order: {order}")
+        self.sync()
+        return (
+            self._connection()
+            .execute(
+                f"SELECT id, title, uploaded_at FROM books "
+                f"ORDER BY {SORT_COLUMNS[sort]} {order.upper()}, id "
+                f"LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset),
+            )
+            .fetchall()
+        )
+
+
+# Global catalog shared by the upload, book and summary paths
+BOOKS_DIR = os.getenv("BOOKS_DIR", "./books")
+catalog = Catalog(BOOKS_DIR)
+# Re-index a book whenever its metadata snapshot is rewritten
+metadata_store.subscribe(catalog.refresh)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the book catalog index")
+    parser.add_argument("command", choices=["rebuild", "count"])
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        print(f"Indexed {catalog.rebuild()} books")
+    else:
+        print(catalog.count())
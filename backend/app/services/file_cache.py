@@ -0,0 +1,130 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .metrics import registry
+
+load_dotenv()
+
+
+def file_stamp(path: str | os.PathLike) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of a file, or None if it doesn't exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FileCache:
+    """
+    Memory-bounded LRU of values parsed from files (metadata dicts, summary
+    strings), so hot read paths don't reopen and reparse them.
+
+    Every entry stores a stamp, usually the (mtime_ns, size) of the files it
+    came from. A lookup with a different stamp drops the entry, which catches
+    changes made by other processes. Writers in this process also invalidate
+    their keys directly. Keys are tuples whose second element is the book id,
+    so a deleted book can be dropped in one call. Cached values are shared:
+    callers must treat them as read-only.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # key -> (stamp, value, size)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, stamp: Any) -> Optional[Any]:
+        """The cached value if it was stored with the same stamp, else None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != stamp:
+                self._drop(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, stamp: Any, value: Any, size: int) -> None:
+        """Store a value, evicting least recently used entries if needed"""
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (stamp, value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted
+                self.evictions += 1
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+                self.invalidations += 1
+
+    def invalidate_book(self, book_id: str) -> None:
+        """Drop every entry for a book"""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == book_id]:
+                self._drop(key)
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Get size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+# Global cache shared by the metadata store, catalog and segment stores
+file_cache = FileCache(
+    max_bytes=int(float(os.getenv("FILE_CACHE_MAX_MB", "64")) * 1024 * 1024)
+)
+
+registry.callback(
+    "file_cache_lookups_total",
+    "In-process file cache lookups by result",
+    lambda: {("hit",): file_cache.hits, ("miss",): file_cache.misses},
+    ["result"],
+    kind="counter",
+)
+registry.callback(
+    "file_cache_hit_ratio",
+    "Fraction of in-process file cache lookups that hit",
+    lambda: file_cache.stats()["hitRatio"],
+)
+registry.callback(
+    "file_cache_bytes",
+    "Approximate bytes held by the in-process file cache",
+    lambda: file_cache.total_bytes,
+)
@@ -0,0 +1,221 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+
+from dotenv import load_dotenv
+
+from .file_cache import file_cache, file_stamp
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+SNAPSHOT_NAME = "metadata.json"
+JOURNAL_NAME = "metadata.journal"
+
+# Changes within this many seconds are folded into one snapshot write
+FLUSH_DELAY = float(os.getenv("METADATA_FLUSH_DELAY", "0.5"))
+# A journal this long is folded immediately
+MAX_JOURNAL_ENTRIES = int(os.getenv("METADATA_MAX_JOURNAL_ENTRIES", "256"))
+
+
+def apply_changes(metadata: dict, journal: bytes) -> int:
+    """Replay journal lines onto a snapshot; returns the number applied"""
+    chapters = {chapter["number"]: chapter for chapter in metadata.get("chapters", [])}
+    applied = 0
+    for line in journal.splitlines():
+        try:
+            change = json.loads(line)
+        except ValueError:
+            # A torn final line from a crash; everything before it stands
+            break
+        if change.get("chapter") is not None:
+            chapter = chapters.get(change["chapter"])
+            if chapter is not None:
+                chapter.update(change["set"])
+        else:
+            metadata.update(change["set"])
+        applied += 1
+    return applied
+
+
+class MetadataStore:
+    """
+    Per-book metadata.json snapshots with an append-only change journal.
+
+    Field updates append one JSON line to metadata.journal instead of
+    rewriting the whole file. A burst of updates is folded into a single
+    snapshot write FLUSH_DELAY seconds later (or once the journal reaches
+    MAX_JOURNAL_ENTRIES), via a temp file and atomic rename. Readers replay
+    the journal over the snapshot, so they see every update as soon as it is
+    appended. All access to a book is serialized by flock on its journal:
+    shared for readers and exclusive for writers, across threads and
+    processes. Replaying a change twice is harmless, so a crash between the
+    rename and the journal truncation loses nothing.
+    """
+
+    def __init__(
+        self,
+        books_dir: str | Path,
+        flush_delay: float = FLUSH_DELAY,
+        max_journal_entries: int = MAX_JOURNAL_ENTRIES,
+    ):
+        self.books_dir = Path(books_dir)
+        self.flush_delay = flush_delay
+        self.max_journal_entries = max_journal_entries
+        # Pending journal entries and flush timers by book id
+        self._pending: Dict[str, int] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+        self._guard = threading.Lock()
+        self._listeners: List[Callable[[str], None]] = []
+
+    def subscribe(self, listener: Callable[[str], None]) -> None:
+        """Call listener(book_id) whenever a book's snapshot is rewritten"""
+        self._listeners.append(listener)
+
+    @contextmanager
+    def _locked(self, book_id: str, operation: int) -> Iterator[int]:
+        """The book's journal, opened and flocked for the duration"""
+        fd = os.open(
+            self.books_dir / book_id / JOURNAL_NAME,
+            os.O_RDWR | os.O_CREAT | os.O_APPEND,
+            0o644,
+        )
+        try:
+            fcntl.flock(fd, operation)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _read_locked(self, book_id: str, fd: int) -> tuple:
+        """(metadata with the journal applied, number of journal entries)"""
+        snapshot = self.books_dir / book_id / SNAPSHOT_NAME
+        metadata = json.loads(snapshot.read_bytes())
+        size = os.fstat(fd).st_size
+        return metadata, apply_changes(metadata, os.pread(fd, size, 0))
+
+    def _write_snapshot(self, book_id: str, metadata: dict) -> None:
+        snapshot = self.books_dir / book_id / SNAPSHOT_NAME
+        tmp_path = snapshot.with_name(
+            f".{SNAPSHOT_NAME}.{os.getpid()}.{threading.get_ident()}"
+        )
+        with open(tmp_path, "w") as f:
+            json.dump(metadata, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, snapshot)
+
+    def _notify(self, book_id: str) -> None:
+        for listener in self._listeners:
+            try:
+                listener(book_id)
+            except Exception as e:
+                logger.warning(f"Metadata listener failed for {book_id}: {e}")
+
+    def stamp(self, book_id: str) -> tuple:
+        """File stamps of the snapshot and journal; changes with every update"""
+        book_dir = self.books_dir / book_id
+        return file_stamp(book_dir / SNAPSHOT_NAME), file_stamp(book_dir / JOURNAL_NAME)
+
+    def read(self, book_id: str) -> dict:
+        """
+        A consistent snapshot of a book's metadata, including pending changes.
+        Served from the file cache while neither file has changed; the
+        result is shared and must not be modified.
+        """
+        cache_key = ("metadata", book_id)
+        stamp = self.stamp(book_id)
+        if stamp[0] is None:
+            raise FileNotFoundError(f"Book metadata not found: {book_id}")
+        metadata = file_cache.get(cache_key, stamp)
+        if metadata is not None:
+            return metadata
+        with self._locked(book_id, fcntl.LOCK_SH) as fd:
+            metadata = self._read_locked(book_id, fd)[0]
+            # Taken under the lock, so it matches what was read
+            stamp = self.stamp(book_id)
+        file_cache.put(cache_key, stamp, metadata, stamp[0][1] + stamp[1][1])
+        return metadata
+
+    def write(self, book_id: str, metadata: dict) -> None:
+        """Replace a book's metadata wholesale, discarding its journal"""
+        with self._locked(book_id, fcntl.LOCK_EX) as fd:
+            self._write_snapshot(book_id, metadata)
+            os.ftruncate(fd, 0)
+            file_cache.invalidate(("metadata", book_id))
+        with self._guard:
+            self._pending.pop(book_id, None)
+        self._notify(book_id)
+
+    def update(self, book_id: str, **fields) -> None:
+        """Set top-level fields"""
+        self._append(book_id, {"chapter": None, "set": fields})
+
+    def update_chapter(self, book_id: str, number: int, **fields) -> None:
+        """Set fields on one chapter entry"""
+        self._append(book_id, {"chapter": number, "set": fields})
+
+    def _append(self, book_id: str, change: dict) -> None:
+        if not (self.books_dir / book_id / SNAPSHOT_NAME).exists():
+            raise FileNotFoundError(f"Book metadata not found: {book_id}")
+        line = (json.dumps(change) + "\n").encode("utf-8")
+        with self._locked(book_id, fcntl.LOCK_EX) as fd:
+            os.write(fd, line)
+            file_cache.invalidate(("metadata", book_id))
+        with self._guard:
+            pending = self._pending[book_id] = self._pending.get(book_id, 0) + 1
+            if pending < self.max_journal_entries:
+                if book_id not in self._timers:
+                    timer = threading.Timer(self.flush_delay, self.flush, (book_id,))
+                    timer.daemon = True
+                    self._timers[book_id] = timer
+                    timer.start()
+                return
+        self.flush(book_id)
+
+    def flush(self, book_id: str) -> bool:
+        """Fold the journal into the snapshot; returns whether anything changed"""
+        with self._guard:
+            timer = self._timers.pop(book_id, None)
+            self._pending.pop(book_id, None)
+        if timer is not None:
+            timer.cancel()
+        try:
+            with self._locked(book_id, fcntl.LOCK_EX) as fd:
+                metadata, applied = self._read_locked(book_id, fd)
+                if not applied:
+                    return False
+                self._write_snapshot(book_id, metadata)
+                os.ftruncate(fd, 0)
+                file_cache.invalidate(("metadata", book_id))
+        except FileNotFoundError:
+            # Deleted while the flush was pending
+            return False
+        self._notify(book_id)
+        return True
+
+    def flush_all(self) -> None:
+        with self._guard:
+            book_ids = list(self._timers)
+        for book_id in book_ids:
+            self.flush(book_id)
+
+    def forget(self, book_id: str) -> None:
+        """Drop pending work for a deleted book"""
+        with self._guard:
+            timer = self._timers.pop(book_id, None)
+            self._pending.pop(book_id, None)
+        if timer is not None:
+            timer.cancel()
+        file_cache.invalidate_book(book_id)
+
+
+# Global store shared by the processor, summarizer, queue and catalog
+BOOKS_DIR = os.getenv("BOOKS_DIR", "./books")
+metadata_store = MetadataStore(BOOKS_DIR)
@@ -0,0 +1,238 @@
+import bisect
+import math
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+# Seconds; covers sub-millisecond cache hits through multi-minute LLM calls
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} "
+            f"{_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [
+                (labels, list(counts), total)
+                for labels, (counts, total) in self._values.items()
+            ]
+        lines = []
+        names = self.labelnames + ("le",)
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket"
+                    f"{_format_labels(names, labels + (_format_value(bound),))} "
+                    f"{cumulative}"
+                )
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    Gauge (or counter) read from a callback at scrape time, so it costs
+    nothing on the hot path. The callback returns a value, or a dict of
+    label values -> value.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Union[float, Dict[LabelValues, float]]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self) -> List[str]:
+        value = self.fn()
+        values = value.items() if isinstance(value, dict) else [((), value)]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} "
+            f"{_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Registry:
+    """Named metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Counter, Histogram, CallbackMetric]] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Union[float, Dict[LabelValues, float]]],
+        labelnames: Sequence[str] = (),
+        kind: str = "gauge",
+    ):
+        return self.register(CallbackMetric(name, help, fn, labelnames, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry scraped by GET /metrics
+registry = Registry()
+
+# Processing queue
+TASKS_ENQUEUED = registry.counter(
+    "queue_tasks_enqueued_total", "Chapter tasks added to the queue", ["depth"]
+)
+TASKS_PROCESSED = registry.counter(
+    "queue_tasks_processed_total", "Chapter tasks completed", ["depth"]
+)
+TASKS_FAILED = registry.counter(
+    "queue_tasks_failed_total",
+    "Chapter task attempts that failed (rate_limit tasks are retried)",
+    ["reason"],
+)
+QUEUE_WAIT = registry.histogram(
+    "queue_wait_seconds", "Time from enqueue until a worker picks a task up"
+)
+QUEUE_SERVICE = registry.histogram(
+    "queue_service_seconds", "Time a worker spends on one task", ["outcome"]
+)
+
+# LLM calls
+LLM_REQUESTS = registry.counter(
+    "llm_requests_total", "LLM generations by outcome", ["provider", "outcome"]
+)
+LLM_LATENCY = registry.histogram(
+    "llm_request_seconds", "LLM generation latency", ["provider"]
+)
+LLM_TOKENS = registry.counter(
+    "llm_estimated_prompt_tokens_total", "Estimated prompt tokens sent", ["provider"]
+)
+
+# Document parsing
+PARSE_DURATION = registry.histogram(
+    "parse_duration_seconds", "Upload parse time by file type", ["file_type"]
+)
+PARSE_BYTES = registry.counter(
+    "parse_bytes_total", "Bytes of uploaded books parsed", ["file_type"]
+)
+NON_CHAPTERS = registry.counter(
+    "parse_non_chapters_total",
+    "Sections classified as front/back matter (mode=on skips their LLM calls)",
+    ["mode"],
+)
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .rate_limiter import estimate_tokens
+
+load_dotenv()
+
+
+class ProviderError(Exception):
+    """Error returned by a summarization backend, with an HTTP-style code"""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+
+class SummaryProvider:
+    """
+    A text generation backend for the summarizer.
+
+    `model_name` is part of every summary cache key, so providers must not
+    share names unless their output is interchangeable.
+    """
+
+    name = "base"
+    model_name = "base"
+
+    def generate(self, prompt: str, json_output: bool = False) -> str:
+        raise NotImplementedError
+
+
+class GeminiProvider(SummaryProvider):
+    """Google Gemini through google-generativeai"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str], model_name: str):
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY environment variable is not set")
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, json_output: bool = False) -> str:
+        # The pinned SDK has no JSON response mode; the prompt asks for JSON
+        return self.model.generate_content(prompt).text
+
+
+class StubProvider(SummaryProvider):
+    """
+    Deterministic offline provider for load tests and benchmarks.
+
+    Each call sleeps `latency` seconds plus `seconds_per_1k_tokens` for every
+    thousand prompt tokens, then fails with a 429 or 503 at the configured
+    rates (drawn from a seeded RNG) or returns text derived from the prompt.
+    """
+
+    name = "stub"
+    model_name = "stub"
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        seconds_per_1k_tokens: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.seconds_per_1k_tokens = seconds_per_1k_tokens
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate(self, prompt: str, json_output: bool = False) -> str:
+        tokens = estimate_tokens(prompt)
+        time.sleep(self.latency + self.seconds_per_1k_tokens * tokens / 1000)
+
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            raise ProviderError("Stub provider rate limit", code=429)
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise ProviderError("Stub provider unavailable", code=503)
+
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        # Echo the start of the text after the instructions
+        words = re.findall(r"\S+", prompt.rsplit("\n\n", 1)[-1])
+        if json_output:
+            return json.dumps(
+                {
+                    f"depth{depth}": f"Stub summary {digest}: "
+                    + " ".join(words[: 20 * depth])
+                    for depth in range(1, 5)
+                }
+            )
+        return f"Stub summary {digest}: " + " ".join(words[:40])
+
+
+_provider: Optional[SummaryProvider] = None
+_provider_lock = threading.Lock()
+
+
+def create_provider(name: Optional[str] = None) -> SummaryProvider:
+    """Build the provider named by `name` or SUMMARIZER_PROVIDER"""
+    name = name or os.getenv("SUMMARIZER_PROVIDER", "gemini")
+    if name == "gemini":
+        return GeminiProvider(
+            os.getenv("GEMINI_API_KEY"),
+            os.getenv("GEMINI_MODEL", "gemini-2.0-flash-001"),
+        )
+    if name == "stub":
+        return StubProvider(
+            latency=float(os.getenv("STUB_LATENCY_MS", "200")) / 1000,
+            seconds_per_1k_tokens=float(os.getenv("STUB_MS_PER_1K_TOKENS", "0")) / 1000,
+            rate_limit_rate=float(os.getenv("STUB_RATE_LIMIT_RATE", "0")),
+            error_rate=float(os.getenv("STUB_ERROR_RATE", "0")),
+            seed=int(os.getenv("STUB_SEED", "0")),
+        )
+    raise ValueError(f"Unknown summarizer provider: {name}")
+
+
+def get_provider() -> SummaryProvider:
+    """The configured provider, created on first use"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = create_provider()
+    return _provider
+
+
+def set_provider(provider: SummaryProvider) -> None:
+    """Swap the active provider (benchmarks, tests)"""
+    global _provider
+    _provider = provider
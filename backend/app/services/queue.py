@@ -1,11 +1,30 @@
 from dataclasses import dataclass
-from typing import Dict, List
-import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import itertools
 import os
 import logging
-import random
+import socket
+import time
+import uuid
 from pathlib import Path
-from ..summarizer import summarize_chapter_file
+from ..summarizer import summarize_book_chapter, summarize_book_chapter_all_depths
+from .file_cache import file_cache
+from .metadata_store import metadata_store
+from .metrics import (
+    QUEUE_SERVICE,
+    QUEUE_WAIT,
+    TASKS_ENQUEUED,
+    TASKS_FAILED,
+    TASKS_PROCESSED,
+    registry,
+)
+from .rate_limiter import is_rate_limit_error, limiter
+from .singleflight import SingleFlight
+from .summary_cache import summary_cache
+from .segment_store import segments, summary_key
+from .task_store import TaskStore
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -23,64 +42,617 @@ if not logger.handlers:
     logger.addHandler(console_handler)
 
 
+# Lower values run first
+PRIORITY_INTERACTIVE = 0  # A user is waiting on the result
+PRIORITY_BACKGROUND = 10  # Bulk depth-1 backfill
+
+TaskKey = Tuple[str, str, int]
+
+# Buffered status events per subscriber before it is told to resync
+SUBSCRIBER_BUFFER = 256
+
+# How a book's chapters are summarized
+MODE_SINGLE = "single"  # One LLM call per (chapter, depth)
+MODE_ALL_DEPTHS = "all-depths"  # One LLM call writes depths 1-4 together
+SUMMARY_MODES = (MODE_SINGLE, MODE_ALL_DEPTHS)
+
+# How tasks are distributed
+QUEUE_LOCAL = "local"  # In-memory heap; one process drains its own tasks
+QUEUE_SHARED = "shared"  # Every process claims leased tasks from the task store
+QUEUE_MODES = (QUEUE_LOCAL, QUEUE_SHARED)
+
+
+def _stored_summary(book_id: str, chapter_id: str, depth: int) -> Optional[str]:
+    """A summary already saved in the book's segment store, or None"""
+    return segments.book(book_id).get_text(summary_key(chapter_id, depth))
+
+
 @dataclass
 class ChapterTask:
     book_id: str
     chapter_id: str
     chapter_title: str
     depth: int = 1
+    priority: int = PRIORITY_BACKGROUND
+    # time.monotonic() when first queued; kept when a duplicate is merged
+    enqueued_at: float = 0.0
+
+    @property
+    def key(self) -> TaskKey:
+        return (self.book_id, self.chapter_id, self.depth)
+
+
+class TaskQueue:
+    """
+    Heap of chapter tasks ordered by priority, then fairly across books.
+
+    Within a priority class, books share the workers in proportion to their
+    weights using self-clocked fair queuing: each task gets a virtual finish
+    tag of max(class clock, book's last tag) + 1 / weight, tasks run in tag
+    order, and the clock advances to each popped tag. A 300-chapter book
+    queues its chapters at tags 1, 2, 3, ... while a book added later starts
+    at the current clock, so its first chapter waits behind at most one
+    chapter from each other busy book instead of behind the whole backlog.
+
+    Tasks are deduplicated on (book, chapter, depth): pushing a task that is
+    already queued only raises its priority. Superseded heap entries are
+    skipped lazily on pop, so push and pop stay O(log n).
+    """
+
+    def __init__(self, weight: Optional[Callable[[str], float]] = None):
+        self._weight = weight or (lambda book_id: 1.0)
+        self._heap: List[Tuple[int, float, int, TaskKey]] = []
+        self._entries: Dict[TaskKey, Tuple[int, float, int]] = {}
+        self._tasks: Dict[TaskKey, ChapterTask] = {}
+        # Queued keys per book
+        self._books: Dict[str, Set[TaskKey]] = {}
+        self._counter = itertools.count()
+        # Virtual clock per priority class and last finish tag per (class, book)
+        self._clock: Dict[int, float] = {}
+        self._finish: Dict[Tuple[int, str], float] = {}
+        # Bumped on every change; queue positions are cached against it
+        self._version = 0
+        self._positions: Dict[str, Tuple[int, Optional[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, key: TaskKey) -> bool:
+        return key in self._tasks
+
+    def _tag(self, priority: int, book_id: str) -> float:
+        """Charge a book for one more task in a class; returns its finish tag"""
+        start = max(
+            self._clock.get(priority, 0.0), self._finish.get((priority, book_id), 0.0)
+        )
+        tag = start + 1.0 / self._weight(book_id)
+        self._finish[(priority, book_id)] = tag
+        return tag
+
+    def push(self, task: ChapterTask, front: bool = False) -> bool:
+        """Queue a task; returns False if an existing entry already covered it"""
+        key = task.key
+        existing = self._tasks.get(key)
+        if existing is not None:
+            if task.priority >= existing.priority and not front:
+                return False
+            task.priority = min(task.priority, existing.priority)
+            task.enqueued_at = existing.enqueued_at
+        else:
+            task.enqueued_at = time.monotonic()
+            TASKS_ENQUEUED.inc(str(task.depth))
+        # `front` tasks take the current clock, ahead of every queued tag in
+        # their class, and negative sequence numbers order them among themselves
+        seq = next(self._counter)
+        if front:
+            entry = (task.priority, self._clock.get(task.priority, 0.0), -seq)
+        else:
+            entry = (task.priority, self._tag(task.priority, task.book_id), seq)
+        self._tasks[key] = task
+        self._entries[key] = entry
+        self._books.setdefault(task.book_id, set()).add(key)
+        self._version += 1
+        heapq.heappush(self._heap, (*entry, key))
+        if len(self._heap) > 2 * len(self._tasks) + 64:
+            self._compact()
+        return True
+
+    def _forget(self, key: TaskKey) -> ChapterTask:
+        """Drop a queued task's bookkeeping; its heap entry goes stale"""
+        del self._entries[key]
+        keys = self._books[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._books[key[0]]
+        self._version += 1
+        return self._tasks.pop(key)
+
+    def pop(self) -> ChapterTask:
+        """Remove and return the next task"""
+        while self._heap:
+            priority, tag, seq, key = heapq.heappop(self._heap)
+            if self._entries.get(key) == (priority, tag, seq):
+                self._clock[priority] = max(self._clock.get(priority, 0.0), tag)
+                return self._forget(key)
+        raise IndexError("pop from empty TaskQueue")
+
+    def discard(self, key: TaskKey) -> None:
+        """Drop a queued task if present"""
+        if key in self._tasks:
+            self._forget(key)
+
+    def remove_book(self, book_id: str) -> None:
+        """Drop every queued task for a book"""
+        for key in list(self._books.get(book_id, ())):
+            self._forget(key)
+        self._positions.pop(book_id, None)
+        for finish_key in [k for k in self._finish if k[1] == book_id]:
+            del self._finish[finish_key]
+
+    def reweigh(self, book_id: str) -> None:
+        """Re-tag a book's queued tasks after its weight changed"""
+        keys = sorted(self._books.get(book_id, ()), key=self._entries.__getitem__)
+        for finish_key in [k for k in self._finish if k[1] == book_id]:
+            del self._finish[finish_key]
+        for key in keys:
+            priority, _, seq = self._entries[key]
+            entry = (priority, self._tag(priority, book_id), seq)
+            self._entries[key] = entry
+            heapq.heappush(self._heap, (*entry, key))
+        self._version += 1
+
+    def position(self, book_id: str) -> Optional[int]:
+        """
+        How many queued tasks run before the book's next one (0 = next up),
+        or None if none of its tasks are queued. Counts by walking only the
+        heap nodes ordered before that task, so it costs O(position), and
+        is cached until the queue next changes.
+        """
+        cached = self._positions.get(book_id)
+        if cached is not None and cached[0] == self._version:
+            return cached[1]
+        keys = self._books.get(book_id)
+        position = None
+        if keys:
+            first = min(self._entries[key] for key in keys)
+            position = 0
+            # A node's children are never ordered before it, so stop at any
+            # node that isn't ahead of `first`
+            stack = [0]
+            while stack:
+                i = stack.pop()
+                if i >= len(self._heap) or self._heap[i][:3] >= first:
+                    continue
+                *entry, key = self._heap[i]
+                if self._entries.get(key) == tuple(entry):
+                    position += 1
+                stack += (2 * i + 1, 2 * i + 2)
+        self._positions[book_id] = (self._version, position)
+        return position
+
+    def _compact(self) -> None:
+        """Drop superseded heap entries and finish tags the clock has passed"""
+        self._heap = [(*entry, key) for key, entry in self._entries.items()]
+        heapq.heapify(self._heap)
+        self._finish = {
+            (priority, book_id): tag
+            for (priority, book_id), tag in self._finish.items()
+            if tag > self._clock.get(priority, 0.0)
+        }
 
 
 class ProcessingQueue:
-    def __init__(self, books_dir: str, rate_limit: float = 1.0):
+    """
+    Worker pool that summarizes chapter tasks.
+
+    In local mode each process drains its own in-memory heap, mirrored to the
+    task store for restarts. In shared mode the task store is the queue:
+    workers in any number of processes (uvicorn --workers, replicas sharing
+    BOOKS_DIR) claim tasks under leases they renew while working, a crashed
+    worker's tasks become claimable once its lease expires, and status is
+    read from the store so every process reports the same thing.
+
+    Task store calls run in worker threads, so a slow disk or another
+    process holding the SQLite write lock never stalls the event loop; only
+    in-memory state is touched on the loop.
+    """
+
+    def __init__(
+        self,
+        books_dir: str,
+        num_workers: int = 4,
+        store: Optional[TaskStore] = None,
+        default_mode: str = MODE_SINGLE,
+        queue_mode: str = QUEUE_LOCAL,
+        lease_seconds: float = 60.0,
+        poll_interval: float = 1.0,
+        default_weight: float = 1.0,
+    ):
+        if default_mode not in SUMMARY_MODES:
+            raise ValueError(f"Unsupported summary mode: {default_mode}")
+        if queue_mode not in QUEUE_MODES:
+            raise ValueError(f"Unsupported queue mode: {queue_mode}")
+        if default_weight <= 0:
+            raise ValueError(f"Queue weight must be positive: {default_weight}")
         self.books_dir = Path(books_dir)
-        self.rate_limit = rate_limit  # seconds between requests
-        self.last_process_time = 0.0
-        self.queue: List[ChapterTask] = []
-        # Store both status and title for each chapter
+        self.num_workers = max(1, num_workers)
+        self.default_mode = default_mode
+        self.shared = queue_mode == QUEUE_SHARED
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        # Lease holder name for this process
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lost_leases = 0
+        self._modes: Dict[str, str] = {}
+        # Fair-share weight per book; a book with weight 2 gets twice the turns
+        self.default_weight = default_weight
+        self._weights: Dict[str, float] = {}
+        # Weights are loaded (off the loop) before a book's tasks are pushed
+        self.queue = TaskQueue(
+            lambda book_id: self._weights.get(book_id, self.default_weight)
+        )
+        # Durable task records; survives restarts
+        self.store = store or TaskStore(
+            self.books_dir / ".index" / "queue.db", default_weight=default_weight
+        )
+        self._restored = False
+        # In-memory view of each book's depth-1 chapter status, loaded lazily
         self.processing: Dict[str, Dict[str, dict]] = {}
-        # Rate limit handling
-        self.is_rate_limited = False
-        self.rate_limit_backoff = 1.0  # Initial backoff in seconds
-        self.max_backoff = 64.0  # Maximum backoff in seconds
-        logger.info(f"Initialized ProcessingQueue with books_dir={books_dir}")
-
-    def add_book(self, book_id: str, chapters: List[dict]) -> None:
-        """Add all chapters from a book to the queue"""
-        # Reset processing status for this book
-        self.processing[book_id] = {}
+        # Callers awaiting a specific (book, chapter, depth) result
+        self._waiters: Dict[TaskKey, List[asyncio.Future]] = {}
+        # LLM generations currently running, shared by every caller of a key
+        self.flights = SingleFlight()
+        self.coalesced_submits = 0
+        # Worker pool state
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._active = 0
+        # Status stream subscribers per book
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._watcher: Optional[asyncio.Task] = None
+        # Pending tasks across all processes, refreshed by the shared watcher
+        self._shared_depth = 0
+        logger.info(
+            f"Initialized ProcessingQueue with books_dir={books_dir}, "
+            f"workers={self.num_workers}, mode={queue_mode}"
+        )
+
+    async def enqueue(self, task: ChapterTask, front: bool = False) -> None:
+        """Add a task to the queue and wake an idle worker"""
+        # Deeper summaries are only ever requested by a user
+        if task.depth > 1:
+            task.priority = min(task.priority, PRIORITY_INTERACTIVE)
+        # Recorded before it is pushed, so a worker never updates a missing row
+        queued = await asyncio.to_thread(
+            self.store.upsert,
+            task.book_id,
+            task.chapter_id,
+            task.depth,
+            task.chapter_title,
+            task.priority,
+        )
+        if self.shared:
+            # The store is the queue here, so count what it newly queued
+            if queued:
+                TASKS_ENQUEUED.inc(str(task.depth))
+        else:
+            await self._load_weights({task.book_id})
+            self.queue.push(task, front=front)
+        self._wakeup.set()
+
+    async def submit(self, task: ChapterTask) -> str:
+        """Queue a task at its priority and wait for its summary"""
+        # Share a generation that is already running
+        if task.key in self.flights:
+            return await self.flights.join(task.key)
+
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(task.key, [])
+        if waiters:
+            self.coalesced_submits += 1
+        waiters.append(future)
+        await self.enqueue(task)
+        if self.shared:
+            return await self._wait_shared(task.key, future)
+        return await future
+
+    async def _wait_shared(self, key: TaskKey, future: asyncio.Future) -> str:
+        """
+        Wait for a task that any process may pick up: resolved directly if a
+        worker here runs it, otherwise by polling its row in the task store
+        """
+        book_id, chapter_id, depth = key
+        while True:
+            done, _ = await asyncio.wait({future}, timeout=self.poll_interval)
+            if done:
+                return future.result()
+            row = await asyncio.to_thread(self.store.task, *key)
+            if row is None:
+                error = ValueError(f"Task for {chapter_id} was removed")
+            elif row["status"] == "error":
+                error = RuntimeError(row["error"] or "Summarization failed")
+            elif row["status"] == "complete":
+                summary = await asyncio.to_thread(
+                    _stored_summary, book_id, chapter_id, depth
+                )
+                if summary is None:
+                    continue
+                self._resolve(key, summary)
+                return summary
+            else:
+                continue
+            self._resolve(key, error=error)
+            raise error
+
+    def _resolve(
+        self,
+        key: TaskKey,
+        result: Optional[str] = None,
+        error: Optional[Exception] = None,
+    ) -> None:
+        for future in self._waiters.pop(key, []):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    async def _book_state(self, book_id: str) -> Dict[str, dict]:
+        """
+        Depth-1 chapter statuses for a book, loaded from the store on first
+        use, or on every call in shared mode where other processes update it
+        """
+        if self.shared:
+            state = await asyncio.to_thread(self.store.book_status, book_id)
+            if state:
+                self.processing[book_id] = state
+            return state
+        if book_id not in self.processing:
+            state = await asyncio.to_thread(self.store.book_status, book_id)
+            if not state:
+                return self.processing.get(book_id, {})
+            # Another caller may have loaded it while we waited
+            self.processing.setdefault(book_id, state)
+        return self.processing[book_id]
+
+    async def _set_status(
+        self,
+        book_id: str,
+        chapter_id: str,
+        status: str,
+        title: Optional[str] = None,
+        depth: int = 1,
+        error: Optional[str] = None,
+        owner: Optional[str] = None,
+    ) -> None:
+        updated = await asyncio.to_thread(
+            self.store.set_status, book_id, chapter_id, depth, status, error, owner
+        )
+        if not updated:
+            if owner is not None:
+                # Our lease expired and the task went to another worker
+                self.lost_leases += 1
+                logger.warning(f"Lost lease on {chapter_id} of book {book_id}")
+                return
+        # Chapter status in the UI tracks the depth-1 backfill
+        if depth != 1:
+            return
+        if book_id not in self.processing:
+            state = await self._book_state(book_id)
+            self.processing.setdefault(book_id, state)
+        state = self.processing[book_id]
+        chapter = state.setdefault(
+            chapter_id, {"status": status, "title": title or chapter_id}
+        )
+        chapter["status"] = status
+        chapter["error"] = error
+        if title:
+            chapter["title"] = title
+        if book_id in self._subscribers:
+            self._publish(
+                book_id,
+                {
+                    "id": chapter_id,
+                    "title": chapter["title"],
+                    "status": status,
+                    "error": error,
+                },
+            )
+
+    def subscribe(self, book_id: str) -> asyncio.Queue:
+        """
+        Receive a book's depth-1 chapter status changes as they happen.
+        A None item means events were dropped and a fresh snapshot is needed.
+        """
+        subscriber = asyncio.Queue(maxsize=SUBSCRIBER_BUFFER)
+        self._subscribers.setdefault(book_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, book_id: str, subscriber: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(book_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[book_id]
+
+    def _publish(self, book_id: str, event: Optional[dict]) -> None:
+        for subscriber in self._subscribers.get(book_id, ()):
+            try:
+                subscriber.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow to keep up; drop its backlog and ask it to resync
+                while not subscriber.empty():
+                    subscriber.get_nowait()
+                subscriber.put_nowait(None)
+
+    async def get_mode(self, book_id: str) -> str:
+        """Summary mode for a book, falling back to the queue default"""
+        if self.shared or book_id not in self._modes:
+            mode = (
+                await asyncio.to_thread(self.store.get_mode, book_id)
+                or self.default_mode
+            )
+            if self.shared:
+                return mode
+            self._modes.setdefault(book_id, mode)
+        return self._modes[book_id]
+
+    async def set_mode(self, book_id: str, mode: str) -> None:
+        """Choose how a book's remaining summaries are generated"""
+        if mode not in SUMMARY_MODES:
+            raise ValueError(f"Unsupported summary mode: {mode}")
+        await asyncio.to_thread(self.store.set_mode, book_id, mode)
+        self._modes[book_id] = mode
+
+    async def _load_weights(self, book_ids: Set[str]) -> None:
+        """Cache the stored weights of books about to be pushed"""
+        for book_id in book_ids:
+            if book_id not in self._weights:
+                weight = await asyncio.to_thread(self.store.get_weight, book_id)
+                self._weights.setdefault(book_id, weight or self.default_weight)
+
+    async def get_weight(self, book_id: str) -> float:
+        """A book's share of the workers relative to other books"""
+        if self.shared:
+            weight = await asyncio.to_thread(self.store.get_weight, book_id)
+            return weight or self.default_weight
+        await self._load_weights({book_id})
+        return self._weights[book_id]
+
+    async def set_weight(self, book_id: str, weight: float) -> None:
+        """Give a book a larger or smaller share; applies to queued tasks too"""
+        if weight <= 0:
+            raise ValueError(f"Queue weight must be positive: {weight}")
+        await asyncio.to_thread(self.store.set_weight, book_id, weight)
+        self._weights[book_id] = weight
+        self.queue.reweigh(book_id)
+
+    async def has_book(self, book_id: str) -> bool:
+        """Whether the queue has ever tracked this book"""
+        if book_id in self.processing:
+            return True
+        return await asyncio.to_thread(self.store.has_book, book_id)
+
+    async def add_book(
+        self,
+        book_id: str,
+        chapters: List[dict],
+        completed: Optional[Set[str]] = None,
+    ) -> None:
+        """Add all chapters from a book to the queue, skipping completed ones"""
+        completed = completed or set()
         logger.info(f"Adding book {book_id} to queue with {len(chapters)} chapters")
 
-        # Add each chapter to queue
+        # Reset processing status for this book
+        self.processing[book_id] = {}
+        rows = []
         for i, chapter in enumerate(chapters, 1):
             chapter_id = f"chapter-{i}"
-            self.queue.append(
-                ChapterTask(
-                    book_id=book_id,
-                    chapter_id=chapter_id,
-                    chapter_title=chapter["title"],
-                )
+            status = "complete" if chapter_id in completed else "pending"
+            rows.append(
+                (book_id, chapter_id, 1, chapter["title"], PRIORITY_BACKGROUND, status)
             )
             # Store both status and title
             self.processing[book_id][chapter_id] = {
-                "status": "pending",
+                "status": status,
                 "title": chapter["title"],
+                "error": None,
             }
-            logger.debug(
-                "Queued chapter {}: {} for book {}".format(
-                    chapter_id, chapter["title"], book_id
+        await asyncio.to_thread(self.store.remove_tasks, book_id)
+        await asyncio.to_thread(self.store.upsert_many, rows)
+        if self.shared:
+            pending = sum(row[5] == "pending" for row in rows)
+            if pending:
+                TASKS_ENQUEUED.inc("1", amount=pending)
+
+        # Add each pending chapter to queue
+        if not self.shared:
+            await self._load_weights({book_id})
+        for _, chapter_id, _, title, _, status in rows:
+            if status == "pending" and not self.shared:
+                self.queue.push(
+                    ChapterTask(
+                        book_id=book_id, chapter_id=chapter_id, chapter_title=title
+                    )
+                )
+        self._wakeup.set()
+        self._publish(book_id, None)
+
+    async def requeue_chapter(
+        self, book_id: str, chapter_id: str, title: Optional[str] = None
+    ) -> None:
+        """Mark a chapter pending again and queue it for regeneration"""
+        known = (await self._book_state(book_id)).get(chapter_id)
+        title = title or (known["title"] if known else chapter_id)
+        await self._set_status(book_id, chapter_id, "pending", title)
+        await self.enqueue(
+            ChapterTask(book_id=book_id, chapter_id=chapter_id, chapter_title=title)
+        )
+
+    async def remove_book(self, book_id: str) -> None:
+        """Forget a deleted book's tasks and status"""
+        self.processing.pop(book_id, None)
+        self._modes.pop(book_id, None)
+        self._weights.pop(book_id, None)
+        self.queue.remove_book(book_id)
+        # Nothing will run the dropped tasks; fail anyone still waiting on them
+        error = FileNotFoundError(f"Book not found: {book_id}")
+        for key in [key for key in self._waiters if key[0] == book_id]:
+            self._resolve(key, error=error)
+        await asyncio.to_thread(self.store.remove_book, book_id)
+        self._publish(book_id, None)
+
+    def _unfinished(self) -> List:
+        """Unfinished tasks, with any left in flight reset to pending"""
+        rows = self.store.unfinished()
+        for row in rows:
+            if row["status"] == "processing":
+                self.store.set_status(
+                    row["book_id"], row["chapter_id"], row["depth"], "pending"
+                )
+        return rows
+
+    async def restore(self) -> int:
+        """Re-queue tasks that were pending or in flight when the process stopped"""
+        if self.shared:
+            # Other processes may hold live leases; only take back dead ones
+            count = await asyncio.to_thread(self.store.reclaim_expired)
+            self._wakeup.set()
+            logger.info(f"Reclaimed {count} tasks with expired leases")
+            return count
+        rows = await asyncio.to_thread(self._unfinished)
+        await self._load_weights({row["book_id"] for row in rows})
+        for row in rows:
+            self.queue.push(
+                ChapterTask(
+                    book_id=row["book_id"],
+                    chapter_id=row["chapter_id"],
+                    chapter_title=row["title"],
+                    depth=row["depth"],
+                    priority=row["priority"],
                 )
             )
+        self._wakeup.set()
+        logger.info(f"Restored {len(rows)} unfinished tasks")
+        return len(rows)
 
-    def get_status(self, book_id: str) -> dict:
+    async def get_status(self, book_id: str) -> dict:
         """Get processing status for a book"""
-        if book_id not in self.processing:
+        state = await self._book_state(book_id)
+        if not state:
             logger.warning(f"Status requested for unknown book: {book_id}")
-            return {"totalChapters": 0, "completedChapters": 0, "chapters": []}
+            return {
+                "totalChapters": 0,
+                "completedChapters": 0,
+                "queuePosition": None,
+                "chapters": [],
+            }
 
         chapters = []
         completed = 0
-        for chapter_id, info in self.processing[book_id].items():
+        for chapter_id, info in state.items():
             if info["status"] == "complete":
                 completed += 1
             chapters.append(
@@ -88,13 +660,14 @@ class ProcessingQueue:
                     "id": chapter_id,
                     "title": info["title"],
                     "status": info["status"],
-                    "error": None,
+                    "error": info.get("error"),
                 }
             )
 
         status = {
             "totalChapters": len(chapters),
             "completedChapters": completed,
+            "queuePosition": await self.queue_position(book_id),
             "chapters": chapters,
         }
         logger.debug(
@@ -102,29 +675,181 @@ class ProcessingQueue:
         )
         return status
 
-    def process_next(self) -> None:
-        """Process the next chapter in queue, respecting rate limit"""
-        if not self.queue:
-            # Reset rate limit state when queue is empty
-            self.is_rate_limited = False
-            self.rate_limit_backoff = 1.0
+    async def queue_position(self, book_id: str) -> Optional[int]:
+        """Tasks that will be picked up before this book's next one"""
+        if self.shared:
+            return await asyncio.to_thread(self.store.queue_position, book_id)
+        return self.queue.position(book_id)
+
+    def depth(self) -> int:
+        """
+        Tasks waiting to be picked up; across all processes in shared mode,
+        as of the watcher's last poll
+        """
+        return self._shared_depth if self.shared else len(self.queue)
+
+    def stats(self) -> dict:
+        """Get a snapshot of the worker pool state"""
+        return {
+            "mode": QUEUE_SHARED if self.shared else QUEUE_LOCAL,
+            "owner": self.owner,
+            "lostLeases": self.lost_leases,
+            "workers": len(self._workers),
+            "activeWorkers": self._active,
+            "queued": self.depth(),
+            "singleFlight": {
+                **self.flights.stats(),
+                "coalescedSubmits": self.coalesced_submits,
+            },
+            "rateLimiter": limiter.stats(),
+            "summaryCache": summary_cache.stats(),
+            "fileCache": file_cache.stats(),
+        }
+
+    async def start(self) -> None:
+        """Start the worker pool on the running event loop"""
+        if self._workers:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        if not self._restored:
+            await self.restore()
+            self._restored = True
+        for i in range(self.num_workers):
+            self._workers.append(
+                asyncio.create_task(self._worker(i), name=f"queue-worker-{i}")
+            )
+        if self.shared:
+            self._shared_depth = await asyncio.to_thread(self.store.pending_count)
+            self._watcher = asyncio.create_task(
+                self._watch_shared(), name="queue-status-watcher"
+            )
+        logger.info(f"Started {self.num_workers} queue workers")
+
+    async def stop(self, timeout: float = 30.0) -> None:
+        """Stop accepting new work and wait for in-flight chapters to finish"""
+        if not self._workers:
             return
+        self._stopping = True
+        self._wakeup.set()
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+        _, pending = await asyncio.wait(self._workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._workers = []
+        logger.info(f"Stopped queue workers ({len(pending)} cancelled)")
+
+    async def _worker(self, worker_id: int) -> None:
+        while not self._stopping:
+            task = await self._next_task()
+            if task is None:
+                continue
+            QUEUE_WAIT.observe(time.monotonic() - task.enqueued_at)
+            self._active += 1
+            renewal = (
+                asyncio.create_task(self._renew_lease(task)) if self.shared else None
+            )
+            try:
+                await self.process_task(task)
+            except Exception as e:
+                logger.error(
+                    f"Worker {worker_id} failed on {task.chapter_id}: {str(e)}",
+                    exc_info=True,
+                )
+            finally:
+                self._active -= 1
+                if renewal is not None:
+                    renewal.cancel()
+
+    async def _next_task(self) -> Optional[ChapterTask]:
+        """Wait until a task is available, or return None when stopping"""
+        if self.shared:
+            return await self._claim_task()
+        while not self.queue:
+            if self._stopping:
+                return None
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        if self._stopping:
+            return None
+        return self.queue.pop()
 
-        # Check if we're rate limited
-        if self.is_rate_limited:
-            now = time.time()
-            if now - self.last_process_time < self.rate_limit_backoff:
+    async def _claim_task(self) -> Optional[ChapterTask]:
+        """
+        Lease the next task from the shared store. Other processes don't wake
+        this one, so an empty store is polled every poll_interval.
+        """
+        while not self._stopping:
+            self._wakeup.clear()
+            row = await asyncio.to_thread(
+                self.store.claim, self.owner, self.lease_seconds
+            )
+            if row is not None:
+                waited = max(0.0, time.time() - row["updated_at"])
+                return ChapterTask(
+                    book_id=row["book_id"],
+                    chapter_id=row["chapter_id"],
+                    chapter_title=row["title"],
+                    depth=row["depth"],
+                    priority=row["priority"],
+                    enqueued_at=time.monotonic() - waited,
+                )
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        return None
+
+    async def _renew_lease(self, task: ChapterTask) -> None:
+        """Keep a claimed task's lease alive while it is being processed"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            renewed = await asyncio.to_thread(
+                self.store.renew, *task.key, self.owner, self.lease_seconds
+            )
+            if not renewed:
+                logger.warning(
+                    f"Lease on {task.chapter_id} of book {task.book_id} expired "
+                    f"before it could be renewed"
+                )
                 return
-            # Add jitter to prevent thundering herd
-            time.sleep(random.uniform(0, 1))
 
-        # Check normal rate limit
-        now = time.time()
-        if not self.is_rate_limited and now - self.last_process_time < self.rate_limit:
-            return
+    async def _watch_shared(self) -> None:
+        """
+        Publish status changes made by other processes to this process's
+        stream subscribers, by diffing the store against the last state seen,
+        and refresh the shared queue depth
+        """
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self._shared_depth = await asyncio.to_thread(self.store.pending_count)
+            for book_id in list(self._subscribers):
+                previous = self.processing.get(book_id, {})
+                current = await asyncio.to_thread(self.store.book_status, book_id)
+                self.processing[book_id] = current
+                for chapter_id, info in current.items():
+                    seen = previous.get(chapter_id)
+                    if seen and (seen["status"], seen.get("error")) == (
+                        info["status"],
+                        info["error"],
+                    ):
+                        continue
+                    self._publish(
+                        book_id,
+                        {
+                            "id": chapter_id,
+                            "title": info["title"],
+                            "status": info["status"],
+                            "error": info["error"],
+                        },
+                    )
 
-        # Get next task
-        task = self.queue.pop(0)
+    async def process_task(self, task: ChapterTask) -> None:
+        """Summarize a single chapter, respecting the shared rate limiter"""
         book_id = task.book_id
         chapter_id = task.chapter_id
 
@@ -133,81 +858,148 @@ class ProcessingQueue:
                 chapter_id, task.chapter_title, book_id
             )
         )
+        started = time.monotonic()
+        outcome = "error"
+        # Status writes are fenced on the lease claimed for this task
+        owner = self.owner if self.shared else None
 
         try:
             # Mark as processing
-            self.processing[book_id][chapter_id]["status"] = "processing"
-
-            # Get file paths
-            chapter_file = self.books_dir / book_id / "chapters" / f"{chapter_id}.txt"
-            summary_file = (
-                self.books_dir
-                / book_id
-                / "summaries"
-                / f"{chapter_id}-depth-{task.depth}.txt"
+            await self._set_status(
+                book_id,
+                chapter_id,
+                "processing",
+                task.chapter_title,
+                task.depth,
+                owner=owner,
             )
 
-            # Check cache first
-            if summary_file.exists():
-                self.processing[book_id][chapter_id]["status"] = "complete"
+            # Check the book's stored summaries first
+            existing = await asyncio.to_thread(
+                _stored_summary, book_id, chapter_id, task.depth
+            )
+            if existing is not None:
+                await self._set_status(
+                    book_id, chapter_id, "complete", depth=task.depth, owner=owner
+                )
                 logger.info(f"Chapter {chapter_id} already summarized, using cache")
-                # Reset rate limit state on success
-                self.is_rate_limited = False
-                self.rate_limit_backoff = 1.0
+                self._resolve(task.key, existing)
+                outcome = "complete"
+                TASKS_PROCESSED.inc(str(task.depth))
                 return
 
-            # Generate summary
-            logger.info(f"Generating summary for chapter {chapter_id}")
-            summarize_chapter_file(chapter_file, summary_file, task.depth)
+            if await self.get_mode(book_id) == MODE_ALL_DEPTHS:
+                summary = await self._summarize_all_depths(task)
+            else:
+                summary = await self._summarize(task)
 
             # Mark as complete
-            self.processing[book_id][chapter_id]["status"] = "complete"
+            await self._set_status(
+                book_id, chapter_id, "complete", depth=task.depth, owner=owner
+            )
             logger.info("Successfully completed chapter {} summary".format(chapter_id))
-
-            # Reset rate limit state on success
-            self.is_rate_limited = False
-            self.rate_limit_backoff = 1.0
+            self._resolve(task.key, summary)
+            outcome = "complete"
+            TASKS_PROCESSED.inc(str(task.depth))
 
         except Exception as e:
-            error_message = str(e).lower()
-
-            # Check if it's a rate limit error
-            if "rate limit" in error_message or "quota" in error_message:
-                logger.warning(
-                    f"Rate limit hit, backing off for {self.rate_limit_backoff} seconds"
-                )
+            # The limiter has already backed off; just retry the chapter
+            if is_rate_limit_error(e):
+                outcome = "rate_limited"
+                TASKS_FAILED.inc("rate_limit")
+                logger.warning(f"Rate limited on chapter {chapter_id}, requeueing")
                 # Mark as pending to retry later
-                self.processing[book_id][chapter_id]["status"] = "pending"
-                # Put the task back at the start of the queue
-                self.queue.insert(0, task)
-                # Set rate limited state
-                self.is_rate_limited = True
-                # Increase backoff exponentially
-                self.rate_limit_backoff = min(
-                    self.rate_limit_backoff * 2, self.max_backoff
+                await self._set_status(
+                    book_id, chapter_id, "pending", depth=task.depth, owner=owner
                 )
+                # Put the task back at the front of its priority class
+                await self.enqueue(task, front=True)
             else:
                 # For non-rate-limit errors, mark as error
-                self.processing[book_id][chapter_id]["status"] = "error"
+                TASKS_FAILED.inc("error")
+                await self._set_status(
+                    book_id,
+                    chapter_id,
+                    "error",
+                    depth=task.depth,
+                    error=str(e),
+                    owner=owner,
+                )
+                self._resolve(task.key, error=e)
                 logger.error(
                     "Error processing chapter {}: {}".format(chapter_id, str(e)),
                     exc_info=True,
                 )
-
         finally:
-            self.last_process_time = time.time()
+            QUEUE_SERVICE.observe(time.monotonic() - started, outcome)
+
+    async def _summarize(self, task: ChapterTask) -> str:
+        """Generate one depth of a chapter"""
+        # Identical chapters from other books skip the LLM entirely
+        summary = await asyncio.to_thread(
+            summarize_book_chapter, task.book_id, task.chapter_id, task.depth, True
+        )
+        if summary is None:
+            # Wait for LLM capacity without holding a thread
+            await limiter.wait_until_ready()
+
+            # Generate summary off the event loop
+            logger.info(f"Generating summary for chapter {task.chapter_id}")
+            summary = await self.flights.do(
+                task.key,
+                lambda: asyncio.to_thread(
+                    summarize_book_chapter,
+                    task.book_id,
+                    task.chapter_id,
+                    task.depth,
+                    probed=True,
+                ),
+            )
+        return summary
+
+    async def _summarize_all_depths(self, task: ChapterTask) -> str:
+        """Generate every depth of a chapter in one call; returns task's depth"""
+        summaries = await asyncio.to_thread(
+            summarize_book_chapter_all_depths, task.book_id, task.chapter_id, True
+        )
+        if summaries is None:
+            await limiter.wait_until_ready()
+            logger.info(f"Generating all depths for chapter {task.chapter_id}")
+            # Depth 0 keys the shared multi-depth generation
+            summaries = await self.flights.do(
+                (task.book_id, task.chapter_id, 0),
+                lambda: asyncio.to_thread(
+                    summarize_book_chapter_all_depths,
+                    task.book_id,
+                    task.chapter_id,
+                    probed=True,
+                ),
+            )
 
-    def retry_chapter(self, book_id: str, chapter_id: str) -> None:
+        # The other depths are done too; settle anyone queued or waiting on them
+        for depth, summary in summaries.items():
+            if depth == task.depth:
+                continue
+            key = (task.book_id, task.chapter_id, depth)
+            self.queue.discard(key)
+            await self._set_status(
+                task.book_id, task.chapter_id, "complete", depth=depth
+            )
+            self._resolve(key, summary)
+        return summaries[task.depth]
+
+    async def retry_chapter(self, book_id: str, chapter_id: str) -> None:
         """Retry processing a failed chapter"""
-        if book_id not in self.processing:
+        state = await self._book_state(book_id)
+        if not state:
             msg = f"Book {book_id} not found"
             logger.error(msg)
             raise ValueError(msg)
-        if chapter_id not in self.processing[book_id]:
+        if chapter_id not in state:
             msg = f"Chapter {chapter_id} not found"
             logger.error(msg)
             raise ValueError(msg)
-        if self.processing[book_id][chapter_id]["status"] != "error":
+        if state[chapter_id]["status"] != "error":
             msg = f"Chapter {chapter_id} is not in error state"
             logger.error(msg)
             raise ValueError(msg)
@@ -216,29 +1008,42 @@ class ProcessingQueue:
 
         # Find chapter title from metadata
         chapter_title = chapter_id  # Default to ID if title not found
-        metadata_file = self.books_dir / book_id / "metadata.json"
-        if metadata_file.exists():
-            import json
+        try:
+            metadata = metadata_store.read(book_id)
+        except FileNotFoundError:
+            metadata = {"chapters": []}
+        for chapter in metadata["chapters"]:
+            if f"chapter-{chapter['number']}" == chapter_id:
+                chapter_title = chapter["title"]
+                break
 
-            with open(metadata_file) as f:
-                metadata = json.load(f)
-                for chapter in metadata["chapters"]:
-                    if f"chapter-{chapter['number']}" == chapter_id:
-                        chapter_title = chapter["title"]
-                        break
+        # Mark as pending first, so it can't undo a worker's claim
+        await self._set_status(book_id, chapter_id, "pending", chapter_title)
 
         # Add back to queue
         task = ChapterTask(
-            book_id=book_id, chapter_id=chapter_id, chapter_title=chapter_title
+            book_id=book_id,
+            chapter_id=chapter_id,
+            chapter_title=chapter_title,
+            priority=PRIORITY_INTERACTIVE,
         )
-        self.queue.append(task)
-
-        # Mark as pending
-        self.processing[book_id][chapter_id]["status"] = "pending"
-        self.processing[book_id][chapter_id]["title"] = chapter_title
+        await self.enqueue(task)
         logger.info(f"Requeued chapter {chapter_id} for processing")
 
 
 # Global queue instance
 BOOKS_DIR = os.getenv("BOOKS_DIR", "./books")
-queue = ProcessingQueue(BOOKS_DIR)
+queue = ProcessingQueue(
+    BOOKS_DIR,
+    num_workers=int(os.getenv("QUEUE_WORKERS", "4")),
+    default_mode=os.getenv("SUMMARY_MODE", MODE_SINGLE),
+    queue_mode=os.getenv("QUEUE_MODE", QUEUE_LOCAL),
+    lease_seconds=float(os.getenv("QUEUE_LEASE_SECONDS", "60")),
+    poll_interval=float(os.getenv("QUEUE_POLL_INTERVAL", "1.0")),
+    default_weight=float(os.getenv("QUEUE_DEFAULT_WEIGHT", "1.0")),
+)
+
+registry.callback("queue_depth", "Chapter tasks waiting in the queue", queue.depth)
+registry.callback(
+    "queue_active_workers", "Workers currently processing a task", lambda: queue._active
+)
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+
+from .metrics import registry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class RateLimitError(Exception):
+    """Raised when the LLM provider rejects a request for exceeding its quota"""
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Check whether an exception is a provider 429 / quota rejection"""
+    if isinstance(error, RateLimitError):
+        return True
+    try:
+        from google.api_core import exceptions as google_exceptions
+
+        if isinstance(
+            error,
+            (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests),
+        ):
+            return True
+    except ImportError:
+        pass
+    return getattr(error, "code", None) == 429
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Bucket holding up to one minute of budget, refilled continuously"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.refill_rate = per_minute / 60.0  # per second
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be consumed (0 if available now)"""
+        self._refill(now)
+        # A single request larger than the bucket is allowed once it is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+class AdaptiveRateLimiter:
+    """
+    Request/token budget plus AIMD concurrency control for LLM calls.
+
+    Every call must fit in both the requests-per-minute and tokens-per-minute
+    buckets and in the current concurrency window. The window grows by
+    roughly one slot per window of successful calls and is cut
+    multiplicatively on every 429, which also starts an exponential cooldown.
+
+    Thread-safe: `acquire` blocks the calling thread, so it is meant to be used
+    from code running in a worker thread. Async callers can `await
+    wait_until_ready()` first so they don't tie up a thread while throttled.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 15,
+        tokens_per_minute: float = 1_000_000,
+        max_concurrency: int = 4,
+        min_concurrency: int = 1,
+        decrease_factor: float = 0.5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 64.0,
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.decrease_factor = decrease_factor
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.concurrency_limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self.backoff = base_backoff
+        self.backoff_until = 0.0
+
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.total_rate_limited = 0
+        self._cond = threading.Condition()
+
+    def _delay(self, tokens: int, now: float) -> Optional[float]:
+        """Seconds to wait before a call may start; None means wait for a slot"""
+        if self.in_flight >= int(self.concurrency_limit):
+            return None
+        return max(
+            self.backoff_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now),
+            0.0,
+        )
+
+    def acquire(self, tokens: int = 1) -> None:
+        """Block until a call with the given token estimate may start"""
+        with self._cond:
+            while True:
+                delay = self._delay(tokens, time.monotonic())
+                if delay == 0.0:
+                    break
+                self._cond.wait(timeout=delay)
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self.in_flight += 1
+            self.total_requests += 1
+            self.total_tokens += tokens
+
+    def release(self, success: bool = True, rate_limited: bool = False) -> None:
+        """Return a slot and adjust the concurrency window"""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if rate_limited:
+                self.total_rate_limited += 1
+                self.concurrency_limit = max(
+                    float(self.min_concurrency),
+                    self.concurrency_limit * self.decrease_factor,
+                )
+                # Add jitter to prevent thundering herd
+                self.backoff_until = (
+                    time.monotonic() + self.backoff + random.uniform(0, 1)
+                )
+                logger.warning(
+                    f"Rate limit hit, backing off for {self.backoff:.1f}s, "
+                    f"concurrency limit now {self.concurrency_limit:.2f}"
+                )
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            elif success:
+                self.concurrency_limit = min(
+                    float(self.max_concurrency),
+                    self.concurrency_limit + 1.0 / self.concurrency_limit,
+                )
+                self.backoff = self.base_backoff
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, tokens: int = 1) -> Iterator[None]:
+        """Hold a slot for the duration of one LLM call"""
+        self.acquire(tokens)
+        try:
+            yield
+        except Exception as e:
+            self.release(success=False, rate_limited=is_rate_limit_error(e))
+            raise
+        else:
+            self.release(success=True)
+
+    async def wait_until_ready(self, tokens: int = 1) -> None:
+        """Asynchronously wait until `acquire` would not block (no reservation)"""
+        while True:
+            with self._cond:
+                delay = self._delay(tokens, time.monotonic())
+            if delay == 0.0:
+                return
+            await asyncio.sleep(delay if delay is not None else 0.1)
+
+    def stats(self) -> dict:
+        """Get a snapshot of the limiter state"""
+        with self._cond:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            return {
+                "concurrencyLimit": round(self.concurrency_limit, 2),
+                "maxConcurrency": self.max_concurrency,
+                "inFlight": self.in_flight,
+                "requestsAvailable": round(self.requests.tokens, 2),
+                "requestsPerMinute": self.requests.capacity,
+                "tokensAvailable": int(self.tokens.tokens),
+                "tokensPerMinute": self.tokens.capacity,
+                "isRateLimited": self.backoff_until > now,
+                "backoffRemaining": round(max(0.0, self.backoff_until - now), 2),
+                "totalRequests": self.total_requests,
+                "totalTokens": self.total_tokens,
+                "totalRateLimited": self.total_rate_limited,
+            }
+
+
+# Global limiter shared by the summarizer and the processing queue
+limiter = AdaptiveRateLimiter(
+    requests_per_minute=float(os.getenv("GEMINI_RPM", "15")),
+    tokens_per_minute=float(os.getenv("GEMINI_TPM", "1000000")),
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+)
+
+registry.callback(
+    "rate_limiter_concurrency_limit",
+    "Current AIMD concurrency window",
+    lambda: limiter.concurrency_limit,
+)
+registry.callback(
+    "rate_limiter_in_flight", "LLM calls holding a slot", lambda: limiter.in_flight
+)
+registry.callback(
+    "rate_limiter_backoff_seconds",
+    "Seconds left in the current 429 backoff",
+    lambda: max(0.0, limiter.backoff_until - time.monotonic()),
+)
+registry.callback(
+    "rate_limiter_rate_limited_total",
+    "Calls rejected with a 429",
+    lambda: limiter.total_rate_limited,
+    kind="counter",
+)
@@ -0,0 +1,420 @@
+import fcntl
+import logging
+import mmap
+import os
+import shutil
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .file_cache import file_cache
+
+try:
+    import zstandard
+except ImportError:  # Optional; only needed for SEGMENT_COMPRESSION=zstd
+    zstandard = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+PACK_NAME = "segments.pack"
+MAGIC = b"BKSEG01\n"
+# payload length, crc32 of payload, flags, key length
+RECORD_HEADER = struct.Struct("<IIBH")
+FLAG_ZSTD = 1
+FLAG_DELETED = 2
+# Smaller payloads gain little from compression
+MIN_COMPRESS_BYTES = 512
+
+# Larger payloads (chapter texts) are read once per summary; not worth caching
+MAX_CACHED_SEGMENT_BYTES = 64 * 1024
+
+COMPRESSION = os.getenv("SEGMENT_COMPRESSION", "none")
+MAX_OPEN_STORES = int(os.getenv("SEGMENT_MAX_OPEN_STORES", "128"))
+
+
+def chapter_key(chapter_id: str) -> str:
+    return f"{chapter_id}/text"
+
+
+def summary_key(chapter_id: str, depth: int) -> str:
+    return f"{chapter_id}/depth-{depth}"
+
+
+class SegmentStore:
+    """
+    Append-only packed file holding a book's chapter texts and summaries.
+
+    Each record is a header, a UTF-8 key and a payload (optionally zstd
+    compressed). The offset index is rebuilt with one scan on open; a later
+    record for the same key replaces an earlier one and a deleted flag
+    removes it. Appends are single writes under an exclusive file lock, and a
+    torn tail left by a crash fails its length or checksum and is truncated
+    on the next open. Reads slice a shared read-only mmap, so uncompressed
+    payloads are returned as zero-copy memoryviews. A closed store (e.g.
+    evicted by SegmentStores while a caller still holds it) reopens itself
+    on next use.
+    """
+
+    def __init__(self, path: str | Path, compression: str = COMPRESSION):
+        self.path = Path(path)
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed; storing segments uncompressed")
+            compression = "none"
+        self.compression = compression
+        self._lock = threading.RLock()
+        self._open()
+
+    def _open(self, create: bool = True) -> None:
+        # key -> (payload offset, payload length, flags)
+        self._index: Dict[str, Tuple[int, int, int]] = {}
+        self._end = len(MAGIC)
+        self._map: Optional[mmap.mmap] = None
+        flags = os.O_RDWR | os.O_APPEND | (os.O_CREAT if create else 0)
+        self._fd = os.open(self.path, flags, 0o644)
+        self._ino = os.fstat(self._fd).st_ino
+        with self._locked():
+            if os.fstat(self._fd).st_size == 0:
+                os.write(self._fd, MAGIC)
+            elif os.pread(self._fd, len(MAGIC), 0) != MAGIC:
+                os.close(self._fd)
+                raise ValueError(f"Not a segment pack: {self.path}")
+            self._scan(repair=True)
+
+    def _ensure_open(self) -> None:
+        """Reopen after close(); a deleted book's pack is not recreated"""
+        if self._fd < 0:
+            self._open(create=False)
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive lock against other threads and processes appending"""
+        with self._lock:
+            self._ensure_open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _mapped(self, size: int) -> mmap.mmap:
+        """The read-only map, remapped once the file has grown past it"""
+        self._ensure_open()
+        if self._map is None or len(self._map) < size:
+            # Old maps stay alive until views into them are released
+            self._map = mmap.mmap(self._fd, size, prot=mmap.PROT_READ)
+        return self._map
+
+    def _scan(self, repair: bool = False) -> None:
+        """
+        Index records appended since the last scan, by us or another process.
+        With repair (only under the file lock) an incomplete tail is a torn
+        write and is cut off; without it, it may be an append in progress.
+        """
+        self._ensure_open()
+        size = os.fstat(self._fd).st_size
+        if size <= self._end:
+            return
+        view = self._mapped(size)
+        offset = self._end
+        while offset + RECORD_HEADER.size <= size:
+            length, crc, flags, key_length = RECORD_HEADER.unpack_from(view, offset)
+            start = offset + RECORD_HEADER.size + key_length
+            if start + length > size:
+                break
+            payload = view[start : start + length]
+            if zlib.crc32(payload) != crc:
+                break
+            key = bytes(view[offset + RECORD_HEADER.size : start]).decode("utf-8")
+            if flags & FLAG_DELETED:
+                self._index.pop(key, None)
+            else:
+                self._index[key] = (start, length, flags)
+            offset = start + length
+        if offset < size and repair:
+            logger.warning(f"Truncating torn tail of {self.path} at {offset}")
+            self._map = None
+            os.ftruncate(self._fd, offset)
+        self._end = offset
+
+    def _append(self, key: str, payload: bytes, flags: int) -> None:
+        key_bytes = key.encode("utf-8")
+        record = (
+            RECORD_HEADER.pack(len(payload), zlib.crc32(payload), flags, len(key_bytes))
+            + key_bytes
+            + payload
+        )
+        with self._locked():
+            # Pick up other writers' records so our offsets stay right
+            self._scan(repair=True)
+            os.write(self._fd, record)
+            start = self._end + RECORD_HEADER.size + len(key_bytes)
+            self._end += len(record)
+            if flags & FLAG_DELETED:
+                self._index.pop(key, None)
+            else:
+                self._index[key] = (start, len(payload), flags)
+
+    def put(self, key: str, data: str | bytes) -> None:
+        payload = data.encode("utf-8") if isinstance(data, str) else data
+        flags = 0
+        if self.compression == "zstd" and len(payload) >= MIN_COMPRESS_BYTES:
+            payload = zstandard.ZstdCompressor().compress(payload)
+            flags |= FLAG_ZSTD
+        self._append(key, payload, flags)
+
+    def put_many(self, items: Dict[str, str | bytes]) -> None:
+        for key, data in items.items():
+            self.put(key, data)
+
+    def delete(self, key: str) -> bool:
+        if key not in self:
+            return False
+        self._append(key, b"", FLAG_DELETED)
+        return True
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key not in self._index:
+                self._scan()
+            return key in self._index
+
+    def _entry(self, key: str) -> Optional[Tuple[int, int, int]]:
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self._scan()
+                entry = self._index.get(key)
+            return entry
+
+    def get(self, key: str) -> Optional[memoryview]:
+        """Payload for key; a zero-copy view unless it was compressed"""
+        entry = self._entry(key)
+        if entry is None:
+            return None
+        return self._read(entry)
+
+    def _read(self, entry: Tuple[int, int, int]) -> memoryview:
+        start, length, flags = entry
+        with self._lock:
+            view = memoryview(self._mapped(self._end))[start : start + length]
+        if flags & FLAG_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read compressed segments")
+            return memoryview(zstandard.ZstdDecompressor().decompress(view))
+        return view
+
+    def get_text(self, key: str) -> Optional[str]:
+        """
+        Decoded payload for key. Small payloads (summaries) are kept in the
+        shared file cache; a record's offset is its stamp, so rewriting the
+        key misses without any check against the file.
+        """
+        entry = self._entry(key)
+        if entry is None:
+            return None
+        cache_key = ("segment", self.path.parent.name, self._ino, key)
+        text = file_cache.get(cache_key, entry[0])
+        if text is None:
+            text = str(self._read(entry), "utf-8")
+            if entry[1] <= MAX_CACHED_SEGMENT_BYTES:
+                file_cache.put(cache_key, entry[0], text, len(text))
+        return text
+
+    @property
+    def version(self) -> str:
+        """Changes with every append or compaction, by any process"""
+        with self._lock:
+            self._scan()
+            return f"{self._ino}-{self._end}"
+
+    def sync(self) -> None:
+        """Flush appends to disk; summaries can be regenerated, chapters can't"""
+        with self._lock:
+            self._ensure_open()
+            os.fsync(self._fd)
+
+    def keys(self) -> Iterator[str]:
+        with self._lock:
+            self._scan()
+            return iter(list(self._index))
+
+    def stats(self) -> dict:
+        with self._lock:
+            live = sum(length for _, length, _ in self._index.values())
+            return {"segments": len(self._index), "bytes": self._end, "liveBytes": live}
+
+    def compact(self) -> None:
+        """
+        Rewrite the pack without replaced or deleted records. Other processes
+        with the pack open keep the old file, so run it while they are stopped.
+        """
+        tmp_path = self.path.with_suffix(".compact")
+        with self._locked():
+            self._scan()
+            with open(tmp_path, "wb") as out:
+                out.write(MAGIC)
+                view = self._mapped(self._end)
+                for key, (start, length, flags) in self._index.items():
+                    key_bytes = key.encode("utf-8")
+                    payload = view[start : start + length]
+                    out.write(
+                        RECORD_HEADER.pack(
+                            length, zlib.crc32(payload), flags, len(key_bytes)
+                        )
+                    )
+                    out.write(key_bytes)
+                    out.write(payload)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp_path, self.path)
+            self.close()
+            self._open()
+
+    def close(self) -> None:
+        with self._lock:
+            self._map = None
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+
+    def __del__(self) -> None:
+        # Stores reopened after eviction are no longer tracked by the registry
+        if getattr(self, "_fd", -1) >= 0:
+            self.close()
+
+
+def migrate_book_dir(book_dir: Path, remove: bool = True) -> int:
+    """
+    Pack a book's chapters/*.txt and summaries/*.txt into its segment store.
+    Returns the number of segments written.
+    """
+    book_dir = Path(book_dir)
+    pack_path = book_dir / PACK_NAME
+    tmp_path = book_dir / f"{PACK_NAME}.{os.getpid()}.migrating"
+    tmp_path.unlink(missing_ok=True)
+    store = SegmentStore(tmp_path)
+    written = 0
+    for chapter_file in sorted((book_dir / "chapters").glob("*.txt")):
+        store.put(chapter_key(chapter_file.stem), chapter_file.read_bytes())
+        written += 1
+    for summary_file in sorted((book_dir / "summaries").glob("*-depth-*.txt")):
+        chapter_id, depth = summary_file.stem.rsplit("-depth-", 1)
+        store.put(summary_key(chapter_id, int(depth)), summary_file.read_bytes())
+        written += 1
+    store.sync()
+    store.close()
+    # The pack appears complete or not at all, and a concurrent migration of
+    # the same book (server and CLI) can't replace one already in use
+    try:
+        os.link(tmp_path, pack_path)
+    except FileExistsError:
+        return 0
+    finally:
+        tmp_path.unlink()
+    if remove:
+        shutil.rmtree(book_dir / "chapters", ignore_errors=True)
+        shutil.rmtree(book_dir / "summaries", ignore_errors=True)
+    return written
+
+
+class SegmentStores:
+    """
+    Open segment stores by book id, least recently used closed first. An
+    evicted store stays usable by whoever still holds it: it reopens its
+    file on next use and closes it when garbage collected.
+    """
+
+    def __init__(self, books_dir: str | Path, max_open: int = MAX_OPEN_STORES):
+        self.books_dir = Path(books_dir)
+        self.max_open = max_open
+        self._stores: OrderedDict[str, SegmentStore] = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes opening (and migrating) books without holding _lock,
+        # so lookups of open stores never wait on a migration
+        self._open_lock = threading.Lock()
+
+    def _open_store(self, book_id: str) -> Optional[SegmentStore]:
+        with self._lock:
+            store = self._stores.get(book_id)
+            if store is not None:
+                self._stores.move_to_end(book_id)
+            return store
+
+    def book(self, book_id: str) -> SegmentStore:
+        store = self._open_store(book_id)
+        if store is not None:
+            return store
+        with self._open_lock:
+            store = self._open_store(book_id)
+            if store is not None:
+                return store
+            book_dir = self.books_dir / book_id
+            if not book_dir.is_dir():
+                raise FileNotFoundError(f"Book not found: {book_id}")
+            # Books saved before packing are converted on first use
+            if not (book_dir / PACK_NAME).exists() and (book_dir / "chapters").is_dir():
+                logger.info(f"Migrating {book_id} to a segment pack")
+                migrate_book_dir(book_dir)
+            store = SegmentStore(book_dir / PACK_NAME)
+            evicted = []
+            with self._lock:
+                self._stores[book_id] = store
+                while len(self._stores) > self.max_open:
+                    evicted.append(self._stores.popitem(last=False)[1])
+        for old in evicted:
+            old.close()
+        return store
+
+    def close(self, book_id: str) -> None:
+        with self._lock:
+            store = self._stores.pop(book_id, None)
+        if store is not None:
+            store.close()
+
+
+# Global stores shared by the processor, queue and routes
+BOOKS_DIR = os.getenv("BOOKS_DIR", "./books")
+segments = SegmentStores(BOOKS_DIR)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage per-book segment packs")
+    parser.add_argument("command", choices=["migrate", "compact", "stats"])
+    parser.add_argument("book_ids", nargs="*", help="Books to act on (default: all)")
+    parser.add_argument(
+        "--keep", action="store_true", help="Keep the text files after migrating"
+    )
+    args = parser.parse_args()
+
+    books_dir = Path(BOOKS_DIR)
+    book_ids = args.book_ids or sorted(
+        entry.name
+        for entry in books_dir.iterdir()
+        if entry.is_dir() and not entry.name.startswith(".")
+    )
+    for book_id in book_ids:
+        book_dir = books_dir / book_id
+        if args.command == "migrate":
+            if (book_dir / PACK_NAME).exists():
+                print(f"{book_id}: already packed")
+                continue
+            count = migrate_book_dir(book_dir, remove=not args.keep)
+            print(f"{book_id}: packed {count} segments")
+        elif args.command == "compact":
+            store = segments.book(book_id)
+            before = store.stats()["bytes"]
+            store.compact()
+            print(f"{book_id}: {before} -> {store.stats()['bytes']} bytes")
+        else:
+            print(f"{book_id}: {segments.book(book_id).stats()}")
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent async calls that share a key into one execution.
+
+    The first caller for a key runs the function; anyone arriving while it is
+    still running awaits the same result (or exception) instead of starting
+    their own call.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._flights
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run `fn` unless a call for `key` is already in flight, then share it"""
+        if key in self._flights:
+            return await self.join(key)
+
+        self.calls += 1
+        self.executions += 1
+        future = asyncio.get_running_loop().create_future()
+        self._flights[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.failures += 1
+            future.set_exception(e)
+            # Mark as retrieved so an unobserved failure doesn't warn
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+
+    async def join(self, key: Hashable) -> T:
+        """Wait for the in-flight call for `key`"""
+        self.calls += 1
+        self.coalesced += 1
+        # Shield so a cancelled follower doesn't cancel the shared call
+        return await asyncio.shield(self._flights[key])
+
+    def stats(self) -> dict:
+        """Get call and coalescing counters"""
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "inFlight": len(self._flights),
+        }
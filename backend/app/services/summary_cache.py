@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .metrics import registry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so re-extracted copies of a chapter hash the same"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class SummaryCache:
+    """
+    Content-addressed, size-bounded LRU cache of generated summaries.
+
+    Entries are keyed on a hash of the normalized chapter text, depth, prompt
+    version and model name, so identical chapters hit the cache regardless of
+    which book or upload they came from. Each entry is one file under
+    `cache_dir`; file mtimes record recency so LRU order survives restarts.
+    """
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    @staticmethod
+    def make_key(text: str, depth: int, prompt_version: str, model_name: str) -> str:
+        digest = hashlib.sha256()
+        for part in (normalize_text(text), str(depth), prompt_version, model_name):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.txt"
+
+    def _load(self) -> None:
+        """Index existing entries, least recently used first"""
+        if not self.cache_dir.exists():
+            return
+        files = []
+        for path in self.cache_dir.glob("*/*.txt"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self.total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def get(self, key: str, count: bool = True) -> Optional[str]:
+        """
+        Return the cached summary for `key`, or None on a miss. A caller
+        re-checking a key it already looked up passes count=False, so the
+        hit/miss counters see one lookup per summary.
+        """
+        with self._lock:
+            cached = key in self._entries
+        path = self._path(key)
+        text = None
+        if cached:
+            # Files are replaced atomically, so they can be read unlocked
+            try:
+                text = path.read_text(encoding="utf-8")
+                os.utime(path)
+            except OSError:
+                pass
+        with self._lock:
+            if text is None:
+                if cached and not path.exists() and key in self._entries:
+                    # Removed behind our back
+                    self.total_bytes -= self._entries.pop(key)
+                self.misses += count
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += count
+            return text
+
+    def put(self, key: str, text: str) -> None:
+        """Store a summary, evicting least recently used entries if needed"""
+        data = text.encode("utf-8")
+        path = self._path(key)
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            self.total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._evict()
+
+    def discard(self, key: str) -> bool:
+        """Drop a cached summary so the next request regenerates it"""
+        with self._lock:
+            size = self._entries.pop(key, None)
+            if size is None:
+                return False
+            self.total_bytes -= size
+            self._path(key).unlink(missing_ok=True)
+            return True
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                self._path(key).unlink()
+            except OSError as e:
+                logger.warning(f"Failed to evict cached summary {key}: {e}")
+
+    def stats(self) -> dict:
+        """Get size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+# Global cache shared by every book
+BOOKS_DIR = os.getenv("BOOKS_DIR", "./books")
+summary_cache = SummaryCache(
+    os.getenv("SUMMARY_CACHE_DIR", os.path.join(BOOKS_DIR, ".cache", "summaries")),
+    max_bytes=int(float(os.getenv("SUMMARY_CACHE_MAX_MB", "256")) * 1024 * 1024),
+)
+
+registry.callback(
+    "summary_cache_lookups_total",
+    "Summary cache lookups by result",
+    lambda: {("hit",): summary_cache.hits, ("miss",): summary_cache.misses},
+    ["result"],
+    kind="counter",
+)
+registry.callback(
+    "summary_cache_hit_ratio",
+    "Fraction of summary cache lookups that hit",
+    lambda: summary_cache.stats()["hitRatio"],
+)
+registry.callback(
+    "summary_cache_bytes",
+    "Bytes stored in the summary cache",
+    lambda: summary_cache.total_bytes,
+)
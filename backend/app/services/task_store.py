@@ -0,0 +1,492 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    book_id TEXT NOT NULL,
+    chapter_id TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    vtag REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (book_id, chapter_id, depth)
+);
+CREATE INDEX IF NOT EXISTS tasks_book ON tasks (book_id, depth, position);
+CREATE INDEX IF NOT EXISTS tasks_unfinished ON tasks (status)
+    WHERE status IN ('pending', 'processing');
+-- Claim order; claims and queue positions are ranges over this index
+CREATE INDEX IF NOT EXISTS tasks_pending
+    ON tasks (priority, vtag, created_at, position) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS tasks_leased ON tasks (lease_expires)
+    WHERE status = 'processing';
+CREATE TABLE IF NOT EXISTS book_modes (
+    book_id TEXT PRIMARY KEY,
+    mode TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS book_weights (
+    book_id TEXT PRIMARY KEY,
+    weight REAL NOT NULL
+);
+-- Virtual time per priority class: the fair-share tag of the last claim
+CREATE TABLE IF NOT EXISTS queue_clock (
+    priority INTEGER PRIMARY KEY,
+    vtime REAL NOT NULL
+);
+"""
+
+# Columns added after the first release, created on older databases at open
+MIGRATIONS = {
+    "lease_owner": "ALTER TABLE tasks ADD COLUMN lease_owner TEXT",
+    "lease_expires": "ALTER TABLE tasks ADD COLUMN lease_expires REAL",
+    "vtag": "ALTER TABLE tasks ADD COLUMN vtag REAL NOT NULL DEFAULT 0",
+}
+
+
+def _claim_order(row: sqlite3.Row) -> tuple:
+    return row["priority"], row["vtag"], row["created_at"], row["position"]
+
+
+def chapter_position(chapter_id: str) -> int:
+    """Numeric sort key for "chapter-N" ids"""
+    try:
+        return int(chapter_id.rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return 0
+
+
+class TaskStore:
+    """
+    SQLite (WAL) record of every chapter task and its state.
+
+    Rows hold status (pending | processing | complete | error), attempt count
+    and timestamps. Unfinished tasks are found through a partial index, so
+    restoring after a restart costs O(pending tasks), and per-book status is
+    a single indexed range scan.
+
+    Several processes can drain the same database: `claim` hands out one task
+    at a time under a time-limited lease (lease_owner, lease_expires), which
+    the owner renews while it works. A task whose lease runs out is pending
+    again and can be claimed by anyone.
+
+    Claims are fair across books, using the same self-clocked fair queuing
+    as the in-memory TaskQueue: each task is stamped with a virtual finish
+    tag (vtag) when queued, claims go in (priority, vtag) order, and the
+    claimed tag advances that class's clock in queue_clock.
+    """
+
+    def __init__(self, db_path: str | Path, default_weight: float = 1.0):
+        self.db_path = Path(db_path)
+        self.default_weight = default_weight
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connection() as conn:
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+            for column, statement in MIGRATIONS.items():
+                if columns and column not in columns:
+                    conn.execute(statement)
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(
+        self,
+        book_id: str,
+        chapter_id: str,
+        depth: int,
+        title: str,
+        priority: int,
+        status: str = "pending",
+    ) -> bool:
+        """
+        Record a task, keeping its attempt count if it already exists. A task
+        under a live lease keeps its status, so it isn't handed out twice,
+        and a task that is still queued keeps its place unless its priority
+        was raised. Returns whether a pending task was newly queued.
+        """
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = conn.execute(
+                "SELECT status FROM tasks "
+                "WHERE book_id = ? AND chapter_id = ? AND depth = ?",
+                (book_id, chapter_id, depth),
+            ).fetchone()
+            (vtag,) = self._fair_tags(conn, book_id, priority, 1)
+            conn.execute(
+                """
+                INSERT INTO tasks (book_id, chapter_id, depth, position, title,
+                                   priority, status, created_at, updated_at, vtag)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (book_id, chapter_id, depth) DO UPDATE SET
+                    title = COALESCE(title, excluded.title),
+                    priority = MIN(priority, excluded.priority),
+                    status = CASE WHEN lease_expires > excluded.updated_at
+                                  THEN status ELSE excluded.status END,
+                    error = NULL,
+                    updated_at = excluded.updated_at,
+                    vtag = CASE WHEN excluded.priority < priority
+                                  OR status NOT IN ('pending', 'processing')
+                                THEN excluded.vtag ELSE vtag END
+                """,
+                (
+                    book_id,
+                    chapter_id,
+                    depth,
+                    chapter_position(chapter_id),
+                    title,
+                    priority,
+                    status,
+                    now,
+                    now,
+                    vtag,
+                ),
+            )
+        return status == "pending" and (
+            existing is None or existing["status"] not in ("pending", "processing")
+        )
+
+    def _fair_tags(
+        self, conn: sqlite3.Connection, book_id: str, priority: int, count: int
+    ) -> List[float]:
+        """
+        Virtual finish tags for a book's next `count` tasks in a class: after
+        the later of the class clock and the book's last queued tag, spaced
+        1 / weight apart
+        """
+        clock = conn.execute(
+            "SELECT vtime FROM queue_clock WHERE priority = ?", (priority,)
+        ).fetchone()
+        finish = conn.execute(
+            "SELECT MAX(vtag) FROM tasks WHERE book_id = ? AND priority = ? "
+            "AND status IN ('pending', 'processing')",
+            (book_id, priority),
+        ).fetchone()[0]
+        start = max(clock[0] if clock else 0.0, finish or 0.0)
+        step = 1.0 / (self.get_weight(book_id) or self.default_weight)
+        return [start + step * (i + 1) for i in range(count)]
+
+    def upsert_many(self, rows: Iterable[tuple]) -> None:
+        """Record many (book_id, chapter_id, depth, title, priority, status) rows"""
+        now = time.time()
+        rows = list(rows)
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Pending rows are tagged in the order given, per (book, class)
+            counts: Dict[tuple, int] = {}
+            for b, _, _, _, p, s in rows:
+                if s == "pending":
+                    counts[(b, p)] = counts.get((b, p), 0) + 1
+            tags = {
+                group: iter(self._fair_tags(conn, *group, count))
+                for group, count in counts.items()
+            }
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO tasks (book_id, chapter_id, depth, position,
+                                              title, priority, status,
+                                              created_at, updated_at, vtag)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        b,
+                        c,
+                        d,
+                        chapter_position(c),
+                        t,
+                        p,
+                        s,
+                        now,
+                        now,
+                        next(tags[(b, p)]) if s == "pending" else 0.0,
+                    )
+                    for b, c, d, t, p, s in rows
+                ],
+            )
+
+    def set_status(
+        self,
+        book_id: str,
+        chapter_id: str,
+        depth: int,
+        status: str,
+        error: Optional[str] = None,
+        owner: Optional[str] = None,
+    ) -> bool:
+        """
+        Update a task's status; any status but processing releases its lease.
+        With an owner, only applies while that owner still holds the lease.
+        Returns whether the task was updated.
+        """
+        with self._connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE tasks
+                SET status = ?, error = ?, updated_at = ?,
+                    attempts = attempts + (? = 'processing' AND lease_owner IS NULL),
+                    lease_owner = CASE WHEN ? = 'processing' THEN lease_owner END,
+                    lease_expires = CASE WHEN ? = 'processing' THEN lease_expires END
+                WHERE book_id = ? AND chapter_id = ? AND depth = ?
+                    AND (? IS NULL OR lease_owner = ?)
+                """,
+                (
+                    status,
+                    error,
+                    time.time(),
+                    status,
+                    status,
+                    status,
+                    book_id,
+                    chapter_id,
+                    depth,
+                    owner,
+                    owner,
+                ),
+            )
+        return cursor.rowcount > 0
+
+    def claim(self, owner: str, lease_seconds: float) -> Optional[sqlite3.Row]:
+        """
+        Lease the next pending task (or one whose lease has expired) to owner
+        and mark it processing; None if there is nothing to do.
+        BEGIN IMMEDIATE takes the write lock before the read, so two
+        processes can't pick the same row. Both candidates are single index
+        lookups: the head of tasks_pending and the (few) expired leases.
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            candidates = [
+                conn.execute(
+                    "SELECT * FROM tasks WHERE status = 'pending' "
+                    "ORDER BY priority, vtag, created_at, position LIMIT 1"
+                ).fetchone(),
+                conn.execute(
+                    "SELECT * FROM tasks "
+                    "WHERE status = 'processing' AND lease_expires <= ? "
+                    "ORDER BY priority, vtag, created_at, position LIMIT 1",
+                    (now,),
+                ).fetchone(),
+            ]
+            candidates = [row for row in candidates if row is not None]
+            row = min(candidates, key=_claim_order) if candidates else None
+            if row is not None:
+                conn.execute(
+                    """
+                    INSERT INTO queue_clock VALUES (?, ?)
+                    ON CONFLICT (priority) DO UPDATE
+                    SET vtime = MAX(vtime, excluded.vtime)
+                    """,
+                    (row["priority"], row["vtag"]),
+                )
+                conn.execute(
+                    """
+                    UPDATE tasks
+                    SET status = 'processing', attempts = attempts + 1,
+                        lease_owner = ?, lease_expires = ?, updated_at = ?
+                    WHERE book_id = ? AND chapter_id = ? AND depth = ?
+                    """,
+                    (
+                        owner,
+                        now + lease_seconds,
+                        now,
+                        row["book_id"],
+                        row["chapter_id"],
+                        row["depth"],
+                    ),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def renew(
+        self,
+        book_id: str,
+        chapter_id: str,
+        depth: int,
+        owner: str,
+        lease_seconds: float,
+    ) -> bool:
+        """Extend a lease; False if owner no longer holds it"""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE tasks SET lease_expires = ?
+                WHERE book_id = ? AND chapter_id = ? AND depth = ?
+                    AND status = 'processing' AND lease_owner = ?
+                """,
+                (time.time() + lease_seconds, book_id, chapter_id, depth, owner),
+            )
+        return cursor.rowcount > 0
+
+    def reclaim_expired(self) -> int:
+        """Return tasks whose lease ran out to pending; returns how many"""
+        with self._connection() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE tasks
+                SET status = 'pending', lease_owner = NULL, lease_expires = NULL
+                WHERE status = 'processing' AND lease_expires <= ?
+                """,
+                (time.time(),),
+            )
+        return cursor.rowcount
+
+    def task(self, book_id: str, chapter_id: str, depth: int) -> Optional[sqlite3.Row]:
+        return (
+            self._connection()
+            .execute(
+                "SELECT * FROM tasks WHERE book_id = ? AND chapter_id = ? AND depth = ?",
+                (book_id, chapter_id, depth),
+            )
+            .fetchone()
+        )
+
+    def queue_position(self, book_id: str) -> Optional[int]:
+        """
+        How many pending tasks will be claimed before the book's next one,
+        or None if none of its tasks are pending. Counts a range of
+        tasks_pending, so it costs O(position) index entries.
+        """
+        conn = self._connection()
+        first = conn.execute(
+            "SELECT priority, vtag, created_at, position FROM tasks "
+            "WHERE book_id = ? AND status = 'pending' "
+            "ORDER BY priority, vtag, created_at, position LIMIT 1",
+            (book_id,),
+        ).fetchone()
+        if first is None:
+            return None
+        return conn.execute(
+            "SELECT COUNT(*) FROM tasks WHERE status = 'pending' "
+            "AND (priority, vtag, created_at, position) < (?, ?, ?, ?)",
+            tuple(first),
+        ).fetchone()[0]
+
+    def pending_count(self) -> int:
+        return (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'")
+            .fetchone()[0]
+        )
+
+    def unfinished(self) -> List[sqlite3.Row]:
+        """Tasks that were pending or in flight, oldest first"""
+        return (
+            self._connection()
+            .execute(
+                "SELECT * FROM tasks WHERE status IN ('pending', 'processing') "
+                "ORDER BY created_at"
+            )
+            .fetchall()
+        )
+
+    def has_book(self, book_id: str) -> bool:
+        return (
+            self._connection()
+            .execute("SELECT 1 FROM tasks WHERE book_id = ? LIMIT 1", (book_id,))
+            .fetchone()
+            is not None
+        )
+
+    def book_status(self, book_id: str, depth: int = 1) -> Dict[str, dict]:
+        """Chapter statuses for one book, in chapter order"""
+        rows = self._connection().execute(
+            "SELECT chapter_id, title, status, error, attempts FROM tasks "
+            "WHERE book_id = ? AND depth = ? ORDER BY position",
+            (book_id, depth),
+        )
+        return {
+            row["chapter_id"]: {
+                "status": row["status"],
+                "title": row["title"],
+                "error": row["error"],
+                "attempts": row["attempts"],
+            }
+            for row in rows
+        }
+
+    def get_mode(self, book_id: str) -> Optional[str]:
+        row = (
+            self._connection()
+            .execute("SELECT mode FROM book_modes WHERE book_id = ?", (book_id,))
+            .fetchone()
+        )
+        return row["mode"] if row else None
+
+    def set_mode(self, book_id: str, mode: str) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO book_modes VALUES (?, ?)", (book_id, mode)
+            )
+
+    def get_weight(self, book_id: str) -> Optional[float]:
+        row = (
+            self._connection()
+            .execute("SELECT weight FROM book_weights WHERE book_id = ?", (book_id,))
+            .fetchone()
+        )
+        return row["weight"] if row else None
+
+    def set_weight(self, book_id: str, weight: float) -> None:
+        """Change a book's weight and re-tag its pending tasks to match"""
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO book_weights VALUES (?, ?)", (book_id, weight)
+            )
+            rows = conn.execute(
+                "SELECT chapter_id, depth, priority FROM tasks "
+                "WHERE book_id = ? AND status = 'pending' ORDER BY priority, vtag",
+                (book_id,),
+            ).fetchall()
+            # Restart the book's tags from the clock
+            conn.execute(
+                "UPDATE tasks SET vtag = 0 WHERE book_id = ? AND status = 'pending'",
+                (book_id,),
+            )
+            for priority in dict.fromkeys(row["priority"] for row in rows):
+                group = [row for row in rows if row["priority"] == priority]
+                conn.executemany(
+                    "UPDATE tasks SET vtag = ? "
+                    "WHERE book_id = ? AND chapter_id = ? AND depth = ?",
+                    [
+                        (tag, book_id, row["chapter_id"], row["depth"])
+                        for tag, row in zip(
+                            self._fair_tags(conn, book_id, priority, len(group)),
+                            group,
+                        )
+                    ],
+                )
+
+    def remove_tasks(self, book_id: str) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM tasks WHERE book_id = ?", (book_id,))
+
+    def remove_book(self, book_id: str) -> None:
+        with self._connection() as conn:
+            conn.execute("DELETE FROM tasks WHERE book_id = ?", (book_id,))
+            conn.execute("DELETE FROM book_modes WHERE book_id = ?", (book_id,))
+            conn.execute("DELETE FROM book_weights WHERE book_id = ?", (book_id,))
@@ -1,25 +1,243 @@
+import json
 import os
-import google.generativeai as genai
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 from dotenv import load_dotenv
 
+from .services.metrics import LLM_LATENCY, LLM_REQUESTS, LLM_TOKENS
+from .services.providers import get_provider
+from .services.rate_limiter import (
+    RateLimitError,
+    estimate_tokens,
+    is_rate_limit_error,
+    limiter,
+)
+from .services.summary_cache import summary_cache
+from .services.metadata_store import metadata_store
+from .services.segment_store import chapter_key, segments, summary_key
+
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY environment variable is not set")
+# The backend (Gemini by default) is chosen by SUMMARIZER_PROVIDER and
+# created on first use, so importing this module needs no API key
+
+# Bump whenever the prompts change so cached summaries are regenerated
+PROMPT_VERSION = "1"
+
+# Chapters estimated above this many tokens are summarized with map-reduce
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "30000"))
+# Concurrent chunk summaries per chapter (the rate limiter still applies)
+MAP_WORKERS = int(os.getenv("SUMMARY_MAP_WORKERS", "4"))
+
+SYSTEM_PROMPT = """
+    You are an efficient book summarizer. You will be given a chapter from a book, although sometimes you will be accidentally given the book metadata or acknowledgements or copyright, etc. which is not part of the story text. In that case, just skip and say "N/A". However, some fiction books have text like narrator dialogue or exposition or prologue or epilogue or preface, but IS fictional (story related), which you SHOULD summarize and should not skip.
+    
+    Your job is to summarize the chapter in a way that is easy to understand and to the point. Recognize what is the most important information in each chapter and convey that. Not every tiny detail is important. However, things like emotional events and emotional state, conflicts, motivations, shocking events may be salient.
+
+    Try to use the author's voice and style, and choose exact and impactful words that convey the mood and tone of the chapter, but don't use too complex vocabulary. Vary your sentence lengths, make the writing flow well, don't use too many commas.
+
+    Directly state ONLY the summary, DO NOT include any filler words like `this passage says...` or any preface like "okay, here's a summary...".
+    
+    Be sure to describe all main events, new characters appearances and characterizations, locations, important realizations by characters, any peculiar narrator musings, etc.
+
+    If any important character motivations or internal or external conflicts are revealed, describe them.
+
+    Note POV shifts, time jumps, backstory narration, or format changes (letters, poems, etc.).
+
+    You must adhere to output length limits:
+
+    """
+
+# Create prompt based on depth
+DEPTH_PROMPTS = {
+    1: "Write a short 2-3 sentence summary, include only on the most important events and developments. Feel free to omit minor details.",
+    2: "Length: 5-7 sentences:",
+    3: "Length: 3-4 paragraphs:",
+    4: (
+        "Give a comprehensive summary. First think of how to break up the chapter into sections (eg. each time the chapter switches POV or location changes). Then summarize each section individually and thoroughly. Be sure to include all important details:"
+    ),
+}
+
+# Chunk summaries are depth-independent so every depth reuses them
+MAP_PROMPT = """
+    You will be given one part of a longer chapter from a book. Summarize this part thoroughly, in order, in 1-3 paragraphs. Keep every event, character, location, realization and conflict that could matter to the chapter as a whole; the summary will be combined with the summaries of the other parts. If the part is only book metadata, acknowledgements, copyright, etc., just say "N/A".
+
+    """
+
+REDUCE_PROMPT = """
+    The chapter was too long to read at once, so below are summaries of its consecutive parts, in order. Treat them together as the chapter text and summarize the whole chapter.
+    """
+
+
+MULTI_DEPTH_PROMPT = """
+    Write four summaries of the same chapter, at increasing levels of detail, and return them as a JSON object with the keys "depth1", "depth2", "depth3" and "depth4" (each a string):
+
+    depth1: {}
+    depth2: {}
+    depth3: {}
+    depth4: {}
+
+    If the text is not part of the story, set all four values to "N/A".
+    """.format(*(DEPTH_PROMPTS[depth] for depth in range(1, 5)))
+
+
+def _generate(prompt: str, json_output: bool = False) -> str:
+    """Run one rate-limited generation on the configured provider"""
+    provider = get_provider()
+    tokens = estimate_tokens(prompt)
+    outcome = "error"
+    started = None
+    try:
+        with limiter.slot(tokens):
+            # Time the call itself, not the wait for a slot
+            started = time.perf_counter()
+            text = provider.generate(prompt, json_output=json_output)
+        outcome = "success"
+        return text
+    except Exception as e:
+        if is_rate_limit_error(e):
+            outcome = "rate_limited"
+            raise RateLimitError(f"Rate limited generating summary: {str(e)}") from e
+        raise Exception(f"Error generating summary: {str(e)}")
+    finally:
+        LLM_REQUESTS.inc(provider.name, outcome)
+        LLM_TOKENS.inc(provider.name, amount=tokens)
+        if started is not None:
+            LLM_LATENCY.observe(time.perf_counter() - started, provider.name)
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    Split text into chunks of at most ~max_tokens, breaking at paragraph
+    boundaries (or at line/word boundaries for oversized paragraphs).
+    """
+    max_chars = max_tokens * 4
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        while len(paragraph) > max_chars:
+            cut = paragraph.rfind("\n", 0, max_chars)
+            if cut <= 0:
+                cut = paragraph.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            pieces.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if paragraph:
+            pieces.append(paragraph)
+
+    chunks, current, size = [], [], 0
+    for piece in pieces:
+        if current and size + len(piece) + 2 > max_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(piece)
+        size += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _summarize_chunk(chunk: str) -> str:
+    """Summarize one chunk, reusing a cached result from an earlier attempt"""
+    cache_key = summary_cache.make_key(
+        chunk, 0, f"{PROMPT_VERSION}-map", get_provider().model_name
+    )
+    summary = summary_cache.get(cache_key)
+    if summary is None:
+        summary = _generate(MAP_PROMPT + "\n\n" + chunk)
+        summary_cache.put(cache_key, summary)
+    return summary
+
+
+def _map_chunks(chunks: List[str]) -> List[str]:
+    """Summarize chunks concurrently, in order"""
+    with ThreadPoolExecutor(max_workers=max(1, MAP_WORKERS)) as executor:
+        futures = [executor.submit(_summarize_chunk, chunk) for chunk in chunks]
+        # Let every chunk finish (and be cached) before surfacing a failure
+        wait(futures)
+    return [future.result() for future in futures]
+
+
+def _condense(chapter_text: str) -> Optional[str]:
+    """
+    Map step for chapters too long for one prompt: summarize paragraph-aligned
+    chunks concurrently, repeating until the partial summaries fit. Returns
+    None if every chunk was a non-chapter.
+    """
+    text = chapter_text
+    while estimate_tokens(text) > CHUNK_TOKENS:
+        chunks = split_into_chunks(text, CHUNK_TOKENS)
+        partials = [s for s in _map_chunks(chunks) if s.strip() != "N/A"]
+        if not partials:
+            return None
+        text = "\n\n".join(
+            f"Part {i}:\n{partial.strip()}" for i, partial in enumerate(partials, 1)
+        )
+        if len(chunks) == 1:
+            # Can't shrink any further
+            break
+    return text
+
+
+def summarize_long_chapter(chapter_text: str, depth: int = 1) -> str:
+    """
+    Map-reduce summary: condense the chapter into partial summaries, then
+    summarize those at the requested depth.
+    """
+    text = _condense(chapter_text)
+    if text is None:
+        return "N/A"
+    prompt = SYSTEM_PROMPT + "\n\n" + DEPTH_PROMPTS[depth] + "\n" + REDUCE_PROMPT
+    return _generate(prompt + "\n\n" + text)
+
+
+def _parse_all_depths(response: str) -> Dict[int, str]:
+    """
+    Read the depth1-depth4 object out of a multi-depth response. JSON is only
+    asked for by the prompt, so the object may be wrapped in a ```json fence
+    or a line of prose.
+    """
+    decoder = json.JSONDecoder()
+    for start in re.finditer(r"\{", response):
+        try:
+            data, _ = decoder.raw_decode(response, start.start())
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict) and all(
+            f"depth{depth}" in data for depth in range(1, 5)
+        ):
+            return {depth: str(data[f"depth{depth}"]).strip() for depth in range(1, 5)}
+    raise Exception(f"Malformed multi-depth summary response: {response[:200]!r}")
+
+
+def summarize_chapter_all_depths(chapter_text: str) -> Dict[int, str]:
+    """
+    Generate depths 1-4 for a chapter in a single call.
 
-genai.configure(api_key=GEMINI_API_KEY)
-# model = genai.GenerativeModel("gemini-2")
-model = genai.GenerativeModel("gemini-2.0-flash-001")
+    Returns:
+        Dict[int, str]: Summary text keyed by depth
+    """
+    prompt = SYSTEM_PROMPT + "\n\n" + MULTI_DEPTH_PROMPT
+    if estimate_tokens(chapter_text) > CHUNK_TOKENS:
+        chapter_text = _condense(chapter_text)
+        if chapter_text is None:
+            return {depth: "N/A" for depth in range(1, 5)}
+        prompt += REDUCE_PROMPT
+
+    return _parse_all_depths(
+        _generate(prompt + "\n\n" + chapter_text, json_output=True)
+    )
 
 
 def summarize_chapter(chapter_text: str, depth: int = 1) -> str:
     """
     Summarize a chapter using Gemini with different levels of detail.
+    Chapters longer than SUMMARY_CHUNK_TOKENS are summarized hierarchically.
 
     Args:
         chapter_text (str): The text content of the chapter
@@ -36,50 +254,165 @@ def summarize_chapter(chapter_text: str, depth: int = 1) -> str:
     if depth not in range(1, 5):
         raise ValueError("Depth must be between 1 and 4")
 
-    system_prompt = """
-    You are an efficient book summarizer. You will be given a chapter from a book, although sometimes you will be accidentally given the book metadata or acknowledgements or copyright, etc. which is not part of the story text. In that case, just skip and say "N/A". However, some fiction books have text like narrator dialogue or exposition or prologue or epilogue or preface, but IS fictional (story related), which you SHOULD summarize and should not skip.
-    
-    Your job is to summarize the chapter in a way that is easy to understand and to the point. Recognize what is the most important information in each chapter and convey that. Not every tiny detail is important. However, things like emotional events and emotional state, conflicts, motivations, shocking events may be salient.
-
-    Try to use the author's voice and style, and choose exact and impactful words that convey the mood and tone of the chapter, but don't use too complex vocabulary. Vary your sentence lengths, make the writing flow well, don't use too many commas.
+    if estimate_tokens(chapter_text) > CHUNK_TOKENS:
+        return summarize_long_chapter(chapter_text, depth)
 
-    Directly state ONLY the summary, DO NOT include any filler words like `this passage says...` or any preface like "okay, here's a summary...".
-    
-    Be sure to describe all main events, new characters appearances and characterizations, locations, important realizations by characters, any peculiar narrator musings, etc.
+    prompt = SYSTEM_PROMPT + "\n\n" + DEPTH_PROMPTS[depth] + "\n\n" + chapter_text
+    return _generate(prompt)
 
-    If any important character motivations or internal or external conflicts are revealed, describe them.
 
-    Note POV shifts, time jumps, backstory narration, or format changes (letters, poems, etc.).
+def _mark_non_chapter(book_id: str, chapter_id: str) -> None:
+    """Flag a chapter as a non-chapter in its book's metadata"""
+    try:
+        # Journaled and batched; the catalog is refreshed when it is flushed
+        chapter_num = int(chapter_id.split("-")[1])
+        metadata_store.update_chapter(book_id, chapter_num, isNonChapter=True)
+    except Exception as e:
+        print(f"Warning: Failed to update metadata for non-chapter: {e}")
 
-    You must adhere to output length limits:
 
+def cached_summary(
+    chapter_text: str,
+    depth: int = 1,
+    cached_only: bool = False,
+    probed: bool = False,
+) -> Optional[str]:
     """
+    Summarize chapter text at one depth through the shared summary cache, so
+    identical text from any book is only sent to the LLM once. Returns None
+    on a cache miss when cached_only is set. `probed` means the caller has
+    already looked it up with cached_only, so the re-check isn't counted.
+    """
+    cache_key = summary_cache.make_key(
+        chapter_text, depth, PROMPT_VERSION, get_provider().model_name
+    )
+    summary = summary_cache.get(cache_key, count=not probed)
+    if summary is None:
+        if cached_only:
+            return None
+        summary = summarize_chapter(chapter_text, depth)
+        summary_cache.put(cache_key, summary)
+    return summary
+
 
-    # Create prompt based on depth
-    depth_prompts = {
-        1: "Write a short 2-3 sentence summary, include only on the most important events and developments. Feel free to omit minor details.",
-        2: "Length: 5-7 sentences:",
-        3: "Length: 3-4 paragraphs:",
-        4: (
-            "Give a comprehensive summary. First think of how to break up the chapter into sections (eg. each time the chapter switches POV or location changes). Then summarize each section individually and thoroughly. Be sure to include all important details:"
-        ),
+def cached_summaries_all_depths(
+    chapter_text: str, cached_only: bool = False, probed: bool = False
+) -> Optional[Dict[int, str]]:
+    """
+    All four depths of chapter text with one LLM call; depths already in the
+    shared cache are reused as a complete set. `probed` is as for
+    cached_summary.
+    """
+    cache_keys = {
+        depth: summary_cache.make_key(
+            chapter_text, depth, PROMPT_VERSION, get_provider().model_name
+        )
+        for depth in range(1, 5)
+    }
+    summaries = {
+        depth: summary_cache.get(key, count=not probed)
+        for depth, key in cache_keys.items()
     }
+    if any(summary is None for summary in summaries.values()):
+        if cached_only:
+            return None
+        summaries = summarize_chapter_all_depths(chapter_text)
+        for depth, key in cache_keys.items():
+            summary_cache.put(key, summaries[depth])
+    return summaries
 
-    prompt = system_prompt + "\n\n" + depth_prompts[depth] + "\n\n" + chapter_text
 
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        raise Exception(f"Error generating summary: {str(e)}")
+def _read_book_chapter(book_id: str, chapter_id: str) -> str:
+    text = segments.book(book_id).get_text(chapter_key(chapter_id))
+    if text is None:
+        raise FileNotFoundError(f"Chapter not found: {book_id}/{chapter_id}")
+    return text
+
+
+def forget_book_chapter_summaries(book_id: str, chapter_id: str) -> int:
+    """
+    Drop a saved chapter's summaries from the shared cache, so regenerating
+    them calls the LLM instead of refilling the same text. Returns how many
+    depths were cached.
+    """
+    chapter_text = _read_book_chapter(book_id, chapter_id)
+    model_name = get_provider().model_name
+    return sum(
+        summary_cache.discard(
+            summary_cache.make_key(chapter_text, depth, PROMPT_VERSION, model_name)
+        )
+        for depth in range(1, 5)
+    )
+
+
+def summarize_book_chapter(
+    book_id: str,
+    chapter_id: str,
+    depth: int = 1,
+    cached_only: bool = False,
+    probed: bool = False,
+) -> Optional[str]:
+    """
+    Summarize a saved book's chapter and append the summary to the book's
+    segment store. If the summary is "N/A", marks the chapter as a
+    non-chapter in metadata.json.
+
+    Args:
+        book_id (str): The book's id
+        chapter_id (str): The chapter's id ("chapter-N")
+        depth (int): Summary detail level (1-4)
+        cached_only (bool): Return None instead of calling the LLM on a cache miss
+        probed (bool): Already looked up with cached_only; don't count the
+            cache lookup again
+
+    Returns:
+        Optional[str]: The generated summary
+    """
+    summary = cached_summary(
+        _read_book_chapter(book_id, chapter_id), depth, cached_only, probed
+    )
+    if summary is None:
+        return None
+    segments.book(book_id).put(summary_key(chapter_id, depth), summary)
+
+    # If this is a depth-1 summary and it's "N/A", update the metadata
+    if depth == 1 and summary.strip() == "N/A":
+        _mark_non_chapter(book_id, chapter_id)
+    return summary
+
+
+def summarize_book_chapter_all_depths(
+    book_id: str, chapter_id: str, cached_only: bool = False, probed: bool = False
+) -> Optional[Dict[int, str]]:
+    """
+    Generate all four depths for a saved book's chapter with one LLM call and
+    append each to the book's segment store.
+
+    Returns:
+        Optional[Dict[int, str]]: Summaries keyed by depth, or None on a cache
+        miss when cached_only is set
+    """
+    summaries = cached_summaries_all_depths(
+        _read_book_chapter(book_id, chapter_id), cached_only, probed
+    )
+    if summaries is None:
+        return None
+    segments.book(book_id).put_many(
+        {summary_key(chapter_id, depth): text for depth, text in summaries.items()}
+    )
+    if summaries[1].strip() == "N/A":
+        _mark_non_chapter(book_id, chapter_id)
+    return summaries
 
 
 def summarize_chapter_file(
-    chapter_path: str | Path, output_path: Optional[str | Path] = None, depth: int = 1
+    chapter_path: str | Path,
+    output_path: Optional[str | Path] = None,
+    depth: int = 1,
 ) -> str:
     """
-    Read a chapter file and generate its summary, optionally saving to a file.
-    If the summary is "N/A", updates the metadata.json to mark this as a non-chapter.
+    Read a standalone chapter text file and generate its summary, optionally
+    saving it to a file. Uses the shared summary cache.
 
     Args:
         chapter_path (str | Path): Path to the chapter text file
@@ -89,10 +422,7 @@ def summarize_chapter_file(
     Returns:
         str: The generated summary
     """
-    # Convert to Path objects
     chapter_path = Path(chapter_path)
-    if output_path:
-        output_path = Path(output_path)
 
     # If path starts with backend/, remove it since we're already in backend dir
     if str(chapter_path).startswith("backend/"):
@@ -107,44 +437,15 @@ def summarize_chapter_file(
     with open(chapter_path, "r", encoding="utf-8") as f:
         chapter_text = f.read()
 
-    # Generate summary
-    summary = summarize_chapter(chapter_text, depth)
+    summary = cached_summary(chapter_text, depth)
 
     # Save summary if output path is provided
     if output_path:
+        output_path = Path(output_path)
         output_path.parent.mkdir(parents=True, exist_ok=True)
         with open(output_path, "w", encoding="utf-8") as f:
             f.write(summary)
 
-        # If this is a depth-1 summary and it's "N/A", update the metadata
-        if depth == 1 and summary.strip() == "N/A":
-            try:
-                # Get book directory (2 levels up from summaries dir)
-                book_dir = output_path.parent.parent
-                metadata_path = book_dir / "metadata.json"
-
-                # Get chapter number from the output path
-                chapter_num = int(output_path.stem.split("-")[1])
-
-                # Update metadata
-                if metadata_path.exists():
-                    import json
-
-                    with open(metadata_path, "r") as f:
-                        metadata = json.load(f)
-
-                    # Update the isNonChapter flag for this chapter
-                    for chapter in metadata["chapters"]:
-                        if chapter["number"] == chapter_num:
-                            chapter["isNonChapter"] = True
-                            break
-
-                    # Save updated metadata
-                    with open(metadata_path, "w") as f:
-                        json.dump(metadata, f, indent=2)
-            except Exception as e:
-                print(f"Warning: Failed to update metadata for non-chapter: {e}")
-
     return summary
 
 
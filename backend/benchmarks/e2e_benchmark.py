@@ -0,0 +1,201 @@
+"""
+Run synthetic books through upload, parsing, summarization and serving.
+
+Uses the stub LLM provider, so it needs no API key or network. Reports parse
+time per MB, chapters summarized per second, p50/p95/p99 latency for the
+read endpoints and peak RSS, as JSON.
+
+Usage (from backend/):
+    python -m benchmarks.e2e_benchmark --chapters 50 --requests 200
+    python -m benchmarks.e2e_benchmark --formats pdf epub --output run.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .fixtures import make_epub, make_mobi, make_pdf
+
+ENDPOINTS = {
+    "books": "/api/books",
+    "status": "/api/books/{book_id}/status",
+    "summary": "/api/summary/{book_id}",
+}
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p95/p99 in milliseconds"""
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49] * 1000, 3),
+        "p95": round(cuts[94] * 1000, 3),
+        "p99": round(cuts[98] * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> dict:
+    """Peak resident set size of this process and its reaped children"""
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1
+        ),
+    }
+
+
+def make_fixture(file_type: str, path: Path, args: argparse.Namespace) -> Path:
+    if file_type == "pdf":
+        return make_pdf(path, args.chapters, args.pages_per_chapter, args.seed)
+    if file_type == "epub":
+        return make_epub(path, args.chapters, args.paragraphs_per_chapter, args.seed)
+    return make_mobi(path, args.chapters, args.paragraphs_per_chapter, args.seed)
+
+
+def upload(client, path: Path, timeout: float) -> tuple:
+    """Upload a book and wait for parsing; returns (job, seconds)"""
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        response = client.post(
+            "/api/upload", files={"file": (path.name, f, "application/octet-stream")}
+        )
+    response.raise_for_status()
+    job = response.json()
+    while job["status"] not in ("complete", "error"):
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"Parsing {path.name} timed out")
+        time.sleep(0.01)
+        job = client.get(f"/api/upload/jobs/{job['jobId']}").json()
+    if job["status"] == "error":
+        raise RuntimeError(job["error"])
+    return job, time.perf_counter() - started
+
+
+def drain(client, book_id: str, timeout: float) -> tuple:
+    """Wait for the queue to summarize every chapter; returns (chapters, seconds)"""
+    started = time.perf_counter()
+    while True:
+        status = client.get(f"/api/books/{book_id}/status").json()
+        done = sum(
+            chapter["status"] in ("complete", "error") for chapter in status["chapters"]
+        )
+        if status["totalChapters"] and done == status["totalChapters"]:
+            return status["totalChapters"], time.perf_counter() - started
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError(f"Summarizing {book_id} timed out")
+        time.sleep(0.01)
+
+
+def measure(client, path: str, requests: int) -> dict:
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path)
+        samples.append(time.perf_counter() - started)
+        response.raise_for_status()
+    return percentiles(samples)
+
+
+def run(args: argparse.Namespace) -> dict:
+    tmp_dir = Path(tempfile.mkdtemp(prefix="bookbench-"))
+    # Configure the app before it is imported; services read env at import
+    os.environ.update(
+        {
+            "BOOKS_DIR": str(tmp_dir / "books"),
+            "SUMMARIZER_PROVIDER": "stub",
+            "STUB_LATENCY_MS": str(args.llm_latency_ms),
+            "STUB_MS_PER_1K_TOKENS": str(args.llm_ms_per_1k_tokens),
+            "STUB_RATE_LIMIT_RATE": str(args.llm_rate_limit_rate),
+            "GEMINI_RPM": str(args.rpm),
+            "GEMINI_MAX_CONCURRENCY": str(args.concurrency),
+            "QUEUE_WORKERS": str(args.concurrency),
+            "PARSE_WORKERS": str(args.parse_workers),
+        }
+    )
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    results = {
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "formats")
+        },
+        "formats": {},
+    }
+    with TestClient(app) as client:
+        for file_type in args.formats:
+            try:
+                path = make_fixture(file_type, tmp_dir / f"bench.{file_type}", args)
+                job, parse_seconds = upload(client, path, args.timeout)
+                chapters, drain_seconds = drain(client, job["bookId"], args.timeout)
+            except Exception as e:
+                results["formats"][file_type] = {"error": str(e)}
+                continue
+
+            size_mb = path.stat().st_size / (1024 * 1024)
+            book_id = job["bookId"]
+            results["formats"][file_type] = {
+                "sizeMB": round(size_mb, 3),
+                "parseSeconds": round(parse_seconds, 4),
+                "parseSecondsPerMB": round(parse_seconds / size_mb, 4),
+                "chapters": chapters,
+                "drainSeconds": round(drain_seconds, 4),
+                "chaptersPerSecond": round(chapters / drain_seconds, 2),
+                "latencyMs": {
+                    name: measure(
+                        client, endpoint.format(book_id=book_id), args.requests
+                    )
+                    for name, endpoint in ENDPOINTS.items()
+                },
+            }
+        results["queue"] = client.get("/api/queue/stats").json()
+    results["peakRssMB"] = peak_rss_mb()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        default=["pdf", "epub", "mobi"],
+        choices=["pdf", "epub", "mobi"],
+    )
+    parser.add_argument("--chapters", type=int, default=30)
+    parser.add_argument("--pages-per-chapter", type=int, default=10)
+    parser.add_argument("--paragraphs-per-chapter", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--llm-latency-ms", type=float, default=20)
+    parser.add_argument("--llm-ms-per-1k-tokens", type=float, default=0)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0)
+    parser.add_argument("--rpm", type=float, default=1_000_000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", "-o", help="Also write the JSON to this file")
+    args = parser.parse_args()
+
+    # Keep stdout clean JSON; the app prints progress
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args)
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
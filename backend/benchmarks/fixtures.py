@@ -0,0 +1,140 @@
+"""Synthetic books of configurable size for benchmarks"""
+
+import random
+import shutil
+import subprocess
+from pathlib import Path
+
+from ebooklib import epub
+
+WORDS = (
+    "the a storm harbor lantern whispered she he they ran across old bridge "
+    "letter river night morning silence broke anger quiet house garden door "
+    "remembered forgot promised against window city mountain road dark light"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 18))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(3, 7)))
+
+
+def make_pdf(
+    path: Path,
+    chapters: int = 10,
+    pages_per_chapter: int = 10,
+    seed: int = 0,
+    outline: bool = False,
+) -> Path:
+    """
+    Write a text PDF with "Chapter N" headings using only the standard library,
+    optionally with an outline (bookmarks) entry per chapter
+    """
+    rng = random.Random(seed)
+    pages = []
+    for chapter in range(1, chapters + 1):
+        for page in range(pages_per_chapter):
+            lines = [f"Chapter {chapter}"] if page == 0 else []
+            while len(lines) < 45:
+                lines.append(_sentence(rng)[:90])
+            pages.append(lines)
+
+    outline_root = 4 + 2 * len(pages)
+    catalog = "<< /Type /Catalog /Pages 2 0 R >>"
+    if outline:
+        catalog = f"<< /Type /Catalog /Pages 2 0 R /Outlines {outline_root} 0 R >>"
+    objects = [
+        catalog,
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        text = " ".join(f"({line}) Tj T*" for line in lines)
+        stream = f"BT /F1 11 Tf 14 TL 50 760 Td {text} ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    if outline:
+        objects.append(
+            f"<< /Type /Outlines /First {outline_root + 1} 0 R "
+            f"/Last {outline_root + chapters} 0 R /Count {chapters} >>"
+        )
+        for chapter in range(chapters):
+            number = outline_root + 1 + chapter
+            links = f"/Prev {number - 1} 0 R " if chapter > 0 else ""
+            links += f"/Next {number + 1} 0 R " if chapter < chapters - 1 else ""
+            page = 4 + 2 * chapter * pages_per_chapter
+            objects.append(
+                f"<< /Title (Chapter {chapter + 1}) /Parent {outline_root} 0 R "
+                f"{links}/Dest [{page} 0 R /Fit] >>"
+            )
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+    out += f"startxref\n{xref}\n%%EOF\n"
+    path.write_bytes(out.encode("latin-1"))
+    return path
+
+
+def make_epub(
+    path: Path, chapters: int = 10, paragraphs_per_chapter: int = 40, seed: int = 0
+) -> Path:
+    """Write an epub with one HTML document per chapter plus front matter"""
+    rng = random.Random(seed)
+    book = epub.EpubBook()
+    book.set_identifier(f"bench-{seed}-{chapters}")
+    book.set_title("Benchmark Book")
+    book.set_language("en")
+
+    copyright_page = epub.EpubHtml(title="Copyright", file_name="copyright.xhtml")
+    copyright_page.content = (
+        "<h1>Copyright</h1><p>Copyright 2024. All rights reserved. "
+        "ISBN 978-0-00-000000-0</p>"
+    )
+    book.add_item(copyright_page)
+    items = [copyright_page]
+
+    for chapter in range(1, chapters + 1):
+        item = epub.EpubHtml(title=f"Chapter {chapter}", file_name=f"ch{chapter}.xhtml")
+        body = "".join(
+            f"<p>{_paragraph(rng)}</p>" for _ in range(paragraphs_per_chapter)
+        )
+        item.content = f"<h1>Chapter {chapter}</h1>{body}"
+        book.add_item(item)
+        items.append(item)
+
+    book.toc = items
+    book.spine = ["nav"] + items
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    epub.write_epub(str(path), book)
+    return path
+
+
+def make_mobi(
+    path: Path, chapters: int = 10, paragraphs_per_chapter: int = 40, seed: int = 0
+) -> Path:
+    """Convert a synthetic epub to mobi; needs calibre's ebook-convert on PATH"""
+    converter = shutil.which("ebook-convert")
+    if converter is None:
+        raise RuntimeError("ebook-convert (calibre) is required to generate mobi files")
+    source = make_epub(
+        path.with_suffix(".epub"), chapters, paragraphs_per_chapter, seed
+    )
+    subprocess.run([converter, str(source), str(path)], check=True, capture_output=True)
+    return path
@@ -0,0 +1,70 @@
+"""
+Time DocumentProcessor.process_document on synthetic books.
+
+Usage (from backend/):
+    python -m benchmarks.parse_benchmark --chapters 50 --runs 3
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi import UploadFile
+
+from app.processor import DocumentProcessor
+from .fixtures import make_epub, make_pdf
+
+
+async def _time_upload(processor: DocumentProcessor, path: Path, seed: int) -> float:
+    # Vary one byte so the fingerprint index doesn't short-circuit repeat runs
+    data = path.read_bytes() + f"\n%{seed}\n".encode()
+    upload = UploadFile(io.BytesIO(data), filename=path.name)
+    started = time.perf_counter()
+    await processor.process_document(upload)
+    return time.perf_counter() - started
+
+
+async def run(chapters: int, runs: int, workers: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        fixtures = {
+            "pdf": make_pdf(tmp_dir / "bench.pdf", chapters=chapters),
+            "epub": make_epub(tmp_dir / "bench.epub", chapters=chapters),
+        }
+        processor = DocumentProcessor(str(tmp_dir / "books"), parse_workers=workers)
+        results = {}
+        try:
+            for file_type, path in fixtures.items():
+                # Warm up the worker pool
+                await _time_upload(processor, path, -1)
+                timings = [await _time_upload(processor, path, i) for i in range(runs)]
+                size_mb = path.stat().st_size / (1024 * 1024)
+                results[file_type] = {
+                    "sizeMB": round(size_mb, 3),
+                    "medianSeconds": round(statistics.median(timings), 4),
+                    "secondsPerMB": round(statistics.median(timings) / size_mb, 4),
+                }
+        finally:
+            processor.shutdown()
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chapters", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    print(
+        json.dumps(asyncio.run(run(args.chapters, args.runs, args.workers)), indent=2)
+    )
+
+
+if __name__ == "__main__":
+    main()
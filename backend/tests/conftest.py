@@ -0,0 +1,105 @@
+"""
+Shared test setup. The app's services read their configuration from the
+environment when first imported, so it is set here, before any test module
+imports them: a scratch BOOKS_DIR and the offline stub summarizer.
+"""
+
+import itertools
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+BOOKS_DIR = Path(tempfile.mkdtemp(prefix="books-test-"))
+os.environ.update(
+    {
+        "BOOKS_DIR": str(BOOKS_DIR),
+        "SUMMARIZER_PROVIDER": "stub",
+        "STUB_LATENCY_MS": "1",
+        "STUB_RATE_LIMIT_RATE": "0",
+        "STUB_ERROR_RATE": "0",
+        "GEMINI_RPM": "100000",
+        "QUEUE_MODE": "local",
+        "PARSE_WORKERS": "1",
+    }
+)
+
+from benchmarks.fixtures import make_epub  # noqa: E402
+
+# Every uploaded book gets distinct text, so uploads never dedupe or share
+# cached summaries unless a test asks for it
+_seeds = itertools.count(1000)
+
+
+def wait_for(predicate, timeout: float = 30.0, interval: float = 0.02):
+    """Poll until predicate() returns something truthy, and return it"""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = predicate()
+        if result:
+            return result
+        if time.monotonic() > deadline:
+            raise TimeoutError("Condition not met in time")
+        time.sleep(interval)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def upload_book(client, tmp_path):
+    """Upload a generated epub and wait for parsing; returns the book id"""
+
+    def upload(chapters: int = 3, paragraphs: int = 8) -> str:
+        path = make_epub(
+            tmp_path / f"book-{next(_seeds)}.epub",
+            chapters,
+            paragraphs,
+            seed=next(_seeds),
+        )
+        with open(path, "rb") as f:
+            response = client.post("/api/upload", files={"file": (path.name, f)})
+        response.raise_for_status()
+        job_id = response.json()["jobId"]
+        job = wait_for(
+            lambda: (
+                job
+                if (job := client.get(f"/api/upload/jobs/{job_id}").json())["status"]
+                in ("complete", "error")
+                else None
+            )
+        )
+        assert job["status"] == "complete", job.get("error")
+        return job["bookId"]
+
+    return upload
+
+
+@pytest.fixture
+def drained(client):
+    """Wait until every chapter of a book has been summarized"""
+
+    def drain(book_id: str) -> dict:
+        def done():
+            status = client.get(f"/api/books/{book_id}/status").json()
+            finished = [
+                chapter
+                for chapter in status["chapters"]
+                if chapter["status"] in ("complete", "error")
+            ]
+            if status["totalChapters"] and len(finished) == status["totalChapters"]:
+                return status
+            return None
+
+        return wait_for(done)
+
+    return drain
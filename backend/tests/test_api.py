@@ -0,0 +1,23 @@
+def test_upload_is_summarized_by_the_worker_pool(client, upload_book, drained):
+    book_id = upload_book(chapters=3)
+    status = drained(book_id)
+    assert status["totalChapters"] >= 3
+    assert all(chapter["status"] == "complete" for chapter in status["chapters"])
+
+    summary = client.get(f"/api/summary/{book_id}?section=chapter-1&depth=1")
+    assert summary.status_code == 200
+    assert summary.json()["text"]
+
+
+def test_deeper_summary_is_generated_on_request(client, upload_book, drained):
+    book_id = upload_book(chapters=2)
+    drained(book_id)
+    response = client.get(f"/api/summary/{book_id}?section=chapter-2&depth=3")
+    assert response.status_code == 200
+    assert response.json()["text"]
+
+
+def test_deleted_book_is_gone(client, upload_book):
+    book_id = upload_book(chapters=2)
+    assert client.delete(f"/api/books/{book_id}").status_code == 200
+    assert client.get(f"/api/books/{book_id}").status_code == 404
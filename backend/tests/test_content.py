@@ -0,0 +1,40 @@
+import asyncio
+import os
+import threading
+from pathlib import Path
+
+from app.api.routes.upload import doc_processor
+
+
+def test_text_and_markdown_render_concurrently(client, upload_book, monkeypatch):
+    book_id = upload_book(chapters=3)
+
+    # Hold both renders until each has written its temp file, so they overlap
+    barrier = threading.Barrier(2, timeout=10)
+    real_replace = os.replace
+
+    def replace(src, dst):
+        if Path(dst).name in ("content.txt", "content.md"):
+            barrier.wait()
+        real_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", replace)
+
+    async def render_both():
+        return await asyncio.gather(
+            doc_processor.get_content(book_id, "text"),
+            doc_processor.get_content(book_id, "markdown"),
+        )
+
+    text_path, markdown_path = asyncio.run(render_both())
+    monkeypatch.undo()
+
+    assert text_path.name == "content.txt"
+    assert markdown_path.name == "content.md"
+    assert text_path.read_text() != markdown_path.read_text()
+    assert "#" in markdown_path.read_text()
+    assert not list(text_path.parent.glob("*.tmp"))
+
+    response = client.get(f"/api/books/{book_id}/content?format=markdown")
+    assert response.status_code == 200
+    assert response.text == markdown_path.read_text()
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from app.services.metadata_store import (
+    JOURNAL_NAME,
+    SNAPSHOT_NAME,
+    MetadataStore,
+    apply_changes,
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / "book").mkdir()
+    store = MetadataStore(tmp_path, flush_delay=60, max_journal_entries=3)
+    store.write(
+        "book",
+        {"title": "Book", "chapters": [{"number": 1, "title": "One"}]},
+    )
+    return store
+
+
+def test_updates_are_visible_before_the_flush(store, tmp_path):
+    store.update_chapter("book", 1, isNonChapter=True)
+    store.update("book", title="Renamed")
+    snapshot = json.loads((tmp_path / "book" / SNAPSHOT_NAME).read_text())
+    assert "isNonChapter" not in snapshot["chapters"][0]
+
+    metadata = store.read("book")
+    assert metadata["title"] == "Renamed"
+    assert metadata["chapters"][0]["isNonChapter"] is True
+
+
+def test_flush_folds_the_journal_into_the_snapshot(store, tmp_path):
+    store.update("book", title="Renamed")
+    assert store.flush("book")
+    assert not store.flush("book")
+    assert (tmp_path / "book" / JOURNAL_NAME).stat().st_size == 0
+    snapshot = json.loads((tmp_path / "book" / SNAPSHOT_NAME).read_text())
+    assert snapshot["title"] == "Renamed"
+
+
+def test_a_full_journal_is_flushed_immediately(store, tmp_path):
+    for n in range(3):
+        store.update("book", counter=n)
+    assert (tmp_path / "book" / JOURNAL_NAME).stat().st_size == 0
+    assert store.read("book")["counter"] == 2
+
+
+def test_torn_journal_line_is_ignored():
+    metadata = {"chapters": [{"number": 1, "title": "One"}]}
+    journal = b'{"chapter": 1, "set": {"title": "Uno"}}\n{"chapter": nu'
+    assert apply_changes(metadata, journal) == 1
+    assert metadata["chapters"][0]["title"] == "Uno"
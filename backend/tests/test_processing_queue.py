@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from app.services.queue import (
+    PRIORITY_INTERACTIVE,
+    QUEUE_SHARED,
+    ChapterTask,
+    ProcessingQueue,
+)
+from app.services.task_store import TaskStore
+
+
+def make_queue(tmp_path, **kwargs) -> ProcessingQueue:
+    # Never started, so queued tasks stay put until the test acts on them
+    return ProcessingQueue(
+        tmp_path, store=TaskStore(tmp_path / "queue.db"), poll_interval=0.05, **kwargs
+    )
+
+
+@pytest.mark.parametrize("queue_mode", ["local", QUEUE_SHARED])
+def test_removing_a_book_fails_its_waiters(tmp_path, queue_mode):
+    queue = make_queue(tmp_path, queue_mode=queue_mode)
+
+    async def scenario():
+        waiting = [
+            asyncio.create_task(
+                queue.submit(
+                    ChapterTask(
+                        "book",
+                        f"chapter-{n}",
+                        f"Chapter {n}",
+                        priority=PRIORITY_INTERACTIVE,
+                    )
+                )
+            )
+            for n in (1, 2)
+        ]
+        other = asyncio.create_task(
+            queue.submit(ChapterTask("other", "chapter-1", "Chapter 1"))
+        )
+        await asyncio.sleep(0.1)
+        await queue.remove_book("book")
+        results = await asyncio.wait_for(
+            asyncio.gather(*waiting, return_exceptions=True), timeout=5
+        )
+        assert not other.done()
+        other.cancel()
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, Exception) for result in results)
+    assert ("book", "chapter-1", 1) not in queue.queue
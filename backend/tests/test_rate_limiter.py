@@ -0,0 +1,61 @@
+import pytest
+
+from app.services.rate_limiter import (
+    AdaptiveRateLimiter,
+    RateLimitError,
+    TokenBucket,
+    is_rate_limit_error,
+)
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)  # one per second
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0.0
+    bucket.consume(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1.0) == 0.0
+
+
+def test_oversized_request_fits_a_full_bucket():
+    bucket = TokenBucket(10)
+    assert bucket.wait_time(1000, bucket.updated) == 0.0
+
+
+def test_concurrency_window_grows_and_halves():
+    limiter = AdaptiveRateLimiter(requests_per_minute=1000, max_concurrency=4)
+    limiter.concurrency_limit = 2.0
+    limiter.acquire()
+    limiter.release(success=True)
+    assert limiter.concurrency_limit == pytest.approx(2.5)
+
+    limiter.acquire()
+    limiter.release(success=False, rate_limited=True)
+    assert limiter.concurrency_limit == pytest.approx(1.25)
+    assert limiter.backoff == 2 * limiter.base_backoff
+    assert limiter.total_rate_limited == 1
+
+
+def test_full_window_blocks_new_calls():
+    limiter = AdaptiveRateLimiter(requests_per_minute=1000, max_concurrency=1)
+    limiter.acquire()
+    assert limiter._delay(1, limiter.requests.updated) is None
+    limiter.release()
+    assert limiter._delay(1, limiter.requests.updated) == 0.0
+
+
+def test_slot_reports_rate_limits():
+    limiter = AdaptiveRateLimiter(requests_per_minute=1000, max_concurrency=4)
+    with pytest.raises(RateLimitError):
+        with limiter.slot():
+            raise RateLimitError("429 Too Many Requests")
+    assert limiter.in_flight == 0
+    assert limiter.total_rate_limited == 1
+
+
+def test_recognizes_rate_limit_errors():
+    from google.api_core import exceptions
+
+    assert is_rate_limit_error(RateLimitError("quota"))
+    assert is_rate_limit_error(exceptions.ResourceExhausted("quota"))
+    assert not is_rate_limit_error(ValueError("bad input"))
@@ -0,0 +1,108 @@
+import os
+import threading
+
+from app.services import segment_store
+
+from app.services.segment_store import (
+    PACK_NAME,
+    SegmentStore,
+    SegmentStores,
+    chapter_key,
+    migrate_book_dir,
+    summary_key,
+)
+
+
+def test_put_get_delete_survive_reopen(tmp_path):
+    store = SegmentStore(tmp_path / PACK_NAME)
+    store.put("a", "first")
+    store.put("b", b"bytes")
+    store.put("a", "second")
+    assert store.delete("b")
+    assert not store.delete("missing")
+    store.close()
+
+    reopened = SegmentStore(tmp_path / PACK_NAME)
+    assert reopened.get_text("a") == "second"
+    assert "b" not in reopened
+    assert list(reopened.keys()) == ["a"]
+
+
+def test_torn_tail_is_truncated_on_open(tmp_path):
+    path = tmp_path / PACK_NAME
+    store = SegmentStore(path)
+    store.put("kept", "intact record")
+    size = path.stat().st_size
+    store.put("torn", "x" * 100)
+    store.close()
+    with open(path, "r+b") as f:
+        f.truncate(path.stat().st_size - 10)
+
+    reopened = SegmentStore(path)
+    assert reopened.get_text("kept") == "intact record"
+    assert "torn" not in reopened
+    assert os.path.getsize(path) == size
+
+
+def test_compact_keeps_only_live_records(tmp_path):
+    store = SegmentStore(tmp_path / PACK_NAME)
+    for n in range(5):
+        store.put("key", f"version {n}")
+    store.put("gone", "deleted")
+    store.delete("gone")
+    before = store.stats()["bytes"]
+    store.compact()
+    assert store.stats()["bytes"] < before
+    assert store.get_text("key") == "version 4"
+    assert "gone" not in store
+
+
+def test_evicted_store_stays_usable(tmp_path):
+    for book_id in ("one", "two"):
+        (tmp_path / book_id).mkdir()
+    stores = SegmentStores(tmp_path, max_open=1)
+    first = stores.book("one")
+    first.put("k", "v")
+    stores.book("two")  # evicts "one"
+    assert first.get_text("k") == "v"
+
+
+def test_migrates_text_files_into_a_pack(tmp_path):
+    book_dir = tmp_path / "book"
+    (book_dir / "chapters").mkdir(parents=True)
+    (book_dir / "summaries").mkdir()
+    (book_dir / "chapters" / "chapter-1.txt").write_text("text")
+    (book_dir / "summaries" / "chapter-1-depth-2.txt").write_text("summary")
+    assert migrate_book_dir(book_dir) == 2
+    store = SegmentStore(book_dir / PACK_NAME)
+    assert store.get_text(chapter_key("chapter-1")) == "text"
+    assert store.get_text(summary_key("chapter-1", 2)) == "summary"
+    assert not (book_dir / "chapters").exists()
+
+
+def test_migration_does_not_block_open_stores(tmp_path, monkeypatch):
+    (tmp_path / "open").mkdir()
+    (tmp_path / "old" / "chapters").mkdir(parents=True)
+    stores = SegmentStores(tmp_path)
+    store = stores.book("open")
+
+    started, release = threading.Event(), threading.Event()
+
+    def migrate(book_dir, remove=True):
+        started.set()
+        release.wait(10)
+        return 0
+
+    monkeypatch.setattr(segment_store, "migrate_book_dir", migrate)
+    opener = threading.Thread(target=stores.book, args=("old",))
+    opener.start()
+    try:
+        assert started.wait(10)
+        found = []
+        lookup = threading.Thread(target=lambda: found.append(stores.book("open")))
+        lookup.start()
+        lookup.join(2)
+        assert found == [store]
+    finally:
+        release.set()
+        opener.join()
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from app.summarizer import _parse_all_depths, split_into_chunks
+
+DEPTHS = {f"depth{depth}": f"Summary {depth}" for depth in range(1, 5)}
+EXPECTED = {depth: f"Summary {depth}" for depth in range(1, 5)}
+
+
+def test_parses_a_bare_object():
+    assert _parse_all_depths(json.dumps(DEPTHS)) == EXPECTED
+
+
+def test_parses_a_fenced_object_inside_prose():
+    response = (
+        "Here are the summaries {as requested}:\n```json\n"
+        + json.dumps(DEPTHS, indent=2)
+        + "\n```\nLet me know if you need {anything} else."
+    )
+    assert _parse_all_depths(response) == EXPECTED
+
+
+def test_rejects_a_response_without_all_depths():
+    with pytest.raises(Exception, match="Malformed"):
+        _parse_all_depths('{"depth1": "only one"}')
+
+
+def test_chunks_break_at_paragraphs():
+    text = "\n\n".join("word " * 50 for _ in range(10))
+    chunks = split_into_chunks(text, max_tokens=100)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
@@ -0,0 +1,38 @@
+from app.services.summary_cache import SummaryCache, summary_cache
+
+
+def test_recheck_is_not_counted(tmp_path):
+    cache = SummaryCache(tmp_path, max_bytes=1000)
+    key = cache.make_key("text", 1, "v1", "model")
+    assert cache.get(key) is None
+    assert cache.get(key, count=False) is None
+    cache.put(key, "summary")
+    assert cache.get(key) == "summary"
+    assert cache.get(key, count=False) == "summary"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_missing_file_drops_the_entry(tmp_path):
+    cache = SummaryCache(tmp_path, max_bytes=1000)
+    key = cache.make_key("text", 1, "v1", "model")
+    cache.put(key, "summary")
+    cache._path(key).unlink()
+    assert cache.get(key) is None
+    assert cache.total_bytes == 0
+    assert not cache._entries
+
+
+def test_discard_removes_the_file(tmp_path):
+    cache = SummaryCache(tmp_path, max_bytes=1000)
+    key = cache.make_key("text", 1, "v1", "model")
+    cache.put(key, "summary")
+    cache.discard(key)
+    assert not cache._path(key).exists()
+    assert cache.get(key) is None
+
+
+def test_each_generated_summary_is_one_miss(upload_book, drained):
+    misses, entries = summary_cache.misses, len(summary_cache._entries)
+    book_id = upload_book(chapters=3)
+    drained(book_id)
+    assert summary_cache.misses - misses == len(summary_cache._entries) - entries
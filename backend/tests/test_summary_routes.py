@@ -0,0 +1,68 @@
+import json
+
+from app.services.queue import PRIORITY_BACKGROUND, queue
+from app.services.rate_limiter import limiter
+from app.services.segment_store import segments, summary_key
+from app.services.task_store import TaskStore
+
+
+def test_resummarize_calls_the_llm_again(client, upload_book, drained):
+    book_id = upload_book(chapters=2)
+    drained(book_id)
+    calls = limiter.total_requests
+
+    response = client.delete(f"/api/books/{book_id}/chapters/chapter-2/summary")
+    assert response.status_code == 200
+    assert response.json()["deleted_files"]
+    drained(book_id)
+    summary = client.get(f"/api/summary/{book_id}?section=chapter-2&depth=1")
+    assert summary.json()["text"]
+    assert limiter.total_requests > calls
+
+
+def test_requesting_a_section_keeps_its_title(client, upload_book, drained):
+    book_id = upload_book(chapters=3)
+    drained(book_id)
+    book = client.get(f"/api/books/{book_id}").json()
+    # The front matter shifts numbering, so chapter-3 isn't titled "Chapter 3"
+    title = book["metadata"]["chapters"][2]["title"]
+    assert title != "Chapter 3"
+
+    segments.book(book_id).delete(summary_key("chapter-3", 1))
+    response = client.get(f"/api/summary/{book_id}?section=chapter-3&depth=1")
+    assert response.status_code == 200
+
+    status = client.get(f"/api/books/{book_id}/status").json()
+    assert status["chapters"][2]["title"] == title
+    assert queue.store.task(book_id, "chapter-3", 1)["title"] == title
+
+
+def test_upsert_keeps_the_stored_title(tmp_path):
+    store = TaskStore(tmp_path / "queue.db")
+    store.upsert("a", "chapter-1", 1, "Prologue", 10, status="complete")
+    store.upsert("a", "chapter-1", 1, "Chapter 1", 0)
+    assert store.task("a", "chapter-1", 1)["title"] == "Prologue"
+
+
+def test_stream_leaves_missing_chapters_at_background_priority(
+    client, upload_book, drained, monkeypatch
+):
+    book_id = upload_book(chapters=3)
+    drained(book_id)
+    store = segments.book(book_id)
+    for n in (2, 3):
+        store.delete(summary_key(f"chapter-{n}", 1))
+
+    submitted = []
+
+    async def submit(task):
+        submitted.append(task)
+        return "summary"
+
+    monkeypatch.setattr(queue, "submit", submit)
+    response = client.get(f"/api/summary/{book_id}?depth=1&stream=true")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0]["type"] == "book"
+    assert events[-1]["type"] == "done"
+    assert sorted(task.chapter_id for task in submitted) == ["chapter-2", "chapter-3"]
+    assert all(task.priority == PRIORITY_BACKGROUND for task in submitted)
@@ -0,0 +1,97 @@
+import random
+
+from app.services.queue import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    ChapterTask,
+    TaskQueue,
+)
+
+
+def task(book_id: str, n: int, depth: int = 1, priority: int = PRIORITY_BACKGROUND):
+    return ChapterTask(book_id, f"chapter-{n}", f"Chapter {n}", depth, priority)
+
+
+def drain(queue: TaskQueue) -> list:
+    order = []
+    while len(queue):
+        popped = queue.pop()
+        order.append((popped.book_id, popped.chapter_id))
+    return order
+
+
+def test_interactive_tasks_run_before_background():
+    queue = TaskQueue()
+    for n in range(1, 4):
+        queue.push(task("a", n))
+    queue.push(task("b", 1, priority=PRIORITY_INTERACTIVE))
+    assert queue.pop().book_id == "b"
+
+
+def test_books_share_a_priority_class_fairly():
+    queue = TaskQueue()
+    for n in range(1, 6):
+        queue.push(task("a", n))
+    for n in range(1, 3):
+        queue.push(task("b", n))
+    assert drain(queue) == [
+        ("a", "chapter-1"),
+        ("b", "chapter-1"),
+        ("a", "chapter-2"),
+        ("b", "chapter-2"),
+        ("a", "chapter-3"),
+        ("a", "chapter-4"),
+        ("a", "chapter-5"),
+    ]
+
+
+def test_weights_scale_a_books_share():
+    weights = {"heavy": 2.0, "light": 1.0}
+    queue = TaskQueue(weights.__getitem__)
+    for n in range(1, 7):
+        queue.push(task("heavy", n))
+        queue.push(task("light", n))
+    first_six = [book_id for book_id, _ in drain(queue)[:6]]
+    assert first_six.count("heavy") == 4
+
+
+def test_duplicate_push_only_raises_priority():
+    queue = TaskQueue()
+    assert queue.push(task("a", 1))
+    assert not queue.push(task("a", 1))
+    assert queue.push(task("a", 1, priority=PRIORITY_INTERACTIVE))
+    assert len(queue) == 1
+    assert queue.pop().priority == PRIORITY_INTERACTIVE
+
+
+def test_remove_book_and_discard():
+    queue = TaskQueue()
+    for n in range(1, 4):
+        queue.push(task("a", n))
+        queue.push(task("b", n))
+    queue.remove_book("a")
+    queue.discard(("b", "chapter-2", 1))
+    assert drain(queue) == [("b", "chapter-1"), ("b", "chapter-3")]
+
+
+def test_position_counts_tasks_ahead():
+    rng = random.Random(7)
+    queue = TaskQueue()
+    books = [f"book-{i}" for i in range(5)]
+    for n in range(1, 40):
+        queue.push(
+            task(
+                rng.choice(books),
+                n,
+                priority=rng.choice((PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND)),
+            )
+        )
+    for _ in range(10):
+        queue.pop()
+    # Brute force: pop a copy in order and find each book's first task
+    positions = {book_id: queue.position(book_id) for book_id in books}
+    expected = {}
+    for index, (book_id, _) in enumerate(drain(queue)):
+        expected.setdefault(book_id, index)
+    for book_id in books:
+        assert positions[book_id] == expected.get(book_id)
@@ -0,0 +1,82 @@
+import pytest
+
+from app.services.task_store import TaskStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TaskStore(tmp_path / "queue.db")
+
+
+def test_claims_follow_priority_then_fair_share(store):
+    for n in range(1, 4):
+        store.upsert("a", f"chapter-{n}", 1, f"A{n}", 10)
+    store.upsert("b", "chapter-1", 1, "B1", 10)
+    store.upsert("c", "chapter-9", 2, "C9", 0)
+    claimed = []
+    while (row := store.claim("worker", 60)) is not None:
+        claimed.append((row["book_id"], row["chapter_id"]))
+    assert claimed == [
+        ("c", "chapter-9"),
+        ("a", "chapter-1"),
+        ("b", "chapter-1"),
+        ("a", "chapter-2"),
+        ("a", "chapter-3"),
+    ]
+
+
+def test_a_task_is_leased_to_one_owner(store):
+    store.upsert("a", "chapter-1", 1, "A1", 10)
+    assert store.claim("one", 60)["chapter_id"] == "chapter-1"
+    assert store.claim("two", 60) is None
+    # Re-queueing a task under a live lease doesn't hand it out again
+    assert not store.upsert("a", "chapter-1", 1, "A1", 0)
+    assert store.claim("two", 60) is None
+    assert store.renew("a", "chapter-1", 1, "one", 60)
+    assert not store.renew("a", "chapter-1", 1, "two", 60)
+
+
+def test_expired_lease_moves_to_another_owner(store):
+    store.upsert("a", "chapter-1", 1, "A1", 10)
+    store.claim("crashed", 0)
+    row = store.claim("alive", 60)
+    assert row is not None and row["chapter_id"] == "chapter-1"
+    # The old owner's late writes are fenced off
+    assert not store.set_status("a", "chapter-1", 1, "complete", owner="crashed")
+    assert store.set_status("a", "chapter-1", 1, "complete", owner="alive")
+    assert store.task("a", "chapter-1", 1)["status"] == "complete"
+
+
+def test_reclaim_expired_returns_tasks_to_pending(store):
+    store.upsert("a", "chapter-1", 1, "A1", 10)
+    store.upsert("a", "chapter-2", 1, "A2", 10)
+    assert store.claim("live", 60)["chapter_id"] == "chapter-1"
+    assert store.claim("crashed", 0)["chapter_id"] == "chapter-2"
+    assert store.reclaim_expired() == 1
+    assert store.task("a", "chapter-1", 1)["status"] == "processing"
+    assert store.task("a", "chapter-2", 1)["status"] == "pending"
+
+
+def test_queue_position_counts_pending_tasks_ahead(store):
+    for n in range(1, 4):
+        store.upsert("a", f"chapter-{n}", 1, f"A{n}", 10)
+    store.upsert("b", "chapter-1", 1, "B1", 10)
+    assert store.queue_position("a") == 0
+    assert store.queue_position("b") == 1
+    assert store.queue_position("missing") is None
+    store.claim("worker", 60)
+    assert store.queue_position("b") == 0
+
+
+def test_book_status_lists_depth_one_chapters(store):
+    store.upsert_many(
+        [
+            ("a", "chapter-2", 1, "Two", 10, "pending"),
+            ("a", "chapter-1", 1, "One", 10, "complete"),
+        ]
+    )
+    status = store.book_status("a")
+    assert list(status) == ["chapter-1", "chapter-2"]
+    assert status["chapter-1"]["status"] == "complete"
+    store.remove_book("a")
+    assert not store.has_book("a")
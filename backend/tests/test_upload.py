@@ -0,0 +1,27 @@
+from app.services.queue import queue
+from conftest import wait_for
+
+
+def test_flagged_sections_are_queued_as_complete(client, upload_book, monkeypatch):
+    added = {}
+    add_book = queue.add_book
+
+    async def record(book_id, chapters, completed=None):
+        added[book_id] = completed
+        await add_book(book_id, chapters, completed)
+
+    monkeypatch.setattr(queue, "add_book", record)
+    book_id = upload_book(chapters=3)
+    # Chapters are queued just after the job reports complete
+    wait_for(lambda: book_id in added)
+    monkeypatch.undo()
+
+    chapters = client.get(f"/api/books/{book_id}").json()["metadata"]["chapters"]
+    flagged = {
+        f"chapter-{chapter['number']}"
+        for chapter in chapters
+        if chapter["isNonChapter"]
+    }
+    # The fixture's copyright page is front matter
+    assert flagged
+    assert added[book_id] == flagged
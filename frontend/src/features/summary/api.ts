@@ -1,4 +1,4 @@
-import { SummaryResponse } from "./types";
+import { SummaryResponse, SummaryStreamEvent } from "./types";
 
 const API_URL = import.meta.env.VITE_API_URL;
 
@@ -21,3 +21,41 @@ export async function fetchSummary(
 
   return response.json();
 }
+
+// Read the whole-book summary as it is generated. Return false from onEvent
+// to stop reading early; chapters still finish in the background.
+export async function streamSummary(
+  bookId: string,
+  depth: number,
+  onEvent: (event: SummaryStreamEvent) => boolean | void
+): Promise<void> {
+  const params = new URLSearchParams({
+    depth: depth.toString(),
+    stream: "true",
+  });
+  const response = await fetch(`${API_URL}/api/summary/${bookId}?${params}`, {
+    // Streams are served uncompressed so lines arrive as they are written
+    headers: { Accept: "application/x-ndjson" },
+  });
+
+  if (!response.ok || !response.body) {
+    const error = await response.text();
+    throw new Error(`Failed to fetch summary: ${error}`);
+  }
+
+  const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += value;
+    const lines = buffer.split("\n");
+    buffer = lines.pop()!;
+    for (const line of lines) {
+      if (line && onEvent(JSON.parse(line)) === false) {
+        await reader.cancel();
+        return;
+      }
+    }
+  }
+}
@@ -1,6 +1,6 @@
 import { useState, useEffect } from "react";
 import { SummarySection } from "../types";
-import { fetchSummary } from "../api";
+import { streamSummary } from "../api";
 import { summaryCache } from "../cache";
 
 export function useSummary(bookId: string) {
@@ -28,24 +28,23 @@ export function useSummary(bookId: string) {
           return;
         }
 
-        // Fetch initial summary
-        const response = await fetchSummary(bookId, 1);
-
-        // Cache the summary
-        summaryCache.set(bookId, undefined, 1, response.text);
-
-        // Create initial summary structure
-        setSummary({
-          id: "root",
-          title: "Book Summary",
-          content: response.text,
-          depth: 0,
-          sections: response.sections.map((section) => ({
-            ...section,
+        // Only the chapter list is needed, which is the first line of the
+        // stream; don't wait for every chapter to be summarized
+        await streamSummary(bookId, 1, (event) => {
+          if (event.type !== "book") return;
+          setSummary({
+            id: "root",
+            title: "Book Summary",
             content: "",
-            depth: 1,
-            sections: [],
-          })),
+            depth: 0,
+            sections: event.sections.map((section) => ({
+              ...section,
+              content: "",
+              depth: 1,
+              sections: [],
+            })),
+          });
+          return false;
         });
       } catch (err) {
         setError(err instanceof Error ? err.message : "Failed to load summary");
@@ -20,3 +20,16 @@ export interface SummaryCacheEntry {
   timestamp: number;
   depth: number;
 }
+
+// One line of the NDJSON whole-book summary stream
+export type SummaryStreamEvent =
+  | {
+      type: "book";
+      id: string;
+      title: string;
+      depth: number;
+      sections: Array<{ id: string; title: string; depth: number }>;
+    }
+  | { type: "section"; id: string; title: string; depth: number; content: string }
+  | { type: "error"; id: string; error: string }
+  | { type: "done" };
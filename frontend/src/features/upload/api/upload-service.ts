@@ -15,6 +15,37 @@ interface UploadResponse {
   };
 }
 
+interface UploadJob extends Omit<UploadResponse, "metadata"> {
+  jobId: string;
+  status: "queued" | "parsing" | "complete" | "error";
+  progress: number;
+  error: string | null;
+  metadata: UploadResponse["metadata"] | null;
+}
+
+const JOB_POLL_INTERVAL_MS = 500;
+
+async function waitForJob(
+  job: UploadJob,
+  onProgress?: (progress: number) => void
+): Promise<UploadResponse> {
+  while (job.status !== "complete") {
+    if (job.status === "error") {
+      throw new Error(job.error || "Failed to process file");
+    }
+    onProgress?.(job.progress);
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+
+    const response = await fetch(`${API_URL}/api/upload/jobs/${job.jobId}`);
+    if (!response.ok) {
+      throw new Error("Failed to get upload status");
+    }
+    job = await response.json();
+  }
+  onProgress?.(1);
+  return job as UploadResponse;
+}
+
 export async function uploadFile(
   file: File,
   onProgress?: (progress: number) => void
@@ -34,7 +65,8 @@ export async function uploadFile(
       throw new Error(error.detail || "Failed to upload file");
     }
 
-    return await response.json();
+    // The server parses in the background; wait for the book to be ready
+    return await waitForJob(await response.json(), onProgress);
   } catch (error) {
     if (error instanceof Error) {
       throw new Error(`Upload failed: ${error.message}`);
@@ -33,6 +33,8 @@ export interface ChapterStatus {
 export interface BookStatus {
   totalChapters: number;
   completedChapters: number;
+  // Tasks ahead of this book's next chapter; null when nothing is queued
+  queuePosition?: number | null;
   chapters: ChapterStatus[];
 }
 
@@ -93,6 +95,25 @@ export async function getBookStatus(bookId: string): Promise<BookStatus> {
   return response.json();
 }
 
+// Subscribe to status updates: a full snapshot on connect (and after any
+// gap), then one event per chapter status change. Call close() to stop.
+export function streamBookStatus(
+  bookId: string,
+  onSnapshot: (status: BookStatus) => void,
+  onChapter: (chapter: ChapterStatus) => void
+): EventSource {
+  const source = new EventSource(
+    `${API_URL}/api/books/${bookId}/status/stream`
+  );
+  source.addEventListener("snapshot", (event) =>
+    onSnapshot(JSON.parse((event as MessageEvent).data))
+  );
+  source.addEventListener("chapter", (event) =>
+    onChapter(JSON.parse((event as MessageEvent).data))
+  );
+  return source;
+}
+
 export async function getChapterSummary(
   bookId: string,
   chapterId: string
@@ -1,70 +1,58 @@
-import {
-  useQuery,
-  useMutation,
-  useQueryClient,
-  Query,
-} from "@tanstack/react-query";
+import { useEffect } from "react";
+import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
 import {
   getBookStatus,
+  streamBookStatus,
   retryChapter,
   BookStatus,
+  ChapterStatus,
   fetchSummary,
   getNonChapters,
   deleteChapterSummaries,
 } from "./api";
 
+function applyChapterStatus(
+  status: BookStatus | undefined,
+  chapter: ChapterStatus
+): BookStatus | undefined {
+  if (!status) return status;
+  const chapters = status.chapters.some((ch) => ch.id === chapter.id)
+    ? status.chapters.map((ch) => (ch.id === chapter.id ? chapter : ch))
+    : [...status.chapters, chapter];
+  return {
+    ...status,
+    totalChapters: chapters.length,
+    completedChapters: chapters.filter((ch) => ch.status === "complete")
+      .length,
+    chapters,
+  };
+}
+
 export function useBookStatus(bookId: string | null) {
+  const queryClient = useQueryClient();
+
+  // Push updates into the query cache instead of polling
+  useEffect(() => {
+    if (!bookId) return;
+    const queryKey = ["book", bookId, "status"];
+    const source = streamBookStatus(
+      bookId,
+      (status) => queryClient.setQueryData(queryKey, status),
+      (chapter) =>
+        queryClient.setQueryData(queryKey, (status: BookStatus | undefined) =>
+          applyChapterStatus(status, chapter)
+        )
+    );
+    return () => source.close();
+  }, [bookId, queryClient]);
+
   return useQuery({
     queryKey: ["book", bookId, "status"],
-    queryFn: async () => {
-      console.log(`[useBookStatus] Fetching status for book ${bookId}`);
-      try {
-        const status = await getBookStatus(bookId!);
-        console.log(
-          `[useBookStatus] Received status for book ${bookId}:`,
-          status,
-          "\nChapter statuses:",
-          status.chapters.map((ch) => `${ch.id}: ${ch.status}`)
-        );
-        return status;
-      } catch (error) {
-        console.error(
-          `[useBookStatus] Error fetching status for book ${bookId}:`,
-          error
-        );
-        throw error;
-      }
-    },
+    queryFn: () => getBookStatus(bookId!),
     // Only run query if we have a bookId
     enabled: !!bookId,
-    // Poll every 2 seconds
-    refetchInterval: (query: Query<BookStatus, Error>) => {
-      const data = query.state.data;
-      if (!data) return 2000;
-
-      const hasChapters = data.totalChapters > 0;
-      const allComplete =
-        hasChapters && data.completedChapters === data.totalChapters;
-      const hasProcessingChapters = data.chapters.some(
-        (ch: { status: string }) =>
-          ch.status === "processing" || ch.status === "pending"
-      );
-
-      // Keep polling if:
-      // 1. We have no chapters yet (initial state)
-      // 2. We have chapters that are still processing/pending
-      // 3. Not all chapters are complete
-      if (!hasChapters || hasProcessingChapters || !allComplete) {
-        return 2000;
-      }
-
-      console.log(
-        `[useBookStatus] Stopping polling - all chapters complete and no processing`
-      );
-      return false;
-    },
-    // Stop polling when window is in background
-    refetchIntervalInBackground: false,
+    // The status stream keeps the cached value fresh
+    staleTime: Infinity,
     select: (data: BookStatus) => {
       const hasChapters = data.totalChapters > 0;
       const allComplete =
@@ -74,17 +62,6 @@ export function useBookStatus(bookId: string | null) {
           ch.status === "processing" || ch.status === "pending"
       );
 
-      console.log(
-        `[useBookStatus] Processing status data for book ${bookId}:`,
-        {
-          completedChapters: data.completedChapters,
-          totalChapters: data.totalChapters,
-          hasChapters,
-          allComplete,
-          hasProcessingChapters,
-        }
-      );
-
       return {
         ...data,
         shouldStopPolling: hasChapters && allComplete && !hasProcessingChapters,